@@ -0,0 +1,337 @@
+"""A read-only HTTP/JSON API over the models, for integrations and pollers.
+
+    python api.py [--host 127.0.0.1] [--port 8502] [--workers 8]
+
+    GET /api                                  the resources below
+    GET /api/projects?limit=50&after_id=120   a page of rows
+    GET /api/projects?order_by=-start_date    sorted, descending with '-'
+    GET /api/budgets?project_id=3             rows whose column equals the value
+    GET /api/projects/7                       one row
+
+Resources are projects, tasks, budgets, resources, files and reports.
+Messages are private to their sender and recipient, and the API has no
+notion of users, so they are not served. Lists are keyset-paginated like
+the app's pages: every list response has "next", the URL of the
+following page, or null on the last page.
+
+Each response carries an ETag and a Last-Modified taken from the table's
+TableVersions row. A client that sends them back with If-None-Match or
+If-Modified-Since gets an empty 304 until the table is written to. The
+304 is answered without running the query. Bodies over GZIP_MIN_BYTES
+are gzipped when the client accepts it.
+
+The server is a plain asyncio loop that handles the HTTP. Model calls
+block on SQLite, so they run on a thread pool sized to the connection
+pool. If API_TOKEN is set, requests must send it as
+"Authorization: Bearer <token>". Without one the server only listens on
+localhost and refuses to start on any other --host.
+"""
+import argparse
+import asyncio
+import gzip
+import hmac
+import json
+import logging
+import os
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from database import (Budget, File, Project, Report, Resource, Task, change_tracker, initialize_database,
+                      pool, read_cache)
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8502
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+GZIP_MIN_BYTES = 1024
+KEEPALIVE_SECONDS = 15
+MAX_HEADERS = 100
+LOCAL_HOSTS = ('127.0.0.1', '::1', 'localhost')
+
+# URL name -> (model, table its reads are cached under)
+RESOURCES = {
+    'projects': (Project, 'Projects'),
+    'tasks': (Task, 'Tasks'),
+    'budgets': (Budget, 'Budgets'),
+    'resources': (Resource, 'Resources'),
+    'files': (File, 'Files'),
+    'reports': (Report, 'Reports'),
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+def _default(value):
+    # Records are mappings; dates and datetimes go out in ISO format
+    if isinstance(value, Mapping):
+        return dict(value)
+    return value.isoformat() if isinstance(value, (date, datetime)) else str(value)
+
+
+def _json(value):
+    return json.dumps(value, default=_default, separators=(',', ':')).encode()
+
+
+def _validators(table):
+    """The ETag and last-modified time of `table` as of its latest committed write."""
+    change_tracker.sync(read_cache)
+    version = change_tracker.versions().get(table) or 0
+    changed_at = change_tracker.changed_at().get(table)
+    if changed_at:
+        changed_at = datetime.fromisoformat(changed_at).replace(tzinfo=timezone.utc)
+    return f'W/"{table.lower()}-{version}"', changed_at
+
+
+def _not_modified(headers, etag, changed_at):
+    if 'if-none-match' in headers:
+        tags = [tag.strip() for tag in headers['if-none-match'].split(',')]
+        return '*' in tags or etag in tags
+    if changed_at and 'if-modified-since' in headers:
+        try:
+            return changed_at <= parsedate_to_datetime(headers['if-modified-since'])
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _page(model, path, params):
+    try:
+        limit = min(int(params.pop('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        after_id = params.pop('after_id', None)
+        after_id = int(after_id) if after_id is not None else None
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "limit and after_id must be integers")
+    if limit < 1:
+        raise HttpError(HTTPStatus.BAD_REQUEST, "limit must be at least 1")
+    order_by = params.pop('order_by', 'id')
+    try:
+        rows = model.page(after_id=after_id, limit=limit + 1, order_by=order_by, filters=params or None)
+    except ValueError as e:
+        raise HttpError(HTTPStatus.BAD_REQUEST, str(e))
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        query = dict(params, order_by=order_by, limit=limit, after_id=rows[-1]['id'])
+        if order_by == 'id':
+            del query['order_by']
+        next_url = f"{path}?{urlencode(query)}"
+    return {'items': rows, 'next': next_url}
+
+
+def _get(name, model, row_id):
+    try:
+        row = model.get_by_id(int(row_id))
+    except ValueError:
+        row = None
+    if row is None:
+        raise HttpError(HTTPStatus.NOT_FOUND, f"No {name[:-1]} with id {row_id}")
+    return row
+
+
+def respond(method, target, headers):
+    """Answer one request; `headers` has lower-case names. Returns (status, headers, body).
+
+    Runs on a worker thread: it may block on the database.
+    """
+    try:
+        if method not in ('GET', 'HEAD'):
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED)
+        token = os.getenv('API_TOKEN')
+        if token and not hmac.compare_digest(headers.get('authorization', ''), f"Bearer {token}"):
+            raise HttpError(HTTPStatus.UNAUTHORIZED)
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        if not parts or parts[0] != 'api' or len(parts) > 3:
+            raise HttpError(HTTPStatus.NOT_FOUND)
+        if len(parts) == 1:
+            return _finish(method, headers, HTTPStatus.OK, {name: f"/api/{name}" for name in RESOURCES})
+        if parts[1] not in RESOURCES:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Unknown resource '{parts[1]}'")
+        name = parts[1]
+        model, table = RESOURCES[name]
+
+        etag, changed_at = _validators(table)
+        validators = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if changed_at:
+            validators['Last-Modified'] = format_datetime(changed_at, usegmt=True)
+        if _not_modified(headers, etag, changed_at):
+            return HTTPStatus.NOT_MODIFIED, validators, b''
+
+        if len(parts) == 3:
+            body = _get(name, model, parts[2])
+        else:
+            body = _page(model, url.path, dict(parse_qsl(url.query)))
+        return _finish(method, headers, HTTPStatus.OK, body, validators)
+    except HttpError as e:
+        return _finish(method, headers, e.status, {'error': str(e)})
+    except Exception:
+        logger.exception("Error answering %s %s", method, target)
+        return _finish(method, headers, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "Internal error"})
+
+
+def _finish(method, request_headers, status, body, headers=None):
+    headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+    body = _json(body)
+    if len(body) >= GZIP_MIN_BYTES:
+        headers['Vary'] = 'Accept-Encoding'
+        if 'gzip' in request_headers.get('accept-encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+    if method == 'HEAD':
+        headers['Content-Length'] = str(len(body))
+        body = b''
+    return status, headers, body
+
+
+async def _read_request(reader):
+    """Read one request's line and headers, discarding any body; None at end of stream.
+
+    A line over the reader's limit or a Content-Length that isn't a
+    non-negative number is answered with 400.
+    """
+    try:
+        line = await asyncio.wait_for(reader.readline(), KEEPALIVE_SECONDS)
+        if not line:
+            return None
+        method, target, version = line.decode('latin-1').split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length') or 0)
+        if length < 0:
+            raise ValueError(f"negative Content-Length {length}")
+    # readline() reports an overlong line as ValueError
+    except (ValueError, asyncio.LimitOverrunError):
+        raise HttpError(HTTPStatus.BAD_REQUEST)
+    if length:
+        await reader.readexactly(length)
+    return method, target, version, headers
+
+
+def _encode_response(status, headers, body, keep_alive):
+    head = [f"HTTP/1.1 {status.value} {status.phrase}"]
+    headers = dict(headers)
+    if 'Content-Length' not in headers:
+        headers['Content-Length'] = str(len(body))
+    headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+    head += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body
+
+
+class Server:
+    """The API server: an asyncio loop for connections and a thread pool for model calls.
+
+    serve_forever() runs it in the calling thread; start() runs it on a
+    background thread and returns once it is listening, for tests and
+    benchmarks.
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, workers=None):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers or pool.max_size, thread_name_prefix='api')
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._writers = set()
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HttpError as e:
+                    writer.write(_encode_response(*_finish('GET', {}, e.status, {'error': str(e)}), False))
+                    break
+                if request is None:
+                    break
+                method, target, version, headers = request
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+                status, response_headers, body = await loop.run_in_executor(
+                    self.executor, respond, method, target, headers)
+                writer.write(_encode_response(status, response_headers, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("API listening on http://%s:%d/api", self.host, self.port)
+        self._ready.set()
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def serve_forever(self):
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self.executor.shutdown(wait=False)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='api-server', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self.port
+
+    def _close(self):
+        self._server.close()
+        # Idle keep-alive connections would otherwise hold the shutdown open
+        for writer in list(self._writers):
+            writer.close()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._close)
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, help="threads for model calls (default: the connection pool size)")
+    args = parser.parse_args()
+    if args.host not in LOCAL_HOSTS and not os.getenv('API_TOKEN'):
+        parser.error(f"set API_TOKEN to serve on {args.host}; without it anyone who can reach the port can read it")
+    initialize_database()
+    try:
+        Server(args.host, args.port, args.workers).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
@@ -1,14 +1,62 @@
 import streamlit as st
-from datetime import datetime
+from datetime import timedelta
+import json
 import logging
-from database import Project, File, Notification, Resource, Task, Budget, Message, Report, User
+import os
+import tempfile
+from database import initialize_database, performance_snapshot, ConflictError, Project, File, FileVersion, Notification, Inbox, Resource, ResourceInterval, Task, Budget, Message, Conversation, Report, User
 from auth import login, register, check_login, logout
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from passwords import HasherBusy
+from availability import index as availability_index
+import rollups
+import gantt
+import status_reports
+from file_store import save_upload
+from scheduling import get_schedule, refresh_task, CycleError
+from search import search
+import bulk
+import archive
+from logging_config import configure_logging
+
+configure_logging()
 logger = logging.getLogger(__name__)
 
+PAGE_SIZE = 25
+GRID_PAGE_SIZE = 200
+INBOX_POLL_SECONDS = 5
+
+def fetch_page(model, key, method='page', page_size=PAGE_SIZE, **kwargs):
+    """Fetch the page of `model` rows the user is currently looking at.
+
+    The cursors of the pages visited so far are kept in session state under
+    `key`, so moving forward or back never re-reads the pages in between.
+    `method` names the model's keyset-paginated read. Returns the rows and
+    whether another page follows.
+    """
+    cursors = st.session_state.setdefault(f"{key}_cursors", [None])
+    rows = getattr(model, method)(after_id=cursors[-1], limit=page_size + 1, **kwargs)
+    return rows[:page_size], len(rows) > page_size
+
+def page_controls(key, rows, has_next, cursor_field='id'):
+    cursors = st.session_state.setdefault(f"{key}_cursors", [None])
+
+    def previous_page():
+        cursors.pop()
+
+    def next_page():
+        cursors.append(rows[-1][cursor_field])
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        st.button("Previous", key=f"{key}_previous", on_click=previous_page, disabled=len(cursors) == 1)
+    with col2:
+        st.button("Next", key=f"{key}_next", on_click=next_page, disabled=not has_next)
+    with col3:
+        st.caption(f"Page {len(cursors)}")
+
 def main():
+    initialize_database()
+    archive.start_maintenance()
     st.title("Construction Project Management System")
 
     if 'user' not in st.session_state:
@@ -18,7 +66,13 @@ def main():
         login_register()
     else:
         menu = ["View Projects", "Manage Projects", "File Management", "Notifications", "Resource Management", "Project Planning", "Budget Management", "Communication", "Reporting", "Logout"]
+        if st.session_state.user['role'] == 'admin':
+            menu.insert(-1, "Import / Export")
+            menu.insert(-1, "Performance")
         choice = st.sidebar.selectbox("Menu", menu)
+        query = st.sidebar.text_input("Search", placeholder="Reports, messages, projects...")
+        if query:
+            search_results(query)
 
         if choice == "View Projects":
             view_projects()
@@ -38,10 +92,26 @@ def main():
             communication()
         elif choice == "Reporting":
             reporting()
+        elif choice == "Import / Export":
+            import_export()
+        elif choice == "Performance":
+            performance()
         elif choice == "Logout":
             logout(st.session_state)
             st.rerun()
 
+SEARCH_KINDS = {'report': "Report", 'message': "Message", 'project': "Project", 'notification': "Notification"}
+
+def search_results(query):
+    user = st.session_state.user
+    results = search(query, limit=PAGE_SIZE, username=None if user['role'] == 'admin' else user['username'])
+    with st.expander(f"Search results for '{query}' ({len(results)})", expanded=True):
+        if not results:
+            st.write("No matches.")
+        for result in results:
+            st.markdown(f"**{SEARCH_KINDS[result['kind']]} {result['id']}**: {result['title']} ({result['date']})")
+            st.markdown(result['snippet'])
+
 def login_register():
     st.subheader("Login or Register")
     tab1, tab2 = st.tabs(["Login", "Register"])
@@ -50,7 +120,11 @@ def login_register():
         username = st.text_input("Username")
         password = st.text_input("Password", type="password")
         if st.button("Login"):
-            user = login(username, password)
+            try:
+                user = login(username, password)
+            except HasherBusy:
+                st.error("The server is busy signing other people in. Please try again in a moment.")
+                return
             if user:
                 st.session_state.user = user
                 st.success("Logged in successfully!")
@@ -69,113 +143,169 @@ def login_register():
 
 def view_projects():
     st.subheader("View Projects")
-    projects = Project.get_all()
+    projects, has_next = fetch_page(Project, "view_projects")
     for project in projects:
         st.write(f"ID: {project['id']}, Name: {project['name']}")
         st.write(f"Description: {project['description']}")
         st.write(f"Start Date: {project['start_date']}, End Date: {project['end_date']}")
         st.write("---")
+    page_controls("view_projects", projects, has_next)
 
 def manage_projects():
     st.subheader("Manage Projects")
-
-    # Create new project
-    with st.form("Create Project"):
-        st.write("Create New Project")
-        project_name = st.text_input("Project Name")
-        project_description = st.text_area("Description")
-        start_date = st.date_input("Start Date")
-        end_date = st.date_input("End Date")
-        if st.form_submit_button("Create Project"):
-            try:
-                Project.create(project_name, project_description, start_date, end_date)
-                st.success(f"Project '{project_name}' created successfully!")
-                st.rerun()
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
-                logger.error(f"Error creating project: {str(e)}")
-
-    # List and update projects
-    projects = Project.get_all()
-    for project in projects:
-        with st.expander(f"Project: {project['name']}"):
-            with st.form(f"Update Project {project['id']}"):
-                updated_name = st.text_input("Name", value=project['name'])
-                updated_description = st.text_area("Description", value=project['description'])
-                updated_start_date = st.date_input("Start Date", value=datetime.strptime(project['start_date'], "%Y-%m-%d").date())
-                updated_end_date = st.date_input("End Date", value=datetime.strptime(project['end_date'], "%Y-%m-%d").date())
-
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.form_submit_button("Update"):
-                        try:
-                            updated_project = Project.update(project['id'], updated_name, updated_description, updated_start_date, updated_end_date)
-                            if updated_project:
-                                st.success(f"Project '{updated_name}' updated successfully!")
-                                st.rerun()
-                            else:
-                                st.error("Failed to update project.")
-                        except Exception as e:
-                            st.error(f"An error occurred: {str(e)}")
-                            logger.error(f"Error updating project: {str(e)}")
-
-                with col2:
-                    if st.form_submit_button("Delete"):
-                        try:
-                            Project.delete(project['id'])
-                            st.success(f"Project '{project['name']}' deleted successfully!")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"An error occurred: {str(e)}")
-                            logger.error(f"Error deleting project: {str(e)}")
+    st.caption("Edit cells, add rows at the bottom or select rows to delete, then save. "
+               "Only the rows you changed are written.")
+
+    notice = st.session_state.pop("projects_grid_notice", None)
+    if notice:
+        getattr(st, notice[0])(notice[1])
+
+    projects, has_next = fetch_page(Project, "manage_projects", page_size=GRID_PAGE_SIZE)
+    # A new key after each save, so the grid starts again from the saved rows
+    key = f"projects_grid_{st.session_state.setdefault('projects_grid_generation', 0)}"
+    with st.form("projects_grid"):
+        st.data_editor(
+            [dict(project) for project in projects],
+            key=key,
+            num_rows="dynamic",
+            hide_index=True,
+            column_order=("id",) + Project.EDITABLE_FIELDS,
+            disabled=("id",),
+            column_config={
+                'name': st.column_config.TextColumn("Name", required=True),
+                'description': st.column_config.TextColumn("Description"),
+                'start_date': st.column_config.DateColumn("Start Date"),
+                'end_date': st.column_config.DateColumn("End Date"),
+                'planned_budget': st.column_config.NumberColumn("Planned Budget", min_value=0.0),
+            },
+        )
+        if st.form_submit_button("Save changes"):
+            save_project_edits(projects, st.session_state[key])
+            st.rerun()
+    page_controls("manage_projects", projects, has_next)
+
+def save_project_edits(projects, edits):
+    """Write a data_editor's edit state (edited, added and deleted rows) back to Projects."""
+    updates = [{**projects[index], **changes} for index, changes in edits["edited_rows"].items()]
+    inserts = [row for row in edits["added_rows"] if row.get('name')]
+    deletes = [(projects[index]['id'], projects[index]['row_version']) for index in edits["deleted_rows"]]
+    if not (updates or inserts or deletes):
+        st.session_state.projects_grid_notice = ("info", "No changes to save.")
+        return
+    try:
+        counts = Project.apply_changes(updates, inserts, deletes)
+        st.session_state.projects_grid_notice = (
+            "success", f"Saved: {counts['updated']} updated, {counts['inserted']} added, {counts['deleted']} deleted.")
+    except ConflictError as e:
+        st.session_state.projects_grid_notice = (
+            "error", f"Nothing was saved: project(s) {', '.join(map(str, e.ids))} were changed by someone else "
+                     "since this page was loaded. The grid now shows the latest values.")
+    except Exception as e:
+        st.session_state.projects_grid_notice = ("error", f"Nothing was saved: {str(e)}")
+        logger.error("Error saving project edits: %s", e)
+    st.session_state.projects_grid_generation += 1
 
 def file_management():
     st.subheader("File Management")
     uploaded_file = st.file_uploader("Upload a file", type=["pdf", "cad", "jpg", "png"])
     if uploaded_file is not None:
-        file_path = f"uploads/{uploaded_file.name}"
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        st.success(f"File '{uploaded_file.name}' uploaded successfully!")
-        File.create(uploaded_file.name, file_path)
+        # The uploader keeps its value across reruns; only store each upload once
+        handled = st.session_state.setdefault('handled_uploads', set())
+        if uploaded_file.file_id not in handled:
+            try:
+                uploaded_file.seek(0)
+                version, created = save_upload(uploaded_file, uploaded_file.name,
+                                               uploaded_by=st.session_state.user['username'],
+                                               upload_key=uploaded_file.file_id)
+                handled.add(uploaded_file.file_id)
+                if created:
+                    st.success(f"File '{uploaded_file.name}' uploaded successfully as version {version['version']}!")
+                else:
+                    st.info(f"File '{uploaded_file.name}' is unchanged from version {version['version']}.")
+            except Exception as e:
+                st.error(f"An error occurred: {str(e)}")
+                logger.error(f"Error uploading file: {str(e)}")
 
-    files = File.get_all()
+    files, has_next = fetch_page(File, "files", order_by='-id')
+    versions = FileVersion.latest_for_files([file['id'] for file in files])
     for file in files:
         st.write(f"ID: {file['id']}, Name: {file['name']}, Path: {file['path']}")
+        latest = versions.get(file['id'])
+        if latest:
+            st.write(f"Version {latest['version']}, uploaded by {latest['uploaded_by']} at {latest['uploaded_at']}")
         st.write("---")
+    page_controls("files", files, has_next)
 
 def notifications():
     st.subheader("Notifications")
-    notifications = Notification.get_all()
-    for notification in notifications:
-        st.write(f"Message: {notification['message']}")
-        st.write(f"Date: {notification['date']}")
-        st.write("---")
+    inbox_feed(st.session_state.user['username'])
 
     with st.form("Create Notification"):
         message = st.text_area("Message")
         date = st.date_input("Date")
+        recipient = st.text_input("Recipient", help="Username of the recipient; leave empty to notify everyone")
         if st.form_submit_button("Create Notification"):
-            try:
-                Notification.create(message, date)
-                st.success("Notification created successfully!")
-                st.rerun()
-            except Exception as e:
-                st.error(f"An error occurred: {str(e)}")
-                logger.error(f"Error creating notification: {str(e)}")
+            recipient = recipient.strip() or None
+            if recipient is not None and User.get_by_username(recipient) is None:
+                st.error(f"No user called '{recipient}'")
+            else:
+                create_notification(message, date, recipient)
+
+def create_notification(message, date, recipient):
+    try:
+        Notification.create(message, date, recipient)
+        st.success("Notification created successfully!")
+        st.rerun()
+    except Exception as e:
+        st.error(f"An error occurred: {str(e)}")
+        logger.error("Error creating notification: %s", e)
+
+@st.fragment(run_every=INBOX_POLL_SECONDS)
+def inbox_feed(username):
+    """The user's inbox, newest first. Reruns on its own every few seconds and
+    only fetches notifications newer than the newest one already shown."""
+    feed = st.session_state.get('inbox_feed')
+    if feed is None or feed['user'] != username:
+        rows = Inbox.before(username, limit=PAGE_SIZE)
+        feed = st.session_state.inbox_feed = {'user': username, 'rows': rows,
+                                              'newest': rows[0]['id'] if rows else 0}
+    else:
+        new_rows = Inbox.since(username, feed['newest'], limit=PAGE_SIZE * 4)
+        if new_rows:
+            feed['rows'] = new_rows[::-1] + feed['rows']
+            feed['newest'] = new_rows[-1]['id']
+
+    status = Inbox.status(username)
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.write(f"{status['unread']} unread")
+    with col2:
+        if st.button("Mark all read", disabled=not status['unread']):
+            Inbox.mark_read(username, feed['newest'])
+            st.rerun(scope="fragment")
+
+    for notification in feed['rows']:
+        marker = "**New** · " if notification['id'] > status['last_read_id'] else ""
+        st.write(f"{marker}{notification['message']}")
+        st.caption(f"Date: {notification['date']}")
+
+    if feed['rows'] and st.button("Load older"):
+        feed['rows'] += Inbox.before(username, feed['rows'][-1]['id'], limit=PAGE_SIZE)
+        st.rerun(scope="fragment")
 
 def resource_management():
     st.subheader("Resource Management")
-    resources = Resource.get_all()
+    resources, has_next = fetch_page(Resource, "resources")
     for resource in resources:
         st.write(f"ID: {resource['id']}, Name: {resource['name']}, Type: {resource['type']}")
         st.write(f"Availability: {resource['availability']}")
         st.write("---")
+    page_controls("resources", resources, has_next)
 
     with st.form("Create Resource"):
         name = st.text_input("Name")
         type = st.text_input("Type")
-        availability = st.text_input("Availability")
+        availability = st.text_input("Availability", help="Date ranges such as 2024-03-01 to 2024-03-17; separate several with ';'")
         if st.form_submit_button("Create Resource"):
             try:
                 Resource.create(name, type, availability)
@@ -185,22 +315,102 @@ def resource_management():
                 st.error(f"An error occurred: {str(e)}")
                 logger.error(f"Error creating resource: {str(e)}")
 
+    with st.form("Book Resource"):
+        st.write("Book Resource")
+        resource_id = st.number_input("Resource ID", min_value=1)
+        project_id = st.number_input("Project ID", min_value=1)
+        booking_start = st.date_input("From")
+        booking_end = st.date_input("To")
+        if st.form_submit_button("Book Resource"):
+            book_resource(resource_id, project_id, booking_start, booking_end)
+
+    st.write("Find Free Resources")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        free_from = st.date_input("Free from", key="free_from")
+    with col2:
+        free_to = st.date_input("Free to", key="free_to")
+    with col3:
+        free_type = st.text_input("Type", key="free_type")
+    if free_to >= free_from:
+        free = availability_index.free_resources(free_from, free_to, type=free_type or None)
+        st.dataframe([{'id': r['id'], 'name': r['name'], 'type': r['type']} for r in free])
+
+    st.write("Booking Conflicts")
+    conflicts = availability_index.conflicts()
+    if not conflicts:
+        st.write("No conflicts.")
+    for conflict in conflicts[:PAGE_SIZE]:
+        bookings = ", ".join(f"#{b['id']} (project {b['project_id']}, {b['start_date']} to {b['end_date']})" for b in conflict['bookings'])
+        label = "Double booking" if conflict['kind'] == 'double_booking' else "Outside availability"
+        st.write(f"{label} of resource {conflict['resource_id']}: {bookings}")
+
+def book_resource(resource_id, project_id, start_date, end_date):
+    try:
+        ResourceInterval.book(resource_id, project_id, start_date, end_date)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    except Exception as e:
+        st.error(f"An error occurred: {str(e)}")
+        logger.error("Error booking resource: %s", e)
+        return
+    st.success("Booking created successfully!")
+    st.rerun()
+
 def project_planning():
     st.subheader("Project Planning")
-    tasks = Task.get_all()
+    tasks, has_next = fetch_page(Task, "tasks", order_by='start_date')
     for task in tasks:
         st.write(f"ID: {task['id']}, Name: {task['name']}, Start Date: {task['start_date']}, End Date: {task['end_date']}")
-        st.write(f"Dependencies: {task['dependencies']}")
+        st.write(f"Dependencies: {task['dependencies']}, Completed: {task['completed_at'] or 'No'}")
         st.write("---")
+    page_controls("tasks", tasks, has_next)
+
+    st.write("Timeline")
+    timeline_project = st.number_input("Project ID", min_value=0, key="timeline_project",
+                                       help="0 for every task")
+    chart = gantt.chart(timeline_project or None)
+    if not chart.done():
+        with st.spinner("Drawing timeline..."):
+            chart.result()
+    st.image(chart.result())
+
+    st.write("Critical Path")
+    try:
+        schedule = get_schedule()
+        critical = [row for row in schedule.rows() if row['critical']]
+        st.write(f"Programme finishes {schedule.base_date + timedelta(days=max(schedule.finish - 1, 0))}; "
+                 f"{len(critical)} of {len(schedule.task_ids)} tasks are critical.")
+        st.dataframe(critical[:PAGE_SIZE * 4])
+    except CycleError as e:
+        st.error(str(e))
+
+    with st.form("Complete Task"):
+        task_id = st.number_input("Task ID", min_value=1)
+        completed_at = st.date_input("Completed On")
+        col1, col2 = st.columns(2)
+        with col1:
+            complete = st.form_submit_button("Mark Complete")
+        with col2:
+            reopen = st.form_submit_button("Reopen")
+        if complete or reopen:
+            if Task.set_completed(task_id, completed_at if complete else None):
+                st.success("Task updated successfully!")
+                st.rerun()
+            else:
+                st.error(f"No task with ID {task_id}.")
 
     with st.form("Create Task"):
         name = st.text_input("Name")
         start_date = st.date_input("Start Date")
         end_date = st.date_input("End Date")
-        dependencies = st.text_input("Dependencies")
+        dependencies = st.text_input("Dependencies", help="Comma-separated task IDs or names")
+        project_id = st.number_input("Project ID", min_value=0, help="0 for a task outside any project")
         if st.form_submit_button("Create Task"):
             try:
-                Task.create(name, start_date, end_date, dependencies)
+                task_id = Task.create(name, start_date, end_date, dependencies, project_id or None)
+                refresh_task(task_id)
                 st.success("Task created successfully!")
                 st.rerun()
             except Exception as e:
@@ -209,15 +419,28 @@ def project_planning():
 
 def budget_management():
     st.subheader("Budget Management")
-    budgets = Budget.get_all()
+
+    totals = rollups.project_totals()
+    if totals:
+        st.write("Totals by Project")
+        st.dataframe(totals)
+        project_ids = [row['project_id'] for row in totals]
+        selected = st.selectbox("Monthly spend for project", project_ids,
+                                format_func=lambda pid: next(f"{pid}: {row['name'] or 'unknown project'}" for row in totals if row['project_id'] == pid))
+        monthly = rollups.monthly_spend(selected)
+        st.line_chart(monthly, x='month', y=['spend', 'running_balance'])
+
+    st.write("Budget Entries")
+    budgets, has_next = fetch_page(Budget, "budgets", order_by='-date')
     for budget in budgets:
         st.write(f"ID: {budget['id']}, Project ID: {budget['project_id']}, Amount: {budget['amount']}")
         st.write(f"Date: {budget['date']}")
         st.write("---")
+    page_controls("budgets", budgets, has_next)
 
     with st.form("Create Budget"):
         project_id = st.number_input("Project ID", min_value=1)
-        amount = st.number_input("Amount")
+        amount = st.number_input("Amount", min_value=0.0)
         date = st.date_input("Date")
         if st.form_submit_button("Create Budget"):
             try:
@@ -230,45 +453,81 @@ def budget_management():
 
 def communication():
     st.subheader("Communication")
-    
-    # Display existing messages
-    messages = Message.get_all()
-    for message in messages:
-        st.write(f"From: {message['from_user']}, To: {message['to_user']}, Message: {message['content']}")
-        st.write(f"Date: {message['date']}")
-        st.write("---")
-
-    # Fetch all users except the logged-in user
-    users = [user['username'] for user in User.get_all() if user['username'] != st.session_state.user['username']]
+    username = st.session_state.user['username']
+    st.caption(f"{Conversation.unread_count(username)} unread messages")
+
+    conversations, has_next = fetch_page(Conversation, "conversations", username=username)
+    selected = None
+    if conversations:
+        labels = {conversation['id']: f"{conversation['other_user']}"
+                  + (f" ({conversation['unread']} unread)" if conversation['unread'] else "")
+                  for conversation in conversations}
+        selected_id = st.radio("Conversations", list(labels), format_func=labels.get)
+        selected = next(conversation for conversation in conversations if conversation['id'] == selected_id)
+    page_controls("conversations", conversations, has_next, cursor_field='last_message_id')
+
+    if selected:
+        if selected['unread']:
+            Conversation.mark_read(username, selected['id'])
+        key = f"conversation_{selected['id']}"
+        history, older = fetch_page(Conversation, key, method='messages', conversation_id=selected['id'])
+        for message in reversed(history):
+            st.write(f"**{message['from_user']}** ({message['date']}): {message['content']}")
+        page_controls(key, history, older)
+
+        with st.form("Reply"):
+            content = st.text_area(f"Reply to {selected['other_user']}")
+            date = st.date_input("Date")
+            if st.form_submit_button("Send"):
+                send_message(username, selected['other_user'], content, date)
+
+    with st.form("New Message"):
+        to_user = st.text_input("To", help="Username of the recipient")
+        content = st.text_area("Message")
+        date = st.date_input("Date", key="new_message_date")
+        if st.form_submit_button("Send Message"):
+            if User.get_by_username(to_user) is None:
+                st.error(f"No user called '{to_user}'")
+            else:
+                send_message(username, to_user, content, date)
 
-    with st.form("Send Message"):
-        # Auto-populate 'from' field with the current user
-        from_user = st.text_input("From", value=st.session_state.user['username'], disabled=True)
-        
-        # Dropdown for selecting 'to' user
-        to_user = st.selectbox("To", users)
+def send_message(from_user, to_user, content, date):
+    try:
+        Message.create(from_user, to_user, content, date)
+        st.success("Message sent successfully!")
+        st.rerun()
+    except Exception as e:
+        st.error(f"An error occurred: {str(e)}")
+        logger.error("Error sending message: %s", e)
 
-        # Input for the message and date
-        content = st.text_area("Message")
-        date = st.date_input("Date")
+def reporting():
+    st.subheader("Reporting")
 
-        # Submit form
-        if st.form_submit_button("Send Message"):
+    st.write("Project Status")
+    status = status_reports.project_status()
+    st.caption(f"Computed {status.computed_at:%Y-%m-%d %H:%M:%S}"
+               + ("" if status_reports.is_current(status) else "; newer data is being processed"))
+    if status.rows:
+        st.dataframe(status.rows, column_config={
+            'completion': st.column_config.ProgressColumn("completion", min_value=0.0, max_value=1.0),
+            'budget_used': st.column_config.NumberColumn("budget used", format="percent"),
+        })
+        if st.button("Save as report"):
             try:
-                Message.create(from_user, to_user, content, date)
-                st.success("Message sent successfully!")
+                Report.create(f"Project status {status.stamp[1]}", status_reports.summary(status), status.stamp[1])
+                st.success("Status report saved!")
                 st.rerun()
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
-                logger.error(f"Error sending message: {str(e)}")
+                logger.error("Error saving status report: %s", e)
 
-def reporting():
-    st.subheader("Reporting")
-    reports = Report.get_all()
+    st.write("Reports")
+    reports, has_next = fetch_page(Report, "reports", order_by='-date')
     for report in reports:
         st.write(f"ID: {report['id']}, Name: {report['name']}, Content: {report['content']}")
         st.write(f"Date: {report['date']}")
         st.write("---")
+    page_controls("reports", reports, has_next)
 
     with st.form("Create Report"):
         name = st.text_input("Name")
@@ -283,5 +542,119 @@ def reporting():
                 st.error(f"An error occurred: {str(e)}")
                 logger.error(f"Error creating report: {str(e)}")
 
+def import_export():
+    st.subheader("Import / Export")
+    if st.session_state.user['role'] != 'admin':
+        st.error("Only admins can import and export data.")
+        return
+
+    entity_name = st.selectbox("Data", sorted(bulk.ENTITIES))
+    entity = bulk.ENTITIES[entity_name]
+
+    st.write("Import")
+    upload = st.file_uploader("CSV or Parquet file", type=["csv", "parquet"])
+    if upload is not None:
+        try:
+            source = bulk.open_source(upload)
+            headers = source.headers
+            source.close()
+            upload.seek(0)
+        except Exception as e:
+            st.error(f"Could not read the file: {str(e)}")
+            return
+        try:
+            columns = bulk.resolve_mapping(headers, entity)
+        except ValueError:
+            columns = {}
+        mapping = {}
+        for field in entity.fields:
+            options = ["(none)"] + list(headers)
+            guess = columns.get(field.name, "(none)")
+            column = st.selectbox(f"{field.name}{' *' if field.required else ''}", options,
+                                  index=options.index(guess), key=f"bulk_map_{entity_name}_{field.name}")
+            if column != "(none)":
+                mapping[column] = field.name
+
+        job = bulk.pending_job(entity_name, upload)
+        resume = False
+        if job:
+            resume = st.checkbox(f"Resume the unfinished import of this file after row {job['rows_done']}", value=True)
+        if st.button("Import"):
+            bar = st.progress(0.0, text="Starting import...")
+
+            def report(done, total):
+                bar.progress(min(done / total, 1.0) if total else 0.0, text=f"{done} rows read")
+
+            try:
+                job = bulk.import_rows(entity_name, upload, mapping=mapping, resume=resume, progress=report)
+                bar.progress(1.0, text=f"{job['rows_done']} rows read")
+                st.success(f"Loaded {job['rows_loaded']} rows, rejected {job['rows_rejected']}.")
+                errors = json.loads(job['errors'] or '[]')
+                if errors:
+                    st.dataframe(errors)
+            except Exception as e:
+                st.error(f"Import stopped: {str(e)}. Upload the same file again to resume.")
+                logger.error("Error importing %s: %s", entity_name, e)
+
+    st.write("Export")
+    fmt = st.radio("Format", ["csv", "parquet"], horizontal=True)
+    if st.button("Prepare export"):
+        # Written to disk chunk by chunk; only the finished file is handed to the browser
+        with tempfile.NamedTemporaryFile(suffix=f".{fmt}", delete=False) as handle:
+            path = handle.name
+        try:
+            count = bulk.export_rows(entity_name, path, fmt)
+            with open(path, 'rb') as handle:
+                st.download_button(f"Download {count} rows", handle.read(), file_name=f"{entity_name}.{fmt}")
+        finally:
+            os.remove(path)
+
+    st.write("Recent imports")
+    st.dataframe(bulk.jobs())
+
+def performance():
+    st.subheader("Performance")
+    if st.session_state.user['role'] != 'admin':
+        st.error("Only admins can view performance data.")
+        return
+
+    snapshot = performance_snapshot()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Cache hit ratio", f"{snapshot['cache']['hit_ratio']:.1%}")
+    col2.metric("Open connections", f"{snapshot['pool']['open']} / {snapshot['pool']['max_size']}")
+    col3.metric("Pool wait p95", f"{snapshot['pool_wait']['p95_ms']} ms")
+    writes = snapshot['writer']
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Write queue depth", writes['queue_depth'], help=f"Peak: {writes['max_queue_depth']}")
+    col2.metric("Writes per commit", writes['mean_batch_size'], help=f"{writes['writes']} writes in {writes['batches']} commits")
+    col3.metric("Write queue wait p95", f"{writes['queue_wait']['p95_ms']} ms")
+
+    st.write("Statements by total time")
+    st.dataframe(snapshot['statements'][:50])
+
+    st.write(f"Slow queries (over {snapshot['slow_query_threshold_ms']:.0f} ms)")
+    st.dataframe(snapshot['slow_queries'][::-1])
+
+    st.write("Commits")
+    st.json(snapshot['commits'])
+    st.write("Writer batches (commit size: count)")
+    st.json(writes['batch_sizes'])
+    st.write("Read cache")
+    st.json(snapshot['cache'])
+
+    st.write("Archive")
+    retention = archive.status()
+    st.dataframe(retention['policies'])
+    st.caption(f"{retention['free_pages']} free pages in the database file; incremental vacuum "
+               f"{'on' if retention['incremental_vacuum'] else 'off (run python archive.py run --convert)'}")
+    if st.button("Archive and vacuum now"):
+        moved = archive.run()
+        freed = archive.reclaim()
+        st.success(", ".join(f"{result.policy}: {result.rows} archived" for result in moved)
+                   + f"; {freed} pages freed")
+
+    st.download_button("Download as JSON", json.dumps(snapshot, indent=2, default=str),
+                       file_name="performance.json", mime="application/json")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,374 @@
+"""Retention policies that move cold rows into an archive database.
+
+Each Policy names a table, how many days its rows stay in the main
+database, and which rows count as old. Rows that match are moved in
+batches of BATCH_SIZE to the same table in the archive database
+(config.archive_path), which is ATTACHed as "archive". Rows a policy
+drags along with them (a project's tasks, budgets and files) are moved
+in the same batch. Each batch is picked, copied and deleted in one
+transaction, so the app's writers only wait for one batch at a time. The
+main database is in WAL mode, where a transaction over two files is
+atomic per file but not across both. A crash can therefore leave a batch
+in both databases; the copy is INSERT OR REPLACE, so the next run
+finishes the move.
+
+Deleting from the main database fires its usual triggers: inbox counts,
+conversation unread counts, search indexes and budget rollups stay
+consistent, and the read cache is invalidated as for any write. Budgets
+are not archived on their own, because that would change the spend of
+projects that are still open. They leave with their project.
+
+The main database uses auto_vacuum=INCREMENTAL, so the pages freed by a
+move can be handed back to the file system a few at a time with
+PRAGMA incremental_vacuum instead of a full VACUUM. The maintenance
+thread started by start_maintenance() archives and then reclaims free
+pages every ARCHIVE_INTERVAL_SECONDS (default one hour).
+
+Archived rows stay queryable: archived() reads one table, and query()
+runs any SELECT with both databases attached (main.X, archive.X).
+
+    python archive.py run [--dry-run]     apply the policies now
+    python archive.py status              rows eligible, archived, free pages
+    python archive.py show notifications  print archived rows
+
+    RETENTION_DAYS   override policy ages, e.g. "notifications=30,projects=730";
+                     0 turns a policy off
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+import config
+from database import execute_query, initialize_database, pool
+from logging_config import configure_logging
+from records import make_rows
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+VACUUM_PAGES = 256
+INTERVAL_SECONDS = float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 3600))
+
+# `condition` selects the table's old rows (`:cutoff` is the oldest date
+# kept); each dependent is (table, rows belonging to the batch's ids),
+# listed children first, the order they are deleted in
+Policy = namedtuple('Policy', ('table', 'days', 'condition', 'dependents'))
+
+_IDS = "SELECT id FROM temp.archive_ids"
+
+POLICIES = {
+    'notifications': Policy('Notifications', 90, "date < :cutoff", ()),
+    # A conversation's latest message is what its list entry shows, so it stays
+    'messages': Policy('Messages', 365,
+                       """date < :cutoff
+                          AND id NOT IN (SELECT last_message_id FROM main.Conversations)
+                          AND id NOT IN (SELECT last_message_id FROM main.ConversationMembers)""", ()),
+    # Finished: past its end date with no open tasks. A project stays while a
+    # task of another project depends on one of its tasks; it can go once
+    # that project has gone, or the dependency has been removed.
+    'projects': Policy('Projects', 365,
+                       """end_date < :cutoff
+                          AND NOT EXISTS (SELECT 1 FROM main.Tasks t
+                                          WHERE t.project_id = Projects.id AND t.completed_at IS NULL)
+                          AND NOT EXISTS (SELECT 1 FROM main.Tasks t
+                                          JOIN main.TaskDependencies d ON d.depends_on = t.id
+                                          JOIN main.Tasks dependent ON dependent.id = d.task_id
+                                          WHERE t.project_id = Projects.id
+                                            AND dependent.project_id IS NOT Projects.id)""",
+                       (('TaskDependencies', f"task_id IN (SELECT id FROM main.Tasks WHERE project_id IN ({_IDS}))"),
+                        ('Tasks', f"project_id IN ({_IDS})"),
+                        ('Budgets', f"project_id IN ({_IDS})"),
+                        ('FileVersions', f"file_id IN (SELECT id FROM main.Files WHERE project_id IN ({_IDS}))"),
+                        ('Files', f"project_id IN ({_IDS})"))),
+}
+
+ArchiveRun = namedtuple('ArchiveRun', ('policy', 'rows', 'dependents', 'seconds'))
+
+
+def policies():
+    """POLICIES with the ages from RETENTION_DAYS applied."""
+    days = {}
+    for item in os.environ.get('RETENTION_DAYS', '').split(','):
+        name, _, value = item.partition('=')
+        if name.strip() in POLICIES and value.strip():
+            days[name.strip()] = int(value)
+    return {name: policy._replace(days=days.get(name, policy.days)) for name, policy in POLICIES.items()}
+
+
+_conn = None
+_path = None
+_lock = threading.RLock()
+
+
+def _connection():
+    """The maintenance connection, with the archive attached; kept open, which
+    also keeps an in-memory archive alive."""
+    global _conn, _path
+    if _conn is None or _path != pool.path:
+        if _conn is not None:
+            _conn.close()
+        # Autocommit, so each batch controls its own transactions
+        _conn = config.connect(pool.path, timeout=30.0, isolation_level=None, check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+        _conn.execute("PRAGMA busy_timeout = 30000")
+        _conn.execute("ATTACH DATABASE ? AS archive", (config.archive_path(pool.path),))
+        _path = pool.path
+    return _conn
+
+
+def _table_info(conn, schema, table):
+    return conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()
+
+
+def _ensure_table(conn, table):
+    """Create `table` in the archive with the main table's columns, plus archived_at;
+    add any columns the main table has gained since. Returns the column names."""
+    columns = _table_info(conn, 'main', table)
+    keys = [row[1] for row in sorted(columns, key=lambda row: row[5]) if row[5]]
+    existing = {row[1] for row in _table_info(conn, 'archive', table)}
+    if not existing:
+        definitions = [f"{row[1]} {row[2]}" for row in columns] + ["archived_at TIMESTAMP NOT NULL"]
+        definitions.append(f"PRIMARY KEY ({', '.join(keys)})")
+        conn.execute(f"CREATE TABLE archive.{table} ({', '.join(definitions)})")
+        if 'date' in {row[1] for row in columns}:
+            conn.execute(f"CREATE INDEX archive.idx_{table.lower()}_date ON {table} (date)")
+    else:
+        for row in columns:
+            if row[1] not in existing:
+                conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {row[1]} {row[2]}")
+    return [row[1] for row in columns]
+
+
+def _ensure_schema(conn, policy):
+    return {table: _ensure_table(conn, table)
+            for table in [table for table, _ in policy.dependents] + [policy.table]}
+
+
+def _copy(conn, table, columns, where):
+    names = ', '.join(columns)
+    return conn.execute(f"""INSERT OR REPLACE INTO archive.{table} ({names}, archived_at)
+                            SELECT {names}, CURRENT_TIMESTAMP FROM main.{table} WHERE {where}""").rowcount
+
+
+def _move_batch(conn, policy, columns, cutoff, batch_size):
+    """Move one batch of `policy`'s rows; returns (rows, dependent rows) moved."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids (id INTEGER PRIMARY KEY)")
+    own = f"id IN ({_IDS})"
+    dependents = 0
+    # Picking, copying and deleting under one write lock: nothing can change
+    # a row, or give a project a new open task, between its copy and delete
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM temp.archive_ids")
+        conn.execute(f"""INSERT INTO temp.archive_ids
+                         SELECT id FROM main.{policy.table} WHERE {policy.condition} ORDER BY id LIMIT :limit""",
+                     {'cutoff': cutoff, 'limit': batch_size})
+        count = conn.execute("SELECT COUNT(*) FROM temp.archive_ids").fetchone()[0]
+        if count:
+            for table, where in policy.dependents:
+                _copy(conn, table, columns[table], where)
+            _copy(conn, policy.table, columns[policy.table], own)
+            for table, where in policy.dependents:
+                dependents += conn.execute(f"DELETE FROM main.{table} WHERE {where}").rowcount
+            conn.execute(f"DELETE FROM main.{policy.table} WHERE {own}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return count, dependents
+
+
+def eligible(name, policy=None, today=None):
+    """How many rows `name`'s policy would archive now."""
+    policy = policy or policies()[name]
+    if not policy.days:
+        return 0
+    cutoff = ((today or date.today()) - timedelta(days=policy.days)).isoformat()
+    return execute_query(f"SELECT COUNT(*) AS n FROM main.{policy.table} WHERE {policy.condition}",
+                         {'cutoff': cutoff}, fetchone=True)['n']
+
+
+def run(names=None, today=None, batch_size=BATCH_SIZE, pause=0.0):
+    """Apply the named policies (default: all) and return an ArchiveRun for each."""
+    today = today or date.today()
+    results = []
+    for name, policy in policies().items():
+        if (names and name not in names) or not policy.days:
+            continue
+        cutoff = (today - timedelta(days=policy.days)).isoformat()
+        started = time.perf_counter()
+        rows = dependents = 0
+        with _lock:
+            conn = _connection()
+            columns = _ensure_schema(conn, policy)
+            while True:
+                moved, dragged = _move_batch(conn, policy, columns, cutoff, batch_size)
+                rows += moved
+                dependents += dragged
+                if moved < batch_size:
+                    break
+                time.sleep(pause)
+        result = ArchiveRun(name, rows, dependents, time.perf_counter() - started)
+        if rows:
+            logger.info("Archived %d %s rows older than %s (%d dependent rows) in %.2fs",
+                        rows, policy.table, cutoff, dependents, result.seconds)
+        results.append(result)
+    return results
+
+
+def enable_incremental_vacuum():
+    """Switch the main database to auto_vacuum=INCREMENTAL.
+
+    New databases are created that way. An existing one needs a full VACUUM
+    once to convert, which rewrites the whole file and blocks writers while
+    it runs, so this is only done when asked for (python archive.py run
+    --convert).
+    """
+    with _lock:
+        conn = _connection()
+        if conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] == 2:
+            return False
+        started = time.perf_counter()
+        conn.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM main")
+        logger.info("Converted the database to incremental auto-vacuum in %.1fs", time.perf_counter() - started)
+        return True
+
+
+def reclaim(pages=VACUUM_PAGES, pause=0.0):
+    """Return free pages to the file system, `pages` at a time; returns how many.
+
+    Each step is its own short write, so app writes can go in between.
+    Does nothing unless the database uses incremental auto-vacuum.
+    """
+    freed = 0
+    with _lock:
+        conn = _connection()
+        if conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] != 2:
+            return 0
+        while True:
+            free = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+            if not free:
+                break
+            # Each step of this pragma frees one page and execute() only takes the
+            # first step; executescript runs it to the end
+            conn.executescript(f"PRAGMA main.incremental_vacuum({min(pages, free)})")
+            freed += min(pages, free)
+            time.sleep(pause)
+    if freed:
+        logger.info("Incremental vacuum returned %d free pages", freed)
+    return freed
+
+
+def status(today=None):
+    """Per policy: its age limit, rows eligible now and rows already archived;
+    plus the main database's free pages."""
+    current = policies()
+    with _lock:
+        conn = _connection()
+        archived_tables = {row[0] for row in conn.execute("SELECT name FROM archive.sqlite_master WHERE type = 'table'")}
+        rows = []
+        for name, policy in current.items():
+            archived_rows = (conn.execute(f"SELECT COUNT(*) FROM archive.{policy.table}").fetchone()[0]
+                             if policy.table in archived_tables else 0)
+            rows.append({'policy': name, 'table': policy.table, 'days': policy.days,
+                         'eligible': eligible(name, policy, today), 'archived': archived_rows})
+        free_pages = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+        incremental = conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] == 2
+    return {'policies': rows, 'free_pages': free_pages, 'incremental_vacuum': incremental}
+
+
+def query(sql, params=()):
+    """Run a read with the archive attached: `archive.Notifications`, `main.Notifications`."""
+    with _lock:
+        conn = _connection()
+        cursor = conn.execute(sql, params)
+        rows = cursor.fetchall()
+    return make_rows([column[0] for column in cursor.description or ()], rows)
+
+
+def archived(table, where='', params=(), limit=100):
+    """Archived rows of `table`, newest first, optionally filtered by a WHERE clause."""
+    with _lock:
+        conn = _connection()
+        exists = conn.execute("SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = ?",
+                              (table,)).fetchone()
+    if not exists:
+        return []
+    query_text = f"SELECT * FROM archive.{table}"
+    if where:
+        query_text += f" WHERE {where}"
+    return query(query_text + " ORDER BY archived_at DESC, rowid DESC LIMIT ?", tuple(params) + (limit,))
+
+
+_maintainer = None
+
+
+def _maintain():
+    while True:
+        time.sleep(INTERVAL_SECONDS)
+        try:
+            run(pause=0.05)
+            reclaim(pause=0.05)
+        except Exception:
+            logger.exception("Archive maintenance failed")
+
+
+def start_maintenance():
+    """Start the background thread that archives and vacuums every INTERVAL_SECONDS."""
+    global _maintainer
+    with _lock:
+        if _maintainer is None and INTERVAL_SECONDS > 0:
+            _maintainer = threading.Thread(target=_maintain, name='archive-maintenance', daemon=True)
+            _maintainer.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    apply = commands.add_parser('run', help="archive rows past their retention age, then reclaim free pages")
+    apply.add_argument('policy', nargs='*', help=f"any of {', '.join(POLICIES)} (default: all)")
+    apply.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    apply.add_argument('--dry-run', action='store_true', help="only count the rows that would move")
+    apply.add_argument('--convert', action='store_true',
+                       help="first switch an existing database to incremental auto-vacuum (runs a full VACUUM)")
+    commands.add_parser('status', help="rows eligible and archived per policy")
+    show = commands.add_parser('show', help="print archived rows")
+    show.add_argument('policy', choices=sorted(POLICIES))
+    show.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+    unknown = set(getattr(args, 'policy', None) or ()) - set(POLICIES)
+    if args.command == 'run' and unknown:
+        parser.error(f"unknown policy: {', '.join(sorted(unknown))}")
+    initialize_database()
+
+    if args.command == 'run' and args.dry_run:
+        for name in args.policy or POLICIES:
+            print(f"{name}: {eligible(name)} rows would be archived")
+    elif args.command == 'run':
+        if args.convert:
+            enable_incremental_vacuum()
+        for result in run(args.policy, batch_size=args.batch_size):
+            print(f"{result.policy}: {result.rows} rows archived ({result.dependents} dependent) "
+                  f"in {result.seconds:.2f}s")
+        print(f"{reclaim()} free pages reclaimed")
+    elif args.command == 'status':
+        report = status()
+        for row in report['policies']:
+            print(f"{row['policy']:<14} {row['days']:>5} days  {row['eligible']:>8} eligible  "
+                  f"{row['archived']:>8} archived")
+        print(f"{report['free_pages']} free pages; incremental vacuum "
+              f"{'on' if report['incremental_vacuum'] else 'off (run with --convert)'}")
+    else:
+        for row in archived(POLICIES[args.policy].table, limit=args.limit):
+            print(dict(row))
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
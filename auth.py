@@ -1,46 +1,49 @@
 from database import User
-import hashlib
+from passwords import hasher
 import logging
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
 
 def hash_password(password):
-    logger.debug(f"Hashing password: {password}")
-    hashed = hashlib.sha256(password.encode()).hexdigest()
-    logger.debug(f"Hashed password: {hashed}")
-    return hashed
+    return hasher.hash(password)
 
 def login(username, password):
-    logger.debug(f"Login attempt for user: {username}")
+    """Return the user on a correct password, else None.
+
+    Raises passwords.HasherBusy when too many logins are already waiting to
+    be checked.
+    """
+    logger.debug("Login attempt for user: %s", username)
     user = User.get_by_username(username)
     if user:
-        logger.debug(f"User found: {username}")
-        logger.debug(f"Stored hashed password: {user['password']}")
-        entered_hash = hash_password(password)
-        logger.debug(f"Entered password hash: {entered_hash}")
-        if user['password'] == entered_hash:
+        logger.debug("User found: %s", username)
+        matches, needs_rehash = hasher.verify(password, user['password'])
+        if matches:
             logger.debug("Password match successful")
+            if needs_rehash:
+                User.set_password_hash(username, hasher.hash(password))
+                logger.info("Upgraded password hash for user: %s", username)
             return user
         else:
             logger.debug("Password match failed")
     else:
-        logger.debug(f"User not found: {username}")
+        # Take as long as a real check so response times don't reveal which usernames exist
+        hasher.burn()
+        logger.debug("User not found: %s", username)
     return None
 
 def register(username, password):
-    logger.debug(f"Registration attempt for user: {username}")
+    logger.debug("Registration attempt for user: %s", username)
     if User.get_by_username(username):
-        logger.debug(f"Username already exists: {username}")
+        logger.debug("Username already exists: %s", username)
         return False
     hashed_password = hash_password(password)
-    logger.debug(f"Hashed password for registration: {hashed_password}")
-    User.create(username, hashed_password)  # Make sure this is passing the hashed password
-    logger.debug(f"User created: {username}")
+    User.create(username, hashed_password)
+    logger.debug("User created: %s", username)
     return True
 
 def check_login(session):
     return session.get('user') is not None
 
 def logout(session):
-    session['user'] = None
\ No newline at end of file
+    session['user'] = None
@@ -0,0 +1,283 @@
+"""In-memory interval index over ResourceIntervals.
+
+Availability windows and bookings are kept per resource in interval trees
+(treaps ordered by start date and augmented with the largest end date in
+each subtree), so "is this crane free from the 3rd to the 17th" and "which
+bookings overlap this one" cost O(log n + matches) instead of a scan.
+
+The index is built from the database on first use and then follows the
+model layer: every committed ResourceInterval insert or delete is applied
+to it as it happens. Writes from other processes are caught by comparing
+the TableVersions counter for ResourceIntervals with the number of row
+changes the index has applied; on a mismatch the index is rebuilt.
+"""
+import logging
+import random
+import threading
+from collections import defaultdict
+from datetime import date
+
+from database import Resource, ResourceInterval, change_tracker, on_write, pool, read_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _to_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+class _Node:
+    __slots__ = ('start', 'end', 'key', 'value', 'priority', 'left', 'right', 'max_end')
+
+    def __init__(self, start, end, key, value):
+        self.start = start
+        self.end = end
+        self.key = key
+        self.value = value
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+    def order(self):
+        return (self.start, self.end, self.key)
+
+
+def _update(node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _insert(node, new):
+    if node is None:
+        return new
+    if new.order() < node.order():
+        node.left = _insert(node.left, new)
+        if node.left.priority > node.priority:
+            return _rotate_right(node)
+    else:
+        node.right = _insert(node.right, new)
+        if node.right.priority > node.priority:
+            return _rotate_left(node)
+    _update(node)
+    return node
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _remove(node, order):
+    """Return (new subtree, removed?)."""
+    if node is None:
+        return None, False
+    if order == node.order():
+        return _merge(node.left, node.right), True
+    if order < node.order():
+        node.left, removed = _remove(node.left, order)
+    else:
+        node.right, removed = _remove(node.right, order)
+    _update(node)
+    return node, removed
+
+
+def _overlapping(node, start, end, out):
+    if node is None or node.max_end < start:
+        return
+    _overlapping(node.left, start, end, out)
+    if node.start > end:
+        return
+    if node.end >= start:
+        out.append((node.start, node.end, node.key, node.value))
+    _overlapping(node.right, start, end, out)
+
+
+class IntervalTree:
+    """Closed intervals [start, end] identified by a unique key."""
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, start, end, key, value=None):
+        self._root = _insert(self._root, _Node(start, end, key, value))
+        self._size += 1
+
+    def remove(self, start, end, key):
+        self._root, removed = _remove(self._root, (start, end, key))
+        if removed:
+            self._size -= 1
+        return removed
+
+    def overlapping(self, start, end):
+        """(start, end, key, value) of every interval meeting [start, end], by start."""
+        out = []
+        _overlapping(self._root, start, end, out)
+        return out
+
+    def covers(self, start, end):
+        """True if the union of the stored intervals contains every day of [start, end]."""
+        reached = start
+        for interval_start, interval_end, _, _ in self.overlapping(start, end):
+            if interval_start > reached:
+                return False
+            if interval_end >= end:
+                return True
+            reached = max(reached, date.fromordinal(interval_end.toordinal() + 1))
+        return False
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._available = defaultdict(IntervalTree)
+        self._bookings = defaultdict(IntervalTree)
+        self._all_bookings = IntervalTree()
+        self._version = None
+        self._applied = 0
+        self._built = False
+        self._path = None
+
+    def _trees(self, kind):
+        return self._available if kind == 'available' else self._bookings
+
+    def _add(self, row):
+        start, end = _to_date(row['start_date']), _to_date(row['end_date'])
+        self._trees(row['kind'])[row['resource_id']].insert(start, end, row['id'], row)
+        if row['kind'] == 'booking':
+            self._all_bookings.insert(start, end, row['id'], row)
+
+    def _discard(self, row):
+        start, end = _to_date(row['start_date']), _to_date(row['end_date'])
+        self._trees(row['kind'])[row['resource_id']].remove(start, end, row['id'])
+        if row['kind'] == 'booking':
+            self._all_bookings.remove(start, end, row['id'])
+
+    def apply(self, action, rows):
+        """on_write listener for ResourceIntervals."""
+        with self._lock:
+            if not self._built:
+                return
+            for row in rows:
+                if action == 'insert':
+                    self._add(row)
+                else:
+                    self._discard(row)
+            self._applied += len(rows)
+
+    def rebuild(self):
+        with self._lock:
+            change_tracker.sync(read_cache)
+            self._version = change_tracker.versions().get('ResourceIntervals')
+            self._applied = 0
+            self._path = pool.path
+            self._available.clear()
+            self._bookings.clear()
+            self._all_bookings = IntervalTree()
+            rows = ResourceInterval.get_all()
+            self._built = True
+            for row in rows:
+                self._add(row)
+            logger.info("Built availability index over %d intervals", len(rows))
+
+    def _ensure_current(self):
+        change_tracker.sync(read_cache)
+        version = change_tracker.versions().get('ResourceIntervals')
+        with self._lock:
+            # Each row written bumps the version by one, so the index is current
+            # exactly when it has applied every change since it was built.
+            if (not self._built or self._path != pool.path
+                    or (version or 0) != (self._version or 0) + self._applied):
+                self.rebuild()
+
+    def is_free(self, resource_id, start, end):
+        """Available for the whole of [start, end] and not booked on any day of it.
+
+        Resources without availability windows are treated as always available.
+        """
+        self._ensure_current()
+        with self._lock:
+            return self._is_free(resource_id, _to_date(start), _to_date(end))
+
+    def _is_free(self, resource_id, start, end):
+        available = self._available.get(resource_id)
+        if available is not None and len(available) and not available.covers(start, end):
+            return False
+        bookings = self._bookings.get(resource_id)
+        return bookings is None or not bookings.overlapping(start, end)
+
+    def free_resources(self, start, end, type=None):
+        start, end = _to_date(start), _to_date(end)
+        resources = Resource.get_all()
+        self._ensure_current()
+        with self._lock:
+            return [resource for resource in resources
+                    if (type is None or resource['type'] == type) and self._is_free(resource['id'], start, end)]
+
+    def bookings_between(self, start, end, resource_id=None):
+        start, end = _to_date(start), _to_date(end)
+        self._ensure_current()
+        with self._lock:
+            tree = self._all_bookings if resource_id is None else self._bookings.get(resource_id, IntervalTree())
+            return [value for _, _, _, value in tree.overlapping(start, end)]
+
+    def conflicts(self, resource_id=None):
+        """Double bookings and bookings outside the resource's availability.
+
+        Returns dicts with 'kind' ('double_booking' or 'unavailable') and the
+        'bookings' involved; each overlapping pair is reported once.
+        """
+        self._ensure_current()
+        found = []
+        with self._lock:
+            resource_ids = [resource_id] if resource_id is not None else list(self._bookings)
+            for rid in resource_ids:
+                bookings = self._bookings.get(rid)
+                if bookings is None:
+                    continue
+                available = self._available.get(rid)
+                for start, end, key, booking in bookings.overlapping(date.min, date.max):
+                    for _, _, other_key, other in bookings.overlapping(start, end):
+                        if other_key > key:
+                            found.append({'kind': 'double_booking', 'resource_id': rid, 'bookings': [booking, other]})
+                    if available is not None and len(available) and not available.covers(start, end):
+                        found.append({'kind': 'unavailable', 'resource_id': rid, 'bookings': [booking]})
+        return found
+
+
+index = AvailabilityIndex()
+on_write('ResourceIntervals', index.apply)
@@ -0,0 +1,6 @@
+"""Benchmarks for the model layer, the Streamlit pages and password hashing.
+
+    python -m benchmarks.run --scale 1000 --output bench-1k.json
+    python -m benchmarks.run --scale 1000 --compare bench-1k.json
+    python -m benchmarks.bench_auth
+"""
@@ -0,0 +1,99 @@
+"""Load test of the HTTP API: requests per second under concurrent clients.
+
+The server runs on a background thread against whatever database the
+database module is pointed at. `concurrency` client connections, each
+kept alive, send requests back to back for `seconds`. The clients share
+one event loop in this process.
+
+    python -m benchmarks.bench_api --db bench.db --concurrency 32 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import database
+from api import Server
+from benchmarks.timing import summarize
+
+
+def scenarios(counts):
+    """(name, path, extra headers) for the requests pollers make."""
+    middle = counts['Projects'] // 2 or 1
+    return [
+        ("GET /api/projects", "/api/projects?limit=50", {'Accept-Encoding': 'gzip'}),
+        ("GET /api/projects (304)", "/api/projects?limit=50", 'etag'),
+        ("GET /api/projects/{id}", f"/api/projects/{middle}", {}),
+        ("GET /api/budgets?project_id", "/api/budgets?project_id=1&limit=50", {'Accept-Encoding': 'gzip'}),
+    ]
+
+
+async def _request(reader, writer, path, headers):
+    lines = [f"GET {path} HTTP/1.1", "Host: localhost"] + [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode().partition(':')
+        response_headers[name.lower()] = value.strip()
+    await reader.readexactly(int(response_headers.get('content-length', 0)))
+    return status, response_headers
+
+
+async def _client(port, path, headers, deadline, samples, statuses):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status, _ = await _request(reader, writer, path, headers)
+            samples.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def _load(port, path, headers, concurrency, seconds):
+    if headers == 'etag':
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        _, response_headers = await _request(reader, writer, path, {})
+        writer.close()
+        headers = {'If-None-Match': response_headers['etag']}
+    samples, statuses = [], {}
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(port, path, headers, started + seconds, samples, statuses)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    result = summarize(samples)
+    # summarize's ops/s is per connection; this is the server's aggregate
+    result['ops_per_second'] = round(len(samples) / elapsed, 1)
+    result['statuses'] = {str(status): count for status, count in sorted(statuses.items())}
+    return result
+
+
+def run(counts, concurrency=16, seconds=3.0):
+    server = Server(port=0)
+    port = server.start()
+    try:
+        results = {}
+        for name, path, headers in scenarios(counts):
+            results[f"api: {name} x{concurrency}"] = asyncio.run(_load(port, path, headers, concurrency, seconds))
+        return results
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help="database to serve, e.g. one made by benchmarks.datagen")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+    database.pool.reopen(args.db)
+    database.initialize_database()
+    counts = {'Projects': database.execute_query("SELECT count(*) AS n FROM Projects", fetchone=True)['n']}
+    print(json.dumps(run(counts, args.concurrency, args.seconds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
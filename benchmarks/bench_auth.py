@@ -0,0 +1,50 @@
+"""Login throughput against the password hashing pool.
+
+    python -m benchmarks.bench_auth [--logins 200] [--rounds 10]
+
+Runs `--logins` concurrent verifications through PasswordHasher for each
+worker count from 1 up to the number of cores and prints logins per second.
+Pass --rounds to pin the bcrypt cost; by default it is calibrated as the
+app would.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passwords import PasswordHasher, calibrate
+
+
+def run(workers, logins, rounds):
+    hasher = PasswordHasher(workers=workers, max_pending=logins, rounds=rounds, timeout=600)
+    stored = hasher.hash("correct horse battery staple")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=logins) as sessions:
+        results = list(sessions.map(lambda _: hasher.verify("correct horse battery staple", stored)[0], range(logins)))
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+    assert all(results)
+    return {'workers': workers, 'logins': logins, 'rounds': rounds,
+            'seconds': round(elapsed, 3), 'logins_per_second': round(logins / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--rounds', type=int)
+    parser.add_argument('--json', action='store_true', help="print one JSON object per worker count")
+    args = parser.parse_args()
+    rounds = args.rounds or calibrate()
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, 16, 32, cores} & set(range(1, cores + 1)))
+    for workers in counts:
+        result = run(workers, args.logins, rounds)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{workers:>3} workers: {result['logins_per_second']:>8.1f} logins/s (cost {rounds})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Throughput and latency of the model methods against a generated database.
+
+Each read is measured twice: "cold", with the read cache cleared before
+every call so the query always reaches SQLite, and "cached", as the app
+normally runs. Writes are committed, so run this against a scratch
+database made by benchmarks.datagen.
+"""
+import threading
+import time
+from datetime import date
+
+import database
+import search
+import status_reports
+from database import Budget, Message, Notification, Project, Report, Resource, Task, User
+from benchmarks.timing import measure, summarize
+
+READ_MODELS = (Project, Task, Budget, Message, Notification, Resource, Report)
+PAGE = 25
+
+# get_all is what the pages used before pagination; past this size it takes
+# seconds per call and only a few samples are worth taking
+GET_ALL_LIMIT = 20000
+
+
+def read_benchmarks(counts):
+    """(name, func) pairs for the reads the pages make."""
+    for model in READ_MODELS:
+        name = model.__name__
+        rows = counts[name + 's']
+        # Generated ids are dense, so this is the cursor of the next-to-last page
+        deep = max(rows - PAGE, 0)
+        yield f"{name}.page(first)", lambda model=model: model.page(limit=PAGE + 1)
+        yield f"{name}.page(deep)", lambda model=model, deep=deep: model.page(after_id=deep, limit=PAGE + 1)
+        yield f"{name}.get_by_id", lambda model=model, row_id=rows // 2 or 1: model.get_by_id(row_id)
+        if rows <= GET_ALL_LIMIT:
+            yield f"{name}.get_all", model.get_all
+    yield "Project.page(order_by=-start_date)", lambda: Project.page(order_by='-start_date', limit=PAGE + 1)
+    yield "Budget.page(filters=project_id)", lambda: Budget.page(filters={'project_id': 1}, limit=PAGE + 1)
+    yield "Message.page(filters=to_user)", lambda: Message.page(filters={'to_user': 'user1'}, limit=PAGE + 1)
+    yield "User.get_by_username", lambda: User.get_by_username('user1')
+    yield "search(common word)", lambda: search.search("concrete")
+    yield "search(two words)", lambda: search.search("crane inspection")
+    yield "search(prefix)", lambda: search.search("scaf")
+    yield "status_reports.compute", status_reports.compute
+
+
+def write_benchmarks(counts):
+    today = date.today().isoformat()
+    middle_budget = counts['Budgets'] // 2 or 1
+    return [
+        ("Budget.create", lambda: Budget.create(1, 125.0, today)),
+        ("Budget.update", lambda: Budget.update(middle_budget, 1, 250.0, today)),
+        ("Message.create", lambda: Message.create('user0', 'user1', "Delivery moved to Thursday", today)),
+        ("Task.create", lambda: Task.create("Benchmark task", today, today, "")),
+        ("Budget.create_many(100)", lambda: Budget.create_many([(1, 10.0, today)] * 100)),
+        ("Notification.create_many(100)",
+         lambda: Notification.create_many([("Site closed for inspection", today)] * 100)),
+    ]
+
+
+def concurrent_writes(func, threads=8, per_thread=50):
+    """Call `func` from `threads` threads at once, as concurrent sessions would."""
+    samples = []
+    errors = []
+
+    def session():
+        try:
+            for _ in range(per_thread):
+                started = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - started)
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=session) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    result = summarize(samples)
+    # summarize's ops/s is per thread; this is the aggregate
+    result['ops_per_second'] = round(len(samples) / elapsed, 1)
+    result['errors'] = len(errors)
+    return result
+
+
+def run(counts, iterations=200, max_seconds=10.0):
+    """Measure every read cold and cached, then every write; return name -> summary."""
+    results = {}
+    for name, func in read_benchmarks(counts):
+        results[f"{name} [cold]"] = measure(lambda _, func=func: func(), iterations=iterations,
+                                            max_seconds=max_seconds, setup=database.read_cache.clear)
+        results[f"{name} [cached]"] = measure(func, iterations=iterations, max_seconds=max_seconds)
+    for name, func in write_benchmarks(counts):
+        results[name] = measure(func, iterations=iterations, max_seconds=max_seconds)
+    today = date.today().isoformat()
+    results["Budget.create x8 threads"] = concurrent_writes(lambda: Budget.create(1, 125.0, today),
+                                                            per_thread=max(iterations // 4, 10))
+    return results
@@ -0,0 +1,38 @@
+"""Render time of each Streamlit page, measured with streamlit.testing's AppTest.
+
+The script runs in this process against whatever database the database
+module is pointed at, signed in as the generated admin. Each page is
+opened once and then re-run repeatedly, which is what happens on every
+widget interaction.
+"""
+import os
+
+from database import User
+from benchmarks.timing import measure
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+PAGES = ("View Projects", "Manage Projects", "File Management", "Notifications", "Resource Management",
+         "Project Planning", "Budget Management", "Communication", "Reporting", "Performance")
+
+
+def open_page(page, user, timeout=60):
+    # Imported here so `benchmarks.run --no-pages` never loads Streamlit
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP, default_timeout=timeout)
+    app.session_state.user = user
+    app.run()
+    app.sidebar.selectbox[0].set_value(page).run()
+    if app.exception:
+        raise RuntimeError(f"{page} raised: {app.exception[0].value}")
+    return app
+
+
+def run(pages=PAGES, iterations=20, max_seconds=30.0, username='user0'):
+    user = dict(User.get_by_username(username))
+    results = {}
+    for page in pages:
+        app = open_page(page, user)
+        results[f"page: {page}"] = measure(app.run, iterations=iterations, warmup=1, max_seconds=max_seconds)
+    return results
@@ -0,0 +1,176 @@
+"""Seeded synthetic data for every table.
+
+    python -m benchmarks.datagen --scale 100000 --db bench.db --seed 1
+
+`scale` is the row count of the large tables (Tasks, Budgets, Messages,
+Notifications); the others are sized in proportion to it. The same seed and
+scale always produce the same database. Rows are written with executemany
+in chunks, through the same triggers the app uses, so rollups, version
+counters and indexes end up as they would in production.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+import database
+from database import execute_many, transaction
+from passwords import PasswordHasher
+
+CHUNK = 10000
+BASE_DATE = date(2024, 1, 1)
+
+WORDS = ("concrete steel rebar pour formwork crane scaffold inspection delay weather permit foundation "
+         "framing roofing drywall electrical plumbing hvac survey excavation backfill drainage asphalt "
+         "curtain wall glazing handover snag punch list safety induction delivery site meeting budget "
+         "variation claim invoice subcontractor supplier drawing revision approval schedule").split()
+RESOURCE_TYPES = ("crane", "excavator", "mixer", "scaffold", "generator", "loader", "crew")
+
+
+def sizes(scale):
+    return {
+        'Users': max(5, min(scale // 100, 1000)),
+        'Projects': max(10, scale // 100),
+        'Tasks': scale,
+        'Budgets': scale,
+        'Messages': scale,
+        'Notifications': scale,
+        'Resources': max(10, scale // 100),
+        'Files': max(10, scale // 10),
+        'Reports': max(10, scale // 100),
+    }
+
+
+def _sentence(rng, words=8):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _day(offset):
+    return (BASE_DATE + timedelta(days=offset)).isoformat()
+
+
+def _write(query, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == CHUNK:
+            with transaction():
+                execute_many(query, batch)
+            batch = []
+    if batch:
+        with transaction():
+            execute_many(query, batch)
+
+
+def generate(path, scale=1000, seed=1):
+    """Create a fresh database at `path` filled at `scale`; return the row counts."""
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists; datagen only fills new databases")
+    database.pool.reopen(path)
+    database.initialize_database()
+    rng = random.Random(seed)
+    counts = sizes(scale)
+
+    # One cheap hash shared by every generated user; login cost is benchmarked separately
+    cheap = PasswordHasher(workers=1, rounds=4)
+    password = cheap.hash("password")
+    cheap.shutdown()
+    usernames = [f"user{i}" for i in range(counts['Users'])]
+    _write("INSERT INTO Users (username, password, role) VALUES (?, ?, ?)",
+           ((name, password, 'admin' if i == 0 else 'user') for i, name in enumerate(usernames)))
+
+    def projects():
+        for i in range(counts['Projects']):
+            start = rng.randrange(0, 700)
+            yield (f"Project {i}", _sentence(rng, 20), _day(start), _day(start + rng.randrange(90, 900)),
+                   round(rng.uniform(0.5, 2.0) * 25000 * counts['Budgets'] / counts['Projects'], -3))
+    _write("""INSERT INTO Projects (name, description, start_date, end_date, planned_budget)
+              VALUES (?, ?, ?, ?, ?)""", projects())
+
+    # Tasks come in chains of up to 50, each depending on the previous one and
+    # sometimes on an earlier task of the same chain
+    edges = []
+
+    def tasks():
+        project_id = None
+        for i in range(counts['Tasks']):
+            task_id = i + 1
+            chain_start = task_id - i % 50
+            dependencies = []
+            if task_id > chain_start:
+                dependencies.append(task_id - 1)
+                if task_id - chain_start > 2 and rng.random() < 0.3:
+                    dependencies.append(rng.randrange(chain_start, task_id - 1))
+            edges.extend((task_id, dependency) for dependency in dependencies)
+            if task_id == chain_start:
+                project_id = rng.randrange(1, counts['Projects'] + 1)
+            start = rng.randrange(0, 900)
+            end = start + rng.randrange(1, 30)
+            yield (f"Task {task_id}", _day(start), _day(end), ", ".join(map(str, dependencies)), project_id,
+                   _day(end + rng.randrange(-2, 5)) if rng.random() < 0.6 else None)
+    _write("""INSERT INTO Tasks (name, start_date, end_date, dependencies, project_id, completed_at)
+              VALUES (?, ?, ?, ?, ?, ?)""", tasks())
+    _write("INSERT INTO TaskDependencies (task_id, depends_on) VALUES (?, ?)", edges)
+
+    _write("INSERT INTO Budgets (project_id, amount, date) VALUES (?, ?, ?)",
+           ((rng.randrange(1, counts['Projects'] + 1), round(rng.uniform(100, 50000), 2), _day(rng.randrange(0, 900)))
+            for _ in range(counts['Budgets'])))
+
+    def messages():
+        for _ in range(counts['Messages']):
+            sender, recipient = rng.sample(usernames, 2)
+            yield (sender, recipient, _sentence(rng, 12), _day(rng.randrange(0, 900)))
+    _write("INSERT INTO Messages (from_user, to_user, content, date) VALUES (?, ?, ?, ?)", messages())
+
+    # Each notification is fanned out to its recipient's inbox, so broadcasts
+    # (recipient NULL, one inbox row per user) are kept rare
+    _write("INSERT INTO Notifications (message, date, recipient) VALUES (?, ?, ?)",
+           ((_sentence(rng, 10), _day(rng.randrange(0, 900)), None if rng.random() < 0.01 else rng.choice(usernames))
+            for _ in range(counts['Notifications'])))
+
+    def resources():
+        for i in range(counts['Resources']):
+            start = rng.randrange(0, 300)
+            yield (f"Resource {i}", rng.choice(RESOURCE_TYPES), f"{_day(start)} to {_day(start + rng.randrange(60, 600))}")
+    resource_rows = list(resources())
+    _write("INSERT INTO Resources (name, type, availability) VALUES (?, ?, ?)", resource_rows)
+
+    def intervals():
+        for resource_id, (_, _, availability) in enumerate(resource_rows, start=1):
+            start, end = availability.split(" to ")
+            yield (resource_id, 'available', start, end, None)
+            for _ in range(rng.randrange(0, 5)):
+                booked = rng.randrange(0, 900)
+                yield (resource_id, 'booking', _day(booked), _day(booked + rng.randrange(1, 20)),
+                       rng.randrange(1, counts['Projects'] + 1))
+    _write("""INSERT INTO ResourceIntervals (resource_id, kind, start_date, end_date, project_id)
+              VALUES (?, ?, ?, ?, ?)""", intervals())
+
+    def files():
+        for i in range(counts['Files']):
+            yield (f"drawing-{i}.pdf", f"uploads/blobs/{i:064x}", rng.randrange(1, counts['Projects'] + 1))
+    _write("INSERT INTO Files (name, path, project_id) VALUES (?, ?, ?)", files())
+    _write("""INSERT INTO FileVersions (file_id, version, sha256, size, uploaded_by, uploaded_at)
+              VALUES (?, 1, ?, ?, ?, ?)""",
+           ((i + 1, f"{i:064x}", rng.randrange(10_000, 50_000_000), rng.choice(usernames),
+             _day(rng.randrange(0, 900)) + " 09:00:00") for i in range(counts['Files'])))
+
+    _write("INSERT INTO Reports (name, content, date) VALUES (?, ?, ?)",
+           ((f"Report {i}", _sentence(rng, 60), _day(rng.randrange(0, 900))) for i in range(counts['Reports'])))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', required=True)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    counts = generate(args.db, args.scale, args.seed)
+    print(f"Generated {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
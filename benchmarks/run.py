@@ -0,0 +1,111 @@
+"""Generate a database and run the model, page and API benchmarks against it.
+
+    python -m benchmarks.run --scale 10000 --output bench.json
+    python -m benchmarks.run --scale 10000 --compare bench.json
+
+Results are a JSON object of benchmark name -> latency summary, plus the
+scale, seed, git commit and Python version they were taken with. With
+--compare, each benchmark's median is checked against the previous file
+and the run exits with status 1 if any got slower by more than
+--threshold (a fraction, default 0.2).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks import bench_api, bench_models, bench_pages, datagen
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current, threshold):
+    """Return (name, previous p50, current p50, ratio) for every benchmark in both runs,
+    and the subset that regressed by more than `threshold`."""
+    rows = []
+    for name, result in current['results'].items():
+        before = previous['results'].get(name)
+        if not before or not before['p50_ms']:
+            continue
+        ratio = result['p50_ms'] / before['p50_ms']
+        rows.append((name, before['p50_ms'], result['p50_ms'], ratio))
+    regressions = [row for row in rows if row[3] > 1 + threshold]
+    return rows, regressions
+
+
+def print_results(results):
+    width = max(len(name) for name in results)
+    print(f"{'benchmark':<{width}}  {'ops/s':>10}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}")
+    for name, result in results.items():
+        print(f"{name:<{width}}  {result['ops_per_second'] or 0:>10.1f}  {result['p50_ms']:>9.3f}  "
+              f"{result['p95_ms']:>9.3f}  {result['p99_ms']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', help="database to generate (default: a temporary file)")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--no-pages', action='store_true', help="skip the Streamlit page benchmarks")
+    parser.add_argument('--no-api', action='store_true', help="skip the HTTP API load test")
+    parser.add_argument('--concurrency', type=int, default=16, help="client connections in the API load test")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="previous results JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = args.db or os.path.join(scratch, 'bench.db')
+        started = time.perf_counter()
+        counts = datagen.generate(path, args.scale, args.seed)
+        print(f"Generated {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        results = bench_models.run(counts, iterations=args.iterations)
+        if not args.no_pages:
+            results.update(bench_pages.run(iterations=max(args.iterations // 10, 5)))
+        if not args.no_api:
+            results.update(bench_api.run(counts, concurrency=args.concurrency))
+
+    report = {
+        'scale': args.scale,
+        'seed': args.seed,
+        'rows': counts,
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'results': results,
+    }
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if previous.get('scale') != args.scale:
+            print(f"Warning: comparing scale {args.scale} against scale {previous.get('scale')}", file=sys.stderr)
+        rows, regressions = compare(previous, report, args.threshold)
+        for name, before, after, ratio in rows:
+            marker = "  REGRESSION" if ratio > 1 + args.threshold else ""
+            print(f"{name}: {before:.3f} -> {after:.3f} ms ({ratio:.2f}x){marker}")
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower by more than {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import statistics
+import time
+
+
+def summarize(samples):
+    """Latency percentiles (ms) and throughput for a list of durations in seconds."""
+    samples = sorted(samples)
+    count = len(samples)
+    total = sum(samples)
+
+    def percentile(fraction):
+        return samples[min(count - 1, int(fraction * count))] * 1000
+
+    return {
+        'count': count,
+        'ops_per_second': round(count / total, 1) if total else None,
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(percentile(0.50), 3),
+        'p95_ms': round(percentile(0.95), 3),
+        'p99_ms': round(percentile(0.99), 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+
+def measure(func, iterations=100, warmup=5, min_seconds=0.0, max_seconds=30.0, setup=None):
+    """Call `func` repeatedly and summarize its latency.
+
+    `setup`, if given, runs before every call and its return value is passed
+    to `func`; it is not timed. Stops after `iterations` calls once
+    `min_seconds` have passed, or after `max_seconds` regardless.
+    """
+    for _ in range(warmup):
+        func(setup()) if setup else func()
+    samples = []
+    started = time.perf_counter()
+    while True:
+        argument = setup() if setup else None
+        call_started = time.perf_counter()
+        func(argument) if setup else func()
+        samples.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+        if (len(samples) >= iterations and elapsed >= min_seconds) or elapsed >= max_seconds:
+            break
+    return summarize(samples)
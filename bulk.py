@@ -0,0 +1,408 @@
+"""Bulk import and export of projects, tasks and budgets as CSV or Parquet.
+
+    python bulk.py import tasks schedule.csv [--map "Task Name=name" ...] [--no-resume]
+    python bulk.py export budgets budgets.parquet
+    python bulk.py jobs
+
+Imports stream the file in chunks of `chunk_size` rows. Each row is
+validated and converted, and each chunk is loaded with one executemany in
+one transaction. A chunk that the database rejects is retried row by row,
+so one bad row doesn't cost its neighbours. Progress is stored in
+ImportJobs in the same transaction as the chunk. If an import stops
+partway, running it again on the same file continues after the last
+committed chunk.
+
+Source columns are matched to fields by name, ignoring case, spaces and
+punctuation ("Start Date" -> start_date); pass a mapping for anything else.
+
+Exports read from their own read-only connection and write chunk by
+chunk, so memory use stays flat however large the table is.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+from collections import namedtuple
+from datetime import date, datetime
+
+import config
+from database import Budget, Project, Task, execute_query, initialize_database, pool, transaction
+from logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+HASH_BLOCK_BYTES = 1 << 20
+KEPT_ERRORS = 100
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _integer(value):
+    if isinstance(value, int):
+        return value
+    value = _text(value)
+    if value is None:
+        return None
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"'{value}' is not a whole number")
+    return int(number)
+
+
+def _number(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = _text(value)
+    return None if value is None else float(value)
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    value = _text(value)
+    return None if value is None else date.fromisoformat(value[:10]).isoformat()
+
+
+# Field types: converter and the Parquet type used on export
+_TYPES = {_text: 'string', _integer: 'int64', _number: 'float64', _date: 'string'}
+
+Field = namedtuple('Field', ('name', 'convert', 'required'))
+Entity = namedtuple('Entity', ('table', 'model', 'fields'))
+
+# Fields are in the order the model's create_many expects
+ENTITIES = {
+    'projects': Entity('Projects', Project, (
+        Field('name', _text, True),
+        Field('description', _text, False),
+        Field('start_date', _date, False),
+        Field('end_date', _date, False),
+    )),
+    'tasks': Entity('Tasks', Task, (
+        Field('name', _text, True),
+        Field('start_date', _date, True),
+        Field('end_date', _date, True),
+        Field('dependencies', _text, False),
+        Field('project_id', _integer, False),
+    )),
+    'budgets': Entity('Budgets', Budget, (
+        Field('project_id', _integer, True),
+        Field('amount', _number, True),
+        Field('date', _date, True),
+    )),
+}
+
+Source = namedtuple('Source', ('headers', 'rows', 'total', 'fingerprint', 'name', 'close'))
+
+
+def _normalize(header):
+    return re.sub(r'[^a-z0-9]+', '_', str(header).lower()).strip('_')
+
+
+def _format_of(name, fmt=None):
+    fmt = fmt or os.path.splitext(name)[1].lstrip('.').lower()
+    if fmt not in ('csv', 'parquet'):
+        raise ValueError(f"Unsupported format '{fmt}'; use csv or parquet")
+    return fmt
+
+
+def source_fingerprint(source):
+    """Identify a file across runs: path, size and mtime, or name, size and
+    the sha256 of the content for an upload.
+
+    An upload is read through once to hash it, then put back where it was.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        return f"{os.path.abspath(source)}:{stat.st_size}:{int(stat.st_mtime)}"
+    start = source.tell()
+    digest = hashlib.sha256()
+    size = 0
+    for block in iter(lambda: source.read(HASH_BLOCK_BYTES), b''):
+        digest.update(block)
+        size += len(block)
+    source.seek(start)
+    return f"{getattr(source, 'name', 'upload')}:{size}:{digest.hexdigest()}"
+
+
+def open_source(source, fmt=None, chunk_size=CHUNK_SIZE):
+    """Open a path or binary file object (with a .name, like a Streamlit upload) for streaming."""
+    if isinstance(source, (str, os.PathLike)):
+        name = os.fspath(source)
+        handle = open(name, 'rb')
+    else:
+        name = getattr(source, 'name', 'upload')
+        handle = source
+    fingerprint = source_fingerprint(source)
+    fmt = _format_of(name, fmt)
+    # A file object we were handed is left open for the caller
+    owned = handle is not source
+    if fmt == 'csv':
+        text = io.TextIOWrapper(handle, encoding='utf-8-sig', newline='')
+        reader = csv.DictReader(text)
+        return Source(reader.fieldnames or [], iter(reader), None, fingerprint, name,
+                      text.close if owned else text.detach)
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(handle)
+    rows = (row for batch in parquet.iter_batches(batch_size=chunk_size) for row in batch.to_pylist())
+    return Source(parquet.schema_arrow.names, rows, parquet.metadata.num_rows, fingerprint, name,
+                  handle.close if owned else lambda: None)
+
+
+def resolve_mapping(headers, entity, mapping=None):
+    """Return {field name: source column}, using `mapping` ({source column: field
+    name}) where given and matching names otherwise."""
+    field_names = {field.name for field in entity.fields}
+    mapping = dict(mapping or {})
+    unknown = set(mapping.values()) - field_names
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    columns = {field: source for source, field in mapping.items() if source in headers}
+    for header in headers:
+        field = _normalize(header)
+        if field in field_names and field not in columns and header not in mapping:
+            columns[field] = header
+    missing = [field.name for field in entity.fields if field.required and field.name not in columns]
+    if missing:
+        raise ValueError(f"No column for required field(s): {', '.join(missing)}")
+    return columns
+
+
+def validate(row, entity, columns):
+    """Convert one source row to the model's tuple; raises ValueError if it is invalid."""
+    values = {}
+    for field in entity.fields:
+        raw = row.get(columns[field.name]) if field.name in columns else None
+        try:
+            value = field.convert(raw)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field.name}: cannot read '{raw}'")
+        if value is None and field.required:
+            raise ValueError(f"{field.name} is required")
+        values[field.name] = value
+    if values.get('start_date') and values.get('end_date') and values['start_date'] > values['end_date']:
+        raise ValueError("start_date is after end_date")
+    if values.get('amount') is not None and values['amount'] < 0:
+        raise ValueError("amount is negative")
+    return tuple(values[field.name] for field in entity.fields)
+
+
+def _load(entity, rows):
+    """Insert (line, values) pairs; returns the number loaded and (line, error) for the rest.
+
+    If the chunk fails as a whole it is rolled back to a savepoint and
+    retried one row at a time.
+    """
+    with transaction() as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        conn.execute("SAVEPOINT bulk_chunk")
+        try:
+            entity.model.create_many([values for _, values in rows])
+            conn.execute("RELEASE bulk_chunk")
+            return len(rows), []
+        except (sqlite3.IntegrityError, ValueError):
+            conn.execute("ROLLBACK TO bulk_chunk")
+        loaded, rejected = 0, []
+        for line, values in rows:
+            conn.execute("SAVEPOINT bulk_row")
+            try:
+                entity.model.create_many([values])
+                loaded += 1
+            except (sqlite3.IntegrityError, ValueError) as e:
+                conn.execute("ROLLBACK TO bulk_row")
+                rejected.append((line, str(e)))
+            conn.execute("RELEASE bulk_row")
+        conn.execute("RELEASE bulk_chunk")
+        return loaded, rejected
+
+
+def _resumable_job(entity_name, fingerprint):
+    return execute_query("""SELECT * FROM ImportJobs
+                            WHERE entity = ? AND fingerprint = ? AND status != 'done'
+                            ORDER BY id DESC LIMIT 1""", (entity_name, fingerprint), fetchone=True)
+
+
+def pending_job(entity_name, source):
+    """The unfinished import of this file that import_rows would resume, if any."""
+    return _resumable_job(entity_name, source_fingerprint(source))
+
+
+def import_rows(entity_name, source, fmt=None, mapping=None, resume=True, chunk_size=CHUNK_SIZE, progress=None):
+    """Import a CSV or Parquet file of `entity_name` rows; return the finished ImportJobs row.
+
+    `progress(rows_done, total)` is called after every chunk; total is None
+    when the row count isn't known up front (CSV). Invalid rows are skipped
+    and the first KEPT_ERRORS of them recorded on the job with their line
+    numbers (1 is the first data row).
+    """
+    entity = ENTITIES[entity_name]
+    src = open_source(source, fmt, chunk_size)
+    try:
+        columns = resolve_mapping(src.headers, entity, mapping)
+        job = _resumable_job(entity_name, src.fingerprint) if resume else None
+        if job is None:
+            job = execute_query("""INSERT INTO ImportJobs (entity, source, fingerprint, status, started_at, updated_at)
+                                   VALUES (?, ?, ?, 'running', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                                   RETURNING *""", (entity_name, src.name, src.fingerprint), fetchone=True)
+        else:
+            execute_query("UPDATE ImportJobs SET status = 'running' WHERE id = ?", (job['id'],))
+            logger.info("Resuming import %s of %s after %d rows", job['id'], src.name, job['rows_done'])
+        done = job['rows_done']
+        errors = json.loads(job['errors'] or '[]')
+        rows = itertools.islice(src.rows, done, None)
+        try:
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                valid, rejected = [], []
+                for line, row in enumerate(chunk, start=done + 1):
+                    try:
+                        valid.append((line, validate(row, entity, columns)))
+                    except ValueError as e:
+                        rejected.append((line, str(e)))
+                with transaction():
+                    loaded, failed = _load(entity, valid) if valid else (0, [])
+                    rejected += failed
+                    errors = (errors + [{'line': line, 'error': error} for line, error in sorted(rejected)])[:KEPT_ERRORS]
+                    done += len(chunk)
+                    execute_query("""UPDATE ImportJobs
+                                     SET rows_done = ?, rows_loaded = rows_loaded + ?, rows_rejected = rows_rejected + ?,
+                                         errors = ?, updated_at = CURRENT_TIMESTAMP
+                                     WHERE id = ?""", (done, loaded, len(rejected), json.dumps(errors), job['id']))
+                if progress:
+                    progress(done, src.total)
+        except BaseException:
+            execute_query("UPDATE ImportJobs SET status = 'failed', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                          (job['id'],))
+            logger.exception("Import %s of %s failed after %d rows", job['id'], src.name, done)
+            raise
+        job = execute_query("""UPDATE ImportJobs SET status = 'done', updated_at = CURRENT_TIMESTAMP
+                               WHERE id = ? RETURNING *""", (job['id'],), fetchone=True)
+        logger.info("Imported %d %s from %s (%d rejected)", job['rows_loaded'], entity_name, src.name,
+                    job['rows_rejected'])
+        return job
+    finally:
+        src.close()
+
+
+def export_chunks(entity_name, chunk_size=CHUNK_SIZE):
+    """Yield the table's rows (id first, then the entity's fields) in lists of
+    up to `chunk_size`, reading from a read-only connection of its own."""
+    entity = ENTITIES[entity_name]
+    columns = ", ".join(['id'] + [field.name for field in entity.fields])
+    conn = config.connect(pool.path, read_only=True)
+    try:
+        cursor = conn.execute(f"SELECT {columns} FROM {entity.table} ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def export_rows(entity_name, destination, fmt=None, chunk_size=CHUNK_SIZE):
+    """Write every row of `entity_name` to a path or binary file object; return the row count."""
+    entity = ENTITIES[entity_name]
+    names = ['id'] + [field.name for field in entity.fields]
+    fmt = _format_of(destination if isinstance(destination, (str, os.PathLike)) else '', fmt)
+    owned = isinstance(destination, (str, os.PathLike))
+    handle = open(destination, 'wb') if owned else destination
+    count = 0
+    try:
+        if fmt == 'csv':
+            text = io.TextIOWrapper(handle, encoding='utf-8', newline='', write_through=True)
+            writer = csv.writer(text)
+            writer.writerow(names)
+            for rows in export_chunks(entity_name, chunk_size):
+                writer.writerows(rows)
+                count += len(rows)
+            text.detach()
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = pa.schema([('id', pa.int64())] + [(field.name, _TYPES[field.convert]) for field in entity.fields])
+            with pq.ParquetWriter(handle, schema) as writer:
+                for rows in export_chunks(entity_name, chunk_size):
+                    writer.write_table(pa.Table.from_arrays(
+                        [pa.array(column, type=schema.field(i).type) for i, column in enumerate(zip(*rows))],
+                        schema=schema))
+                    count += len(rows)
+    finally:
+        if owned:
+            handle.close()
+    logger.info("Exported %d %s", count, entity_name)
+    return count
+
+
+def jobs(limit=20):
+    return execute_query("SELECT * FROM ImportJobs ORDER BY id DESC LIMIT ?", (limit,))
+
+
+def _parse_mapping(pairs):
+    mapping = {}
+    for pair in pairs or []:
+        source, _, field = pair.rpartition('=')
+        if not source:
+            raise SystemExit(f"--map expects 'Source Column=field', got '{pair}'")
+        mapping[source] = field
+    return mapping
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    load = commands.add_parser('import', help="load a CSV or Parquet file")
+    load.add_argument('entity', choices=sorted(ENTITIES))
+    load.add_argument('path')
+    load.add_argument('--format', choices=('csv', 'parquet'))
+    load.add_argument('--map', action='append', metavar='COLUMN=FIELD')
+    load.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    load.add_argument('--no-resume', action='store_true', help="start over even if an earlier import stopped partway")
+    dump = commands.add_parser('export', help="write a table to a CSV or Parquet file")
+    dump.add_argument('entity', choices=sorted(ENTITIES))
+    dump.add_argument('path')
+    dump.add_argument('--format', choices=('csv', 'parquet'))
+    dump.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    commands.add_parser('jobs', help="list recent imports")
+    args = parser.parse_args()
+    initialize_database()
+
+    if args.command == 'import':
+        def report(done, total):
+            print(f"\r{done}" + (f"/{total}" if total else "") + " rows", end='', file=sys.stderr)
+        job = import_rows(args.entity, args.path, args.format, _parse_mapping(args.map),
+                          resume=not args.no_resume, chunk_size=args.chunk_size, progress=report)
+        print(file=sys.stderr)
+        print(f"Loaded {job['rows_loaded']} rows, rejected {job['rows_rejected']} (job {job['id']})")
+        for error in json.loads(job['errors'] or '[]'):
+            print(f"  line {error['line']}: {error['error']}")
+    elif args.command == 'export':
+        count = export_rows(args.entity, args.path, args.format, args.chunk_size)
+        print(f"Exported {count} rows to {args.path}")
+    else:
+        for job in jobs():
+            print(f"{job['id']:>5}  {job['status']:<8} {job['entity']:<9} {job['rows_loaded']:>9} loaded "
+                  f"{job['rows_rejected']:>7} rejected  {job['source']}")
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
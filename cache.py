@@ -0,0 +1,167 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+import config
+
+
+class ReadCache:
+    """An LRU cache with a time-to-live for model query results.
+
+    Entries are tagged with the table they were read from so that a write to
+    a table drops exactly the entries built from it. Cached values are shared
+    between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=2048, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_table = defaultdict(set)
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return (True, value) on a hit and (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, table, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key, table)
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def generation(self, table):
+        return self._generations[table]
+
+    def put(self, table, key, value, generation):
+        """Store `value` unless `table` was invalidated since `generation` was read.
+
+        Callers take the generation before running their query; if a write
+        lands while the query runs, the possibly stale result is not cached.
+        """
+        with self._lock:
+            if self._generations[table] != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, table, value)
+            self._entries.move_to_end(key)
+            self._keys_by_table[table].add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, (_, old_table, _) = self._entries.popitem(last=False)
+                self._keys_by_table[old_table].discard(old_key)
+                self.evictions += 1
+
+    def _remove(self, key, table):
+        del self._entries[key]
+        self._keys_by_table[table].discard(key)
+
+    def invalidate_table(self, table):
+        with self._lock:
+            self._generations[table] += 1
+            keys = self._keys_by_table.pop(table, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            for table in list(self._keys_by_table):
+                self._generations[table] += 1
+            self._entries.clear()
+            self._keys_by_table.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'entries_by_table': {table: len(keys) for table, keys in self._keys_by_table.items() if keys},
+            }
+
+
+class ChangeTracker:
+    """Detects committed writes to tracked tables, from any connection or process.
+
+    Each tracked table has a row in TableVersions that triggers bump on every
+    insert, update and delete. The tracker keeps its own connection and polls
+    PRAGMA data_version, which only changes after another connection has
+    committed, so the common no-write case costs a single pragma and
+    TableVersions is only re-read when something was actually written.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._conn = None
+        self._path = None
+        self._data_version = None
+        self._versions = {}
+        self._changed_at = {}
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None or self._path != self.pool.path:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = config.connect(self.pool.path, check_same_thread=False)
+            self._path = self.pool.path
+            self._data_version = None
+            self._versions = {}
+            self._changed_at = {}
+        return self._conn
+
+    def sync(self, cache):
+        """Invalidate the cache entries of every table written since the last sync."""
+        with self._lock:
+            path = self._path
+            conn = self._connection()
+            if path != self._path:
+                cache.clear()
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            try:
+                rows = conn.execute("SELECT table_name, version, changed_at FROM TableVersions").fetchall()
+            except sqlite3.OperationalError:
+                rows = []
+            changed = [name for name, version, _ in rows if self._versions.get(name) != version]
+            self._versions.update((name, version) for name, version, _ in rows)
+            self._changed_at.update((name, changed_at) for name, _, changed_at in rows)
+        for table in changed:
+            cache.invalidate_table(table)
+
+    def versions(self):
+        with self._lock:
+            return dict(self._versions)
+
+    def changed_at(self):
+        """Table name -> when it was last written (a UTC 'YYYY-MM-DD HH:MM:SS' string)."""
+        with self._lock:
+            return dict(self._changed_at)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
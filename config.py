@@ -0,0 +1,54 @@
+"""Where the database lives, read from the environment.
+
+    DATABASE_PATH   SQLite database file (default: construction_projects.db
+                    next to this file). ":memory:" keeps the whole database in
+                    memory for the life of the process, shared by all of its
+                    connections; useful for demos and throwaway runs.
+    ARCHIVE_PATH    where archive.py moves cold rows (default: the database's
+                    name with "_archive" added, in the same directory)
+"""
+import itertools
+import os
+import sqlite3
+
+MEMORY = ':memory:'
+
+DATABASE_PATH = os.environ.get('DATABASE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 'construction_projects.db')
+
+_memory_ids = itertools.count(1)
+
+
+def resolve(path):
+    """The path to connect to: ":memory:" becomes a new named in-memory database.
+
+    A plain ":memory:" connection is private to itself. The memdb VFS lets
+    every connection in the process (pool, writer, change tracker,
+    migrations) open the same one by name.
+    """
+    if path == MEMORY:
+        return f"file:/construction_projects-{next(_memory_ids)}?vfs=memdb"
+    return path
+
+
+def archive_path(path):
+    """The archive database that goes with the database at `path`."""
+    if os.environ.get('ARCHIVE_PATH'):
+        return os.environ['ARCHIVE_PATH']
+    if is_memory(path):
+        return path.replace('?', '-archive?', 1)
+    root, extension = os.path.splitext(path)
+    return f"{root}_archive{extension or '.db'}"
+
+
+def is_memory(path):
+    return path.startswith('file:') and 'vfs=memdb' in path
+
+
+def connect(path, read_only=False, **kwargs):
+    """sqlite3.connect for a path from resolve(), optionally read-only."""
+    if path.startswith('file:'):
+        return sqlite3.connect(path + ('&mode=ro' if read_only else ''), uri=True, **kwargs)
+    if read_only:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True, **kwargs)
+    return sqlite3.connect(path, **kwargs)
@@ -0,0 +1,14 @@
+import pytest
+
+import database
+import passwords
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Point the connection pool at a fresh, initialized database file."""
+    passwords.hasher._rounds = 4  # the cheapest bcrypt cost, to keep tests fast
+    database.pool.reopen(str(tmp_path / 'test.db'))
+    database.initialize_database()
+    yield
+    database.pool.reopen(database.DATABASE_PATH)
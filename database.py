@@ -1,36 +1,496 @@
 import sqlite3
 import logging
+import threading
+import queue
+import time
+import atexit
+import functools
 from contextlib import contextmanager
-import hashlib
+import json
+import re
+from collections import defaultdict
+from collections.abc import Mapping
+from datetime import date, datetime, timedelta
+from cache import ReadCache, ChangeTracker
+import config
+from records import make_rows, register_table
+from writer import WriteCoordinator
+from passwords import hash_password
+from metrics import query_metrics
+import migration
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DATABASE_PATH = config.DATABASE_PATH
+
+# Applied to every connection when it is opened. journal_mode is persistent in
+# the database file, the rest are per-connection settings. auto_vacuum only
+# takes effect on a database with no tables yet (see archive.py for converting
+# an existing one), and has to come before journal_mode writes the header.
+CONNECTION_PRAGMAS = (
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+class PoolTimeout(Exception):
+    pass
+
+class ConflictError(Exception):
+    """Rows changed by someone else since they were read; `ids` lists them."""
+    def __init__(self, ids):
+        super().__init__(f"Changed by someone else since they were loaded: {', '.join(map(str, ids))}")
+        self.ids = ids
+
+class ConnectionPool:
+    """A bounded pool of long-lived SQLite connections shared by all threads.
+
+    Streamlit runs every session (and every rerun) on its own thread, so
+    connections are opened with check_same_thread=False and handed out to
+    whichever thread needs one. A thread that asks for a connection while it
+    already holds one gets the same connection back, so nested model calls
+    don't need a second connection.
+    """
+
+    def __init__(self, path, max_size=8, acquire_timeout=30.0, health_check_interval=30.0):
+        self.path = config.resolve(path)
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._local = threading.local()
+        self._closed = False
+        # Keeps an in-memory database alive while no other connection to it is open
+        self._anchor = None
+
+    def connect(self):
+        """A new connection set up like the pooled ones, for callers that keep their own."""
+        # DATE and TIMESTAMP columns come back as date/datetime (see records.py)
+        if config.is_memory(self.path) and self._anchor is None:
+            self._anchor = config.connect(self.path, check_same_thread=False)
+        conn = config.connect(self.path, timeout=5.0, check_same_thread=False,
+                              detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _open(self):
+        conn = self.connect()
+        self._connections.add(conn)
+        logger.debug("Opened pooled connection to %s (%d open)", self.path, len(self._connections))
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def is_healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    if len(self._connections) < self.max_size:
+                        return self._open()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No database connection available after {self.acquire_timeout}s")
+                try:
+                    conn, idle_since = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+            if time.monotonic() - idle_since < self.health_check_interval or self.is_healthy(conn):
+                return conn
+            logger.warning("Discarding unhealthy pooled connection")
+            self._discard(conn)
+
+    def _checkin(self, conn):
+        if self._closed:
+            self._discard(conn)
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+        wait_started = time.perf_counter()
+        conn = self._checkout()
+        query_metrics.record_pool_wait(time.perf_counter() - wait_started)
+        self._local.conn = conn
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            self._local.conn = None
+            if not self.is_healthy(conn):
+                self._discard(conn)
+            else:
+                self._checkin(conn)
+            raise
+        except BaseException:
+            self._local.conn = None
+            self._checkin(conn)
+            raise
+        else:
+            self._local.conn = None
+            self._checkin(conn)
+
+    def held(self):
+        """The connection this thread has checked out, if any."""
+        return getattr(self._local, 'conn', None)
+
+    def stats(self):
+        return {'open': len(self._connections), 'idle': self._idle.qsize(), 'max_size': self.max_size}
+
+    def close_all(self):
+        """Close every connection; connections checked out right now are closed on return."""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+        logger.debug("Connection pool for %s closed", self.path)
+
+    def reopen(self, path=None):
+        self.close_all()
+        if path is not None:
+            if self._anchor is not None:
+                self._anchor.close()
+                self._anchor = None
+            self.path = config.resolve(path)
+        self._closed = False
+
+pool = ConnectionPool(DATABASE_PATH)
+atexit.register(pool.close_all)
+
 @contextmanager
 def get_db_connection():
-    conn = sqlite3.connect('construction_projects.db')
-    conn.row_factory = sqlite3.Row
-    try:
+    with pool.connection() as conn:
         yield conn
-    finally:
-        conn.close()
 
-def dict_from_row(row):
-    return dict(zip(row.keys(), row))
+writer = WriteCoordinator(pool)
+atexit.register(writer.close)
+
+read_cache = ReadCache()
+change_tracker = ChangeTracker(pool)
+atexit.register(change_tracker.close)
+
+TRACKED_TABLES = ('Projects', 'Files', 'Notifications', 'Resources', 'Tasks',
+                  'Budgets', 'Messages', 'Reports', 'Users', 'TaskDependencies',
+                  'ResourceIntervals', 'FileVersions', 'Inbox', 'InboxCursors',
+                  'Conversations', 'ConversationMembers')
+
+def _cache_key(value):
+    if isinstance(value, Mapping):
+        return tuple(sorted((key, _cache_key(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_cache_key(item) for item in value)
+    return value
+
+def cached(table):
+    """Serve a model read from read_cache until `table` is written to.
+
+    Writes are picked up through change_tracker, so rows committed by other
+    sessions or processes invalidate the cache as well. Reads inside a
+    transaction() block always go to the database so they see the block's
+    own uncommitted writes.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if in_transaction():
+                return func(*args, **kwargs)
+            try:
+                key = (table, func.__qualname__, _cache_key(args), _cache_key(kwargs))
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            change_tracker.sync(read_cache)
+            hit, value = read_cache.get(key)
+            if hit:
+                return value
+            generation = read_cache.generation(table)
+            value = func(*args, **kwargs)
+            if value is not None:
+                read_cache.put(table, key, value, generation)
+            return value
+        return wrapper
+    return decorator
+
+def cache_stats():
+    return read_cache.stats()
+
+_transaction_state = threading.local()
+
+def in_transaction():
+    return getattr(_transaction_state, 'depth', 0) > 0
+
+@contextmanager
+def transaction():
+    """Run every execute_query/execute_many call in the block as one transaction.
+
+    The work is committed once when the outermost block exits and rolled
+    back if it raises. Nested blocks join the enclosing transaction.
+    """
+    with get_db_connection() as conn:
+        depth = getattr(_transaction_state, 'depth', 0)
+        _transaction_state.depth = depth + 1
+        if depth == 0:
+            _transaction_state.after_commit = []
+        try:
+            yield conn
+        except BaseException:
+            _transaction_state.depth = depth
+            if depth == 0:
+                _transaction_state.after_commit = []
+                conn.rollback()
+            raise
+        _transaction_state.depth = depth
+        if depth == 0:
+            started = time.perf_counter()
+            conn.commit()
+            elapsed = time.perf_counter() - started
+            query_metrics.record("COMMIT", elapsed, commit_seconds=elapsed)
+            callbacks, _transaction_state.after_commit = _transaction_state.after_commit, []
+            for callback in callbacks:
+                callback()
+
+def after_commit(callback):
+    """Call `callback` once the current transaction commits, or now if there is none."""
+    if in_transaction():
+        _transaction_state.after_commit.append(callback)
+    else:
+        callback()
+
+_write_listeners = defaultdict(list)
+
+def on_write(table, listener):
+    """Register `listener(action, rows)` to hear about committed writes to `table`.
+
+    Only writes made through the models that publish them are reported;
+    listeners that must also see other processes' writes should compare
+    change_tracker versions.
+    """
+    _write_listeners[table].append(listener)
+
+def publish_write(table, action, rows):
+    rows = list(rows)
+    if rows and _write_listeners[table]:
+        after_commit(lambda: [listener(action, rows) for listener in _write_listeners[table]])
+
+_WRITE_KEYWORDS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+def _is_write(query):
+    return query.lstrip()[:7].upper().startswith(_WRITE_KEYWORDS)
+
+def _begin_for_write(conn, query):
+    """Take the write lock up front for a write outside a transaction and
+    return how long that took, which is the time spent waiting on other
+    writers. Python's implicit BEGIN would defer this into the statement."""
+    if conn.in_transaction or not _is_write(query):
+        return 0.0
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    return time.perf_counter() - started
+
+def _use_writer(query):
+    """Whether a write should go through the writer thread rather than run here.
+
+    Not inside transaction(), and not while this thread's connection holds
+    a transaction of its own: the writer would wait on that lock forever.
+    """
+    if in_transaction() or not _is_write(query):
+        return False
+    held = pool.held()
+    return held is None or not held.in_transaction
+
+def _commit(conn):
+    if in_transaction():
+        return 0.0
+    started = time.perf_counter()
+    conn.commit()
+    return time.perf_counter() - started
 
 def execute_query(query, params=(), fetchone=False):
+    if _use_writer(query):
+        rows = writer.submit(query, params).result().rows
+        if fetchone:
+            return rows[0] if rows else None
+        return rows
+    started = time.perf_counter()
+    lock_wait = 0.0
+    with get_db_connection() as conn:
+        try:
+            lock_wait = _begin_for_write(conn, query)
+            cursor = conn.cursor()
+            # Plain tuples; make_rows turns them into records in one pass
+            cursor.row_factory = None
+            cursor.execute(query, params)
+            # Fetch before committing so that UPDATE ... RETURNING statements run
+            # to completion inside the transaction.
+            rows = cursor.fetchall()
+            commit_time = _commit(conn)
+        except sqlite3.Error:
+            query_metrics.record(query, time.perf_counter() - started, lock_wait_seconds=lock_wait, error=True)
+            raise
+    query_metrics.record(query, time.perf_counter() - started, len(rows) or cursor.rowcount, commit_time, lock_wait)
+    names = [column[0] for column in cursor.description or ()]
+    if fetchone:
+        return make_rows(names, rows[:1])[0] if rows else None
+    return make_rows(names, rows)
+
+_UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def fetch_columns(query, params=(), frame=False):
+    """Run a read and return the result by column instead of by row.
+
+    Returns {column: numpy array}, or a pandas DataFrame with `frame`.
+    DATE and TIMESTAMP columns become datetime64 arrays (NaT for NULL).
+    Numeric columns with NULLs become float arrays with NaN. Text stays
+    object arrays. No per-row objects are built, which makes this the way
+    to load whole tables for analysis.
+    """
+    import numpy as np
+    started = time.perf_counter()
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
-        if fetchone:
-            row = cursor.fetchone()
-            return dict_from_row(row) if row else None
-        return [dict_from_row(row) for row in cursor.fetchall()]
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+        cursor.row_factory = None
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        except sqlite3.Error:
+            query_metrics.record(query, time.perf_counter() - started, error=True)
+            raise
+    query_metrics.record(query, time.perf_counter() - started, len(rows))
+    names = [column[0] for column in cursor.description or ()]
+    columns = {}
+    for name, values in zip(names, zip(*rows) if rows else [()] * len(names)):
+        sample = next((value for value in values if value is not None), None)
+        if isinstance(sample, datetime):
+            columns[name] = np.array([value.isoformat() if value is not None else 'NaT' for value in values],
+                                     dtype='datetime64[s]')
+        elif isinstance(sample, date):
+            # Ordinals are far cheaper for NumPy to take in than date objects
+            ordinals = np.fromiter((value.toordinal() if value is not None else 0 for value in values),
+                                   np.int64, len(values))
+            columns[name] = (ordinals - _UNIX_EPOCH_ORDINAL).astype('datetime64[D]')
+            columns[name][ordinals == 0] = np.datetime64('NaT')
+        elif isinstance(sample, bool) or not isinstance(sample, (int, float)):
+            columns[name] = np.array(values, dtype=object)
+        elif None in values:
+            columns[name] = np.array(values, dtype=np.float64)
+        else:
+            columns[name] = np.array(values)
+    if frame:
+        import pandas as pd
+        return pd.DataFrame(columns, columns=names)
+    return columns
+
+def execute_many(query, params_seq):
+    """Run `query` once per parameter tuple with a single commit for the whole batch."""
+    if _use_writer(query):
+        return writer.submit(query, params_seq, many=True).result().rowcount
+    started = time.perf_counter()
+    lock_wait = 0.0
+    with get_db_connection() as conn:
+        try:
+            lock_wait = _begin_for_write(conn, query)
+            cursor = conn.cursor()
+            cursor.executemany(query, params_seq)
+            commit_time = _commit(conn)
+        except sqlite3.Error:
+            query_metrics.record(query, time.perf_counter() - started, lock_wait_seconds=lock_wait, error=True)
+            raise
+    query_metrics.record(query, time.perf_counter() - started, cursor.rowcount, commit_time, lock_wait)
+    return cursor.rowcount
+
+def performance_snapshot():
+    """Query metrics plus connection pool and read cache state, as plain data."""
+    snapshot = query_metrics.snapshot()
+    snapshot['pool'] = pool.stats()
+    snapshot['cache'] = read_cache.stats()
+    snapshot['writer'] = writer.stats()
+    return snapshot
+
+_table_columns = {}
+
+def table_columns(table):
+    if table not in _table_columns:
+        rows = execute_query(f"PRAGMA table_info({table})")
+        _table_columns[table] = tuple(row['name'] for row in rows)
+    return _table_columns[table]
+
+def paginate(table, after_id=None, limit=50, order_by='id', filters=None, key='id'):
+    """Return the page of `table` rows that sorts directly after the row whose
+    `key` is `after_id` (or the first page when `after_id` is None).
+
+    This is keyset pagination: the position is given by the last row the
+    caller has seen rather than an OFFSET, so fetching page 1,000 costs the
+    same as fetching page 1. `order_by` is a column name, prefixed with '-'
+    for descending order; ties are broken on `key`. `filters` maps column
+    names to values that rows must equal.
+    """
+    columns = table_columns(table)
+    descending = order_by.startswith('-')
+    column = order_by.lstrip('-')
+    filters = filters or {}
+    unknown = [name for name in (column, *filters) if name not in columns]
+    if unknown:
+        raise ValueError(f"Unknown column(s) for {table}: {', '.join(unknown)}")
+
+    clauses, params = [], []
+    for name, value in filters.items():
+        if value is None:
+            clauses.append(f"{name} IS NULL")
+        else:
+            clauses.append(f"{name} = ?")
+            params.append(value)
+    if after_id is not None:
+        op = '<' if descending else '>'
+        if column == key:
+            clauses.append(f"{key} {op} ?")
+        else:
+            clauses.append(f"({column}, {key}) {op} (SELECT {column}, {key} FROM {table} WHERE {key} = ?)")
+        params.append(after_id)
+
+    direction = 'DESC' if descending else 'ASC'
+    query = f"SELECT * FROM {table}"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    if column == key:
+        query += f" ORDER BY {key} {direction} LIMIT ?"
+    else:
+        query += f" ORDER BY {column} {direction}, {key} {direction} LIMIT ?"
+    params.append(limit)
+    return execute_query(query, tuple(params))
 
 class Project:
     @staticmethod
@@ -38,194 +498,763 @@ class Project:
         query = """INSERT INTO Projects (name, description, start_date, end_date)
                    VALUES (?, ?, ?, ?)"""
         execute_query(query, (name, description, start_date, end_date))
-        logger.info(f"Project '{name}' created successfully")
+        logger.info("Project '%s' created successfully", name)
 
     @staticmethod
+    @cached('Projects')
     def get_all():
         return execute_query("SELECT * FROM Projects")
 
     @staticmethod
+    @cached('Projects')
+    def page(after_id=None, limit=50, order_by='id', filters=None):
+        return paginate('Projects', after_id, limit, order_by, filters)
+
+    @staticmethod
+    @cached('Projects')
     def get_by_id(project_id):
         query = "SELECT * FROM Projects WHERE id = ?"
         result = execute_query(query, (project_id,), fetchone=True)
         if result is None:
-            logger.warning(f"No project found with ID {project_id}")
+            logger.warning("No project found with ID %s", project_id)
         return result
 
     @staticmethod
     def update(project_id, name, description, start_date, end_date):
         query = """UPDATE Projects
-                   SET name = ?, description = ?, start_date = ?, end_date = ?
-                   WHERE id = ?"""
-        execute_query(query, (name, description, start_date, end_date, project_id))
-        updated_project = Project.get_by_id(project_id)
+                   SET name = ?, description = ?, start_date = ?, end_date = ?, row_version = row_version + 1
+                   WHERE id = ?
+                   RETURNING *"""
+        updated_project = execute_query(query, (name, description, start_date, end_date, project_id), fetchone=True)
         if updated_project:
-            logger.info(f"Project with ID {project_id} updated successfully")
+            logger.info("Project with ID %s updated successfully", project_id)
             return updated_project
-        logger.error(f"Update failed: Project with ID {project_id} not found after update")
+        logger.error("Update failed: Project with ID %s not found", project_id)
         return None
 
+    @staticmethod
+    def set_planned_budget(project_id, planned_budget):
+        """Set the amount the project is expected to spend; None clears it."""
+        query = """UPDATE Projects SET planned_budget = ?, row_version = row_version + 1
+                   WHERE id = ?
+                   RETURNING *"""
+        project = execute_query(query, (planned_budget, project_id), fetchone=True)
+        if project:
+            logger.info("Planned budget of project %s set to %s", project_id, planned_budget)
+        return project
+
     @staticmethod
     def delete(project_id):
         query = "DELETE FROM Projects WHERE id = ?"
         execute_query(query, (project_id,))
-        logger.info(f"Project with ID {project_id} deleted successfully")
+        logger.info("Project with ID %s deleted successfully", project_id)
+
+    @staticmethod
+    def create_many(rows):
+        """Insert (same arguments as create) tuples in one transaction."""
+        query = """INSERT INTO Projects (name, description, start_date, end_date)
+                   VALUES (?, ?, ?, ?)"""
+        count = execute_many(query, rows)
+        logger.info("%s projects created successfully", count)
+        return count
+
+    @staticmethod
+    def update_many(rows):
+        """Apply (same arguments as update) tuples in one transaction."""
+        query = """UPDATE Projects
+                   SET name = ?, description = ?, start_date = ?, end_date = ?, row_version = row_version + 1
+                   WHERE id = ?"""
+        count = execute_many(query, (tuple(row[1:]) + (row[0],) for row in rows))
+        logger.info("%s projects updated successfully", count)
+        return count
+
+    @staticmethod
+    def delete_many(ids):
+        query = "DELETE FROM Projects WHERE id = ?"
+        count = execute_many(query, ((row_id,) for row_id in ids))
+        logger.info("%s projects deleted successfully", count)
+        return count
+
+    EDITABLE_FIELDS = ('name', 'description', 'start_date', 'end_date', 'planned_budget')
+
+    @staticmethod
+    def apply_changes(updates=(), inserts=(), deletes=()):
+        """Apply a batch of edits in one transaction, checking row versions.
+
+        `updates` are mappings holding a project's id, the row_version it was
+        read at and its EDITABLE_FIELDS; `inserts` are mappings of
+        EDITABLE_FIELDS; `deletes` are (id, row_version) pairs. If any
+        updated or deleted project is no longer at the version given, nothing
+        is applied and ConflictError names those projects.
+        """
+        updates, deletes = list(updates), list(deletes)
+        fields = Project.EDITABLE_FIELDS
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        conflicts = []
+        with transaction():
+            for row in updates:
+                updated = execute_query(f"""UPDATE Projects SET {assignments}, row_version = row_version + 1
+                                            WHERE id = ? AND row_version = ?
+                                            RETURNING id""",
+                                        tuple(row.get(field) for field in fields) + (row['id'], row['row_version']),
+                                        fetchone=True)
+                if updated is None:
+                    conflicts.append(row['id'])
+            for project_id, row_version in deletes:
+                deleted = execute_query("DELETE FROM Projects WHERE id = ? AND row_version = ? RETURNING id",
+                                        (project_id, row_version), fetchone=True)
+                if deleted is None:
+                    conflicts.append(project_id)
+            if conflicts:
+                raise ConflictError(conflicts)
+            inserts = [tuple(row.get(field) for field in fields) for row in inserts]
+            if inserts:
+                execute_many(f"INSERT INTO Projects ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                             inserts)
+        counts = {'updated': len(updates), 'inserted': len(inserts), 'deleted': len(deletes)}
+        logger.info("Projects changed: %s", counts)
+        return counts
 
 class File:
     @staticmethod
-    def create(name, path):
-        query = """INSERT INTO Files (name, path)
-                   VALUES (?, ?)"""
-        execute_query(query, (name, path))
-        logger.info(f"File '{name}' created successfully")
+    def create(name, path, project_id=None):
+        query = """INSERT INTO Files (name, path, project_id)
+                   VALUES (?, ?, ?)"""
+        execute_query(query, (name, path, project_id))
+        logger.info("File '%s' created successfully", name)
 
     @staticmethod
+    @cached('Files')
     def get_all():
         return execute_query("SELECT * FROM Files")
 
     @staticmethod
+    @cached('Files')
+    def page(after_id=None, limit=50, order_by='id', filters=None):
+        return paginate('Files', after_id, limit, order_by, filters)
+
+    @staticmethod
+    @cached('Files')
     def get_by_id(file_id):
         query = "SELECT * FROM Files WHERE id = ?"
         result = execute_query(query, (file_id,), fetchone=True)
         if result is None:
-            logger.warning(f"No file found with ID {file_id}")
+            logger.warning("No file found with ID %s", file_id)
         return result
 
     @staticmethod
     def update(file_id, name, path):
         query = """UPDATE Files
                    SET name = ?, path = ?
-                   WHERE id = ?"""
-        execute_query(query, (name, path, file_id))
-        updated_file = File.get_by_id(file_id)
+                   WHERE id = ?
+                   RETURNING *"""
+        updated_file = execute_query(query, (name, path, file_id), fetchone=True)
         if updated_file:
-            logger.info(f"File with ID {file_id} updated successfully")
+            logger.info("File with ID %s updated successfully", file_id)
             return updated_file
-        logger.error(f"Update failed: File with ID {file_id} not found after update")
+        logger.error("Update failed: File with ID %s not found", file_id)
         return None
 
     @staticmethod
     def delete(file_id):
         query = "DELETE FROM Files WHERE id = ?"
         execute_query(query, (file_id,))
-        logger.info(f"File with ID {file_id} deleted successfully")
+        logger.info("File with ID %s deleted successfully", file_id)
+
+    @staticmethod
+    def create_many(rows):
+        """Insert (same arguments as create) tuples in one transaction."""
+        rows = [tuple(row) + (None,) * (3 - len(row)) for row in rows]
+        query = """INSERT INTO Files (name, path, project_id)
+                   VALUES (?, ?, ?)"""
+        count = execute_many(query, rows)
+        logger.info("%s files created successfully", count)
+        return count
+
+    @staticmethod
+    def update_many(rows):
+        """Apply (same arguments as update) tuples in one transaction."""
+        query = """UPDATE Files
+                   SET name = ?, path = ?
+                   WHERE id = ?"""
+        count = execute_many(query, (tuple(row[1:]) + (row[0],) for row in rows))
+        logger.info("%s files updated successfully", count)
+        return count
+
+    @staticmethod
+    def delete_many(ids):
+        query = "DELETE FROM Files WHERE id = ?"
+        count = execute_many(query, ((row_id,) for row_id in ids))
+        logger.info("%s files deleted successfully", count)
+        return count
+
+class FileVersion:
+    """One uploaded revision of a logical file (a Files row, matched by name).
+
+    Content lives in the blob store under its SHA-256 (see file_store.py), so
+    versions with identical content share one blob on disk.
+    """
+
+    @staticmethod
+    def create(file_id, sha256, size, uploaded_by=None, upload_key=None):
+        query = """INSERT INTO FileVersions (file_id, version, sha256, size, uploaded_by, uploaded_at, upload_key)
+                   VALUES (?, (SELECT COALESCE(MAX(version), 0) + 1 FROM FileVersions WHERE file_id = ?),
+                           ?, ?, ?, CURRENT_TIMESTAMP, ?)
+                   RETURNING *"""
+        version = execute_query(query, (file_id, file_id, sha256, size, uploaded_by, upload_key), fetchone=True)
+        logger.info("Version %s of file ID %s created successfully", version['version'], file_id)
+        return version
+
+    @staticmethod
+    @cached('FileVersions')
+    def for_file(file_id):
+        query = "SELECT * FROM FileVersions WHERE file_id = ? ORDER BY version DESC"
+        return execute_query(query, (file_id,))
+
+    @staticmethod
+    def latest(file_id):
+        query = "SELECT * FROM FileVersions WHERE file_id = ? ORDER BY version DESC LIMIT 1"
+        return execute_query(query, (file_id,), fetchone=True)
+
+    @staticmethod
+    @cached('FileVersions')
+    def latest_for_files(file_ids):
+        """Map each file ID to its newest version row."""
+        query = """SELECT v.* FROM FileVersions v
+                   JOIN (SELECT file_id, MAX(version) AS version FROM FileVersions
+                         WHERE file_id IN (SELECT value FROM json_each(?)) GROUP BY file_id) latest
+                     ON latest.file_id = v.file_id AND latest.version = v.version"""
+        return {row['file_id']: row for row in execute_query(query, (json.dumps(list(file_ids)),))}
+
+    @staticmethod
+    def get_by_upload_key(upload_key):
+        query = "SELECT * FROM FileVersions WHERE upload_key = ?"
+        return execute_query(query, (upload_key,), fetchone=True)
 
 class Notification:
     @staticmethod
-    def create(message, date):
-        query = """INSERT INTO Notifications (message, date)
-                   VALUES (?, ?)"""
-        execute_query(query, (message, date))
-        logger.info(f"Notification '{message}' created successfully")
+    def create(message, date, recipient=None):
+        """Create a notification for `recipient`, or for every user when None.
+
+        A trigger delivers it to the Inbox of each recipient.
+        """
+        query = """INSERT INTO Notifications (message, date, recipient)
+                   VALUES (?, ?, ?)"""
+        execute_query(query, (message, date, recipient))
+        logger.info("Notification '%s' created successfully", message)
 
     @staticmethod
+    @cached('Notifications')
     def get_all():
         return execute_query("SELECT * FROM Notifications")
 
     @staticmethod
+    @cached('Notifications')
+    def page(after_id=None, limit=50, order_by='id', filters=None):
+        return paginate('Notifications', after_id, limit, order_by, filters)
+
+    @staticmethod
+    @cached('Notifications')
     def get_by_id(notification_id):
         query = "SELECT * FROM Notifications WHERE id = ?"
         result = execute_query(query, (notification_id,), fetchone=True)
         if result is None:
-            logger.warning(f"No notification found with ID {notification_id}")
+            logger.warning("No notification found with ID %s", notification_id)
         return result
 
     @staticmethod
     def update(notification_id, message, date):
         query = """UPDATE Notifications
                    SET message = ?, date = ?
-                   WHERE id = ?"""
-        execute_query(query, (message, date, notification_id))
-        updated_notification = Notification.get_by_id(notification_id)
+                   WHERE id = ?
+                   RETURNING *"""
+        updated_notification = execute_query(query, (message, date, notification_id), fetchone=True)
         if updated_notification:
-            logger.info(f"Notification with ID {notification_id} updated successfully")
+            logger.info("Notification with ID %s updated successfully", notification_id)
             return updated_notification
-        logger.error(f"Update failed: Notification with ID {notification_id} not found after update")
+        logger.error("Update failed: Notification with ID %s not found", notification_id)
         return None
 
     @staticmethod
     def delete(notification_id):
         query = "DELETE FROM Notifications WHERE id = ?"
         execute_query(query, (notification_id,))
-        logger.info(f"Notification with ID {notification_id} deleted successfully")
+        logger.info("Notification with ID %s deleted successfully", notification_id)
+
+    @staticmethod
+    def create_many(rows):
+        """Insert (same arguments as create) tuples in one transaction."""
+        rows = [tuple(row) + (None,) * (3 - len(row)) for row in rows]
+        query = """INSERT INTO Notifications (message, date, recipient)
+                   VALUES (?, ?, ?)"""
+        count = execute_many(query, rows)
+        logger.info("%s notifications created successfully", count)
+        return count
+
+    @staticmethod
+    def update_many(rows):
+        """Apply (same arguments as update) tuples in one transaction."""
+        query = """UPDATE Notifications
+                   SET message = ?, date = ?
+                   WHERE id = ?"""
+        count = execute_many(query, (tuple(row[1:]) + (row[0],) for row in rows))
+        logger.info("%s notifications updated successfully", count)
+        return count
+
+    @staticmethod
+    def delete_many(ids):
+        query = "DELETE FROM Notifications WHERE id = ?"
+        count = execute_many(query, ((row_id,) for row_id in ids))
+        logger.info("%s notifications deleted successfully", count)
+        return count
+
+class Inbox:
+    """Each user's notifications, with a read cursor and unread count.
+
+    Rows are fanned out to Inbox by a trigger when a notification is
+    created, and InboxCursors.unread is kept current by triggers as well, so
+    polling for new notifications and the unread count are both indexed
+    lookups. Reads are cached under Notifications, which every write to a
+    user's inbox also changes.
+    """
+    @staticmethod
+    @cached('Notifications')
+    def since(username, after_id=0, limit=50):
+        """The user's notifications with IDs above `after_id`, oldest first."""
+        query = """SELECT n.* FROM Inbox i JOIN Notifications n ON n.id = i.notification_id
+                   WHERE i.username = ? AND i.notification_id > ?
+                   ORDER BY i.notification_id LIMIT ?"""
+        return execute_query(query, (username, after_id, limit))
+
+    @staticmethod
+    @cached('Notifications')
+    def before(username, before_id=None, limit=50):
+        """The user's notifications with IDs below `before_id` (or the latest), newest first."""
+        query = """SELECT n.* FROM Inbox i JOIN Notifications n ON n.id = i.notification_id
+                   WHERE i.username = ? AND i.notification_id < ?
+                   ORDER BY i.notification_id DESC LIMIT ?"""
+        return execute_query(query, (username, before_id if before_id is not None else 2 ** 63 - 1, limit))
+
+    @staticmethod
+    @cached('InboxCursors')
+    def status(username):
+        """The ID of the last notification the user has read and how many arrived after it."""
+        query = "SELECT last_read_id, unread FROM InboxCursors WHERE username = ?"
+        return execute_query(query, (username,), fetchone=True) or {'last_read_id': 0, 'unread': 0}
+
+    @staticmethod
+    def mark_read(username, up_to_id):
+        """Move the user's read cursor forward to `up_to_id` (never back)."""
+        with transaction():
+            execute_query("""INSERT INTO InboxCursors (username, last_read_id, unread) VALUES (?, ?, 0)
+                             ON CONFLICT (username) DO UPDATE
+                             SET last_read_id = MAX(last_read_id, excluded.last_read_id)""", (username, up_to_id))
+            execute_query("""UPDATE InboxCursors
+                             SET unread = (SELECT COUNT(*) FROM Inbox
+                                           WHERE Inbox.username = InboxCursors.username
+                                             AND notification_id > InboxCursors.last_read_id)
+                             WHERE username = ?""", (username,))
+        logger.debug("Notifications up to %s marked read for %s", up_to_id, username)
+
+class ResourceInterval:
+    """A typed date range for a resource, inclusive at both ends.
+
+    kind is 'available' for the windows parsed from Resource.availability and
+    'booking' for a reservation of the resource by a project. Every committed
+    insert and delete is published to on_write('ResourceIntervals')
+    listeners, which keep availability.index current.
+    """
+    KINDS = ('available', 'booking')
+
+    @staticmethod
+    def parse(text):
+        """Extract (start, end) ISO date pairs from free text such as
+        "2024-03-01 to 2024-03-17; 2024-04-01 - 2024-04-30". A lone date is a
+        one-day window."""
+        intervals = []
+        for start, end in re.findall(r'(\d{4}-\d{2}-\d{2})(?:\s*(?:to|until|-|–|\.\.)\s*(\d{4}-\d{2}-\d{2}))?', text or ''):
+            start = date.fromisoformat(start)
+            end = date.fromisoformat(end) if end else start
+            if end < start:
+                raise ValueError(f"Availability window ends before it starts: {start} to {end}")
+            intervals.append((start, end))
+        return intervals
+
+    @staticmethod
+    def create(resource_id, kind, start_date, end_date, project_id=None, note=None):
+        if kind not in ResourceInterval.KINDS:
+            raise ValueError(f"Unknown interval kind '{kind}'")
+        if end_date < start_date:
+            raise ValueError("Interval ends before it starts")
+        query = """INSERT INTO ResourceIntervals (resource_id, kind, start_date, end_date, project_id, note)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   RETURNING *"""
+        interval = execute_query(query, (resource_id, kind, start_date, end_date, project_id, note), fetchone=True)
+        publish_write('ResourceIntervals', 'insert', [interval])
+        logger.info("Resource interval (%s) for resource ID %s created successfully", kind, resource_id)
+        return interval
+
+    @staticmethod
+    def book(resource_id, project_id, start_date, end_date, note=None):
+        """Book the resource for a project, unless it is unavailable or already
+        booked for part of [start_date, end_date].
+
+        The check and the insert share one transaction that takes the write
+        lock before it reads, so two sessions can't both pass the check and
+        double-book. Resources without availability windows are always
+        available.
+        """
+        start = date.fromisoformat(str(start_date)[:10])
+        end = date.fromisoformat(str(end_date)[:10])
+        with transaction() as conn:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            booked = execute_query("""SELECT id FROM ResourceIntervals
+                                      WHERE resource_id = ? AND kind = 'booking' AND start_date <= ? AND end_date >= ?
+                                      LIMIT 1""", (resource_id, end, start), fetchone=True)
+            if booked is not None:
+                raise ValueError(f"Resource {resource_id} is already booked for part of {start} to {end}")
+            windows = execute_query("""SELECT start_date, end_date FROM ResourceIntervals
+                                       WHERE resource_id = ? AND kind = 'available'
+                                       ORDER BY start_date""", (resource_id,))
+            reached = start
+            for window in windows:
+                if window['start_date'] <= reached <= window['end_date']:
+                    reached = window['end_date'] + timedelta(days=1)
+            if windows and reached <= end:
+                raise ValueError(f"Resource {resource_id} is not available on {reached}")
+            return ResourceInterval.create(resource_id, 'booking', start, end, project_id=project_id, note=note)
+
+    @staticmethod
+    def replace_availability(resource_id, intervals):
+        with transaction():
+            ResourceInterval.delete_for_resources([resource_id], kind='available')
+            for start, end in intervals:
+                ResourceInterval.create(resource_id, 'available', start, end)
+
+    @staticmethod
+    @cached('ResourceIntervals')
+    def get_all():
+        return execute_query("SELECT * FROM ResourceIntervals")
+
+    @staticmethod
+    @cached('ResourceIntervals')
+    def for_resource(resource_id):
+        query = "SELECT * FROM ResourceIntervals WHERE resource_id = ? ORDER BY kind, start_date"
+        return execute_query(query, (resource_id,))
+
+    @staticmethod
+    def delete(interval_id):
+        deleted = execute_query("DELETE FROM ResourceIntervals WHERE id = ? RETURNING *", (interval_id,))
+        publish_write('ResourceIntervals', 'delete', deleted)
+        logger.info("Resource interval with ID %s deleted successfully", interval_id)
+
+    @staticmethod
+    def delete_for_resources(resource_ids, kind=None):
+        query = "DELETE FROM ResourceIntervals WHERE resource_id IN (SELECT value FROM json_each(?))"
+        params = (json.dumps(list(resource_ids)),)
+        if kind is not None:
+            query += " AND kind = ?"
+            params += (kind,)
+        deleted = execute_query(query + " RETURNING *", params)
+        publish_write('ResourceIntervals', 'delete', deleted)
 
 class Resource:
     @staticmethod
     def create(name, type, availability):
         query = """INSERT INTO Resources (name, type, availability)
-                   VALUES (?, ?, ?)"""
-        execute_query(query, (name, type, availability))
-        logger.info(f"Resource '{name}' created successfully")
+                   VALUES (?, ?, ?)
+                   RETURNING id"""
+        intervals = ResourceInterval.parse(availability)
+        with transaction():
+            resource_id = execute_query(query, (name, type, availability), fetchone=True)['id']
+            ResourceInterval.replace_availability(resource_id, intervals)
+        logger.info("Resource '%s' created successfully", name)
+        return resource_id
 
     @staticmethod
+    @cached('Resources')
     def get_all():
         return execute_query("SELECT * FROM Resources")
 
     @staticmethod
+    @cached('Resources')
+    def page(after_id=None, limit=50, order_by='id', filters=None):
+        return paginate('Resources', after_id, limit, order_by, filters)
+
+    @staticmethod
+    @cached('Resources')
     def get_by_id(resource_id):
         query = "SELECT * FROM Resources WHERE id = ?"
         result = execute_query(query, (resource_id,), fetchone=True)
         if result is None:
-            logger.warning(f"No resource found with ID {resource_id}")
+            logger.warning("No resource found with ID %s", resource_id)
         return result
 
     @staticmethod
     def update(resource_id, name, type, availability):
         query = """UPDATE Resources
                    SET name = ?, type = ?, availability = ?
-                   WHERE id = ?"""
-        execute_query(query, (name, type, availability, resource_id))
-        updated_resource = Resource.get_by_id(resource_id)
+                   WHERE id = ?
+                   RETURNING *"""
+        intervals = ResourceInterval.parse(availability)
+        with transaction():
+            updated_resource = execute_query(query, (name, type, availability, resource_id), fetchone=True)
+            if updated_resource:
+                ResourceInterval.replace_availability(resource_id, intervals)
         if updated_resource:
-            logger.info(f"Resource with ID {resource_id} updated successfully")
+            logger.info("Resource with ID %s updated successfully", resource_id)
             return updated_resource
-        logger.error(f"Update failed: Resource with ID {resource_id} not found after update")
+        logger.error("Update failed: Resource with ID %s not found", resource_id)
         return None
 
     @staticmethod
     def delete(resource_id):
         query = "DELETE FROM Resources WHERE id = ?"
-        execute_query(query, (resource_id,))
-        logger.info(f"Resource with ID {resource_id} deleted successfully")
+        with transaction():
+            execute_query(query, (resource_id,))
+            ResourceInterval.delete_for_resources([resource_id])
+        logger.info("Resource with ID %s deleted successfully", resource_id)
+
+    @staticmethod
+    def create_many(rows):
+        """Insert (same arguments as create) tuples in one transaction."""
+        rows = list(rows)
+        query = """INSERT INTO Resources (name, type, availability)
+                   VALUES (?, ?, ?)"""
+        with transaction() as conn:
+            count = execute_many(query, rows)
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            for resource_id, (_, _, availability) in zip(range(last_id - count + 1, last_id + 1), rows):
+                ResourceInterval.replace_availability(resource_id, ResourceInterval.parse(availability))
+        logger.info("%s resources created successfully", count)
+        return count
+
+    @staticmethod
+    def update_many(rows):
+        """Apply (same arguments as update) tuples in one transaction."""
+        rows = list(rows)
+        query = """UPDATE Resources
+                   SET name = ?, type = ?, availability = ?
+                   WHERE id = ?"""
+        with transaction():
+            count = execute_many(query, (tuple(row[1:]) + (row[0],) for row in rows))
+            for resource_id, _, _, availability in rows:
+                ResourceInterval.replace_availability(resource_id, ResourceInterval.parse(availability))
+        logger.info("%s resources updated successfully", count)
+        return count
+
+    @staticmethod
+    def delete_many(ids):
+        ids = list(ids)
+        query = "DELETE FROM Resources WHERE id = ?"
+        with transaction():
+            count = execute_many(query, ((row_id,) for row_id in ids))
+            ResourceInterval.delete_for_resources(ids)
+        logger.info("%s resources deleted successfully", count)
+        return count
+
+class TaskDependency:
+    """Edges of the task graph: `task_id` cannot start before `depends_on` finishes.
+
+    Tasks.dependencies keeps the text the user typed; this table holds its
+    parsed form and is rewritten whenever a task is written.
+    """
+
+    @staticmethod
+    def parse(text):
+        """Resolve a comma or semicolon separated list of task IDs or names to IDs."""
+        ids = []
+        for token in re.split(r'[,;]', text or ''):
+            token = token.strip().lstrip('#')
+            if not token:
+                continue
+            if token.isdigit():
+                task_id = int(token)
+                if execute_query("SELECT id FROM Tasks WHERE id = ?", (task_id,), fetchone=True) is None:
+                    raise ValueError(f"Unknown dependency: no task with ID {task_id}")
+            else:
+                row = execute_query("SELECT id FROM Tasks WHERE name = ? ORDER BY id LIMIT 1", (token,), fetchone=True)
+                if row is None:
+                    raise ValueError(f"Unknown dependency: no task named '{token}'")
+                task_id = row['id']
+            if task_id not in ids:
+                ids.append(task_id)
+        return ids
+
+    @staticmethod
+    def creates_cycle(task_id, depends_on):
+        """True if making `task_id` depend on `depends_on` would close a loop."""
+        if not depends_on:
+            return False
+        query = """WITH RECURSIVE upstream(id) AS (
+                       SELECT value FROM json_each(?)
+                       UNION
+                       SELECT d.depends_on FROM TaskDependencies d JOIN upstream u ON d.task_id = u.id
+                   )
+                   SELECT 1 AS found FROM upstream WHERE id = ? LIMIT 1"""
+        return execute_query(query, (json.dumps(list(depends_on)), task_id), fetchone=True) is not None
+
+    @staticmethod
+    def replace(task_id, depends_on):
+        if TaskDependency.creates_cycle(task_id, depends_on):
+            raise ValueError(f"Dependencies of task {task_id} would create a cycle")
+        with transaction():
+            execute_query("DELETE FROM TaskDependencies WHERE task_id = ?", (task_id,))
+            execute_many("INSERT INTO TaskDependencies (task_id, depends_on) VALUES (?, ?)",
+                         ((task_id, dependency) for dependency in depends_on))
+
+    @staticmethod
+    def delete_for_tasks(task_ids):
+        task_ids = json.dumps(list(task_ids))
+        execute_query("""DELETE FROM TaskDependencies
+                         WHERE task_id IN (SELECT value FROM json_each(?))
+                            OR depends_on IN (SELECT value FROM json_each(?))""", (task_ids, task_ids))
+
+    @staticmethod
+    @cached('TaskDependencies')
+    def get_all():
+        return execute_query("SELECT task_id, depends_on FROM TaskDependencies")
+
+    @staticmethod
+    @cached('TaskDependencies')
+    def for_task(task_id):
+        return [row['depends_on'] for row in
+                execute_query("SELECT depends_on FROM TaskDependencies WHERE task_id = ?", (task_id,))]
+
+    @staticmethod
+    def find_cycle(edges):
+        """Return the IDs of tasks whose new (task_id, depends_on) `edges` close a loop, or [].
+
+        The graph was acyclic before the edges went in, so any loop runs
+        through one of them: walk upstream from each edge's dependency and
+        look for the task that was made to depend on it.
+        """
+        edges = [list(edge) for edge in edges]
+        if not edges:
+            return []
+        query = """WITH RECURSIVE upstream(origin, id) AS (
+                       SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+                       UNION
+                       SELECT u.origin, d.depends_on FROM TaskDependencies d JOIN upstream u ON d.task_id = u.id
+                   )
+                   SELECT DISTINCT origin FROM upstream WHERE id = origin ORDER BY origin"""
+        return [row['origin'] for row in execute_query(query, (json.dumps(edges),))]
 
 class Task:
     @staticmethod
-    def create(name, start_date, end_date, dependencies):
-        query = """INSERT INTO Tasks (name, start_date, end_date, dependencies)
-                   VALUES (?, ?, ?, ?)"""
-        execute_query(query, (name, start_date, end_date, dependencies))
-        logger.info(f"Task '{name}' created successfully")
+    def create(name, start_date, end_date, dependencies, project_id=None):
+        query = """INSERT INTO Tasks (name, start_date, end_date, dependencies, project_id)
+                   VALUES (?, ?, ?, ?, ?)
+                   RETURNING id"""
+        with transaction():
+            task_id = execute_query(query, (name, start_date, end_date, dependencies, project_id), fetchone=True)['id']
+            TaskDependency.replace(task_id, TaskDependency.parse(dependencies))
+        logger.info("Task '%s' created successfully", name)
+        return task_id
 
     @staticmethod
+    @cached('Tasks')
     def get_all():
         return execute_query("SELECT * FROM Tasks")
 
     @staticmethod
+    @cached('Tasks')
+    def page(after_id=None, limit=50, order_by='id', filters=None):
+        return paginate('Tasks', after_id, limit, order_by, filters)
+
+    @staticmethod
+    @cached('Tasks')
     def get_by_id(task_id):
         query = "SELECT * FROM Tasks WHERE id = ?"
         result = execute_query(query, (task_id,), fetchone=True)
         if result is None:
-            logger.warning(f"No task found with ID {task_id}")
+            logger.warning("No task found with ID %s", task_id)
         return result
 
     @staticmethod
     def update(task_id, name, start_date, end_date, dependencies):
         query = """UPDATE Tasks
                    SET name = ?, start_date = ?, end_date = ?, dependencies = ?
-                   WHERE id = ?"""
-        execute_query(query, (name, start_date, end_date, dependencies, task_id))
-        updated_task = Task.get_by_id(task_id)
+                   WHERE id = ?
+                   RETURNING *"""
+        with transaction():
+            updated_task = execute_query(query, (name, start_date, end_date, dependencies, task_id), fetchone=True)
+            if updated_task:
+                TaskDependency.replace(task_id, TaskDependency.parse(dependencies))
         if updated_task:
-            logger.info(f"Task with ID {task_id} updated successfully")
+            logger.info("Task with ID %s updated successfully", task_id)
             return updated_task
-        logger.error(f"Update failed: Task with ID {task_id} not found after update")
+        logger.error("Update failed: Task with ID %s not found", task_id)
         return None
 
+    @staticmethod
+    def set_completed(task_id, completed_at):
+        """Mark the task done on `completed_at`, or open again when it is None."""
+        query = "UPDATE Tasks SET completed_at = ? WHERE id = ? RETURNING *"
+        task = execute_query(query, (completed_at, task_id), fetchone=True)
+        if task:
+            logger.info("Task %s marked %s", task_id, f"completed on {completed_at}" if completed_at else "open")
+        return task
+
     @staticmethod
     def delete(task_id):
         query = "DELETE FROM Tasks WHERE id = ?"
-        execute_query(query, (task_id,))
-        logger.info(f"Task with ID {task_id} deleted successfully")
+        with transaction():
+            execute_query(query, (task_id,))
+            TaskDependency.delete_for_tasks([task_id])
+        logger.info("Task with ID %s deleted successfully", task_id)
+
+    @staticmethod
+    def create_many(rows):
+        """Insert (same arguments as create) tuples in one transaction."""
+        rows = [tuple(row) + (None,) * (5 - len(row)) for row in rows]
+        query = """INSERT INTO Tasks (name, start_date, end_date, dependencies, project_id)
+                   VALUES (?, ?, ?, ?, ?)"""
+        with transaction() as conn:
+            count = execute_many(query, rows)
+            # AUTOINCREMENT hands out consecutive IDs within one transaction
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            Task._replace_dependencies(zip(range(last_id - count + 1, last_id + 1), rows))
+        logger.info("%s tasks created successfully", count)
+        return count
+
+    @staticmethod
+    def update_many(rows):
+        """Apply (same arguments as update) tuples in one transaction."""
+        rows = list(rows)
+        query = """UPDATE Tasks
+                   SET name = ?, start_date = ?, end_date = ?, dependencies = ?
+                   WHERE id = ?"""
+        with transaction():
+            count = execute_many(query, (tuple(row[1:]) + (row[0],) for row in rows))
+            Task._replace_dependencies((row[0], row[1:]) for row in rows)
+        logger.info("%s tasks updated successfully", count)
+        return count
+
+    @staticmethod
+    def _replace_dependencies(tasks):
+        """Rewrite the edges of (task_id, (name, start, end, dependencies)) pairs, then
+        check the new edges for cycles in one query instead of once per task."""
+        edges, task_ids = [], []
+        for task_id, (_, _, _, dependencies, *_) in tasks:
+            task_ids.append((task_id,))
+            edges.extend((task_id, dependency) for dependency in TaskDependency.parse(dependencies))
+        execute_many("DELETE FROM TaskDependencies WHERE task_id = ?", task_ids)
+        execute_many("INSERT INTO TaskDependencies (task_id, depends_on) VALUES (?, ?)", edges)
+        cycle = TaskDependency.find_cycle(edges)
+        if cycle:
+            raise ValueError(f"Dependencies would create a cycle through tasks {cycle}")
+
+    @staticmethod
+    def delete_many(ids):
+        ids = list(ids)
+        query = "DELETE FROM Tasks WHERE id = ?"
+        with transaction():
+            count = execute_many(query, ((row_id,) for row_id in ids))
+            TaskDependency.delete_for_tasks(ids)
+        logger.info("%s tasks deleted successfully", count)
+        return count
 
 class Budget:
     @staticmethod
@@ -233,38 +1262,71 @@ class Budget:
         query = """INSERT INTO Budgets (project_id, amount, date)
                    VALUES (?, ?, ?)"""
         execute_query(query, (project_id, amount, date))
-        logger.info(f"Budget for project ID '{project_id}' created successfully")
+        logger.info("Budget for project ID '%s' created successfully", project_id)
 
     @staticmethod
+    @cached('Budgets')
     def get_all():
         return execute_query("SELECT * FROM Budgets")
 
     @staticmethod
+    @cached('Budgets')
+    def page(after_id=None, limit=50, order_by='id', filters=None):
+        return paginate('Budgets', after_id, limit, order_by, filters)
+
+    @staticmethod
+    @cached('Budgets')
     def get_by_id(budget_id):
         query = "SELECT * FROM Budgets WHERE id = ?"
         result = execute_query(query, (budget_id,), fetchone=True)
         if result is None:
-            logger.warning(f"No budget found with ID {budget_id}")
+            logger.warning("No budget found with ID %s", budget_id)
         return result
 
     @staticmethod
     def update(budget_id, project_id, amount, date):
         query = """UPDATE Budgets
                    SET project_id = ?, amount = ?, date = ?
-                   WHERE id = ?"""
-        execute_query(query, (project_id, amount, date, budget_id))
-        updated_budget = Budget.get_by_id(budget_id)
+                   WHERE id = ?
+                   RETURNING *"""
+        updated_budget = execute_query(query, (project_id, amount, date, budget_id), fetchone=True)
         if updated_budget:
-            logger.info(f"Budget with ID {budget_id} updated successfully")
+            logger.info("Budget with ID %s updated successfully", budget_id)
             return updated_budget
-        logger.error(f"Update failed: Budget with ID {budget_id} not found after update")
+        logger.error("Update failed: Budget with ID %s not found", budget_id)
         return None
 
     @staticmethod
     def delete(budget_id):
         query = "DELETE FROM Budgets WHERE id = ?"
         execute_query(query, (budget_id,))
-        logger.info(f"Budget with ID {budget_id} deleted successfully")
+        logger.info("Budget with ID %s deleted successfully", budget_id)
+
+    @staticmethod
+    def create_many(rows):
+        """Insert (same arguments as create) tuples in one transaction."""
+        query = """INSERT INTO Budgets (project_id, amount, date)
+                   VALUES (?, ?, ?)"""
+        count = execute_many(query, rows)
+        logger.info("%s budgets created successfully", count)
+        return count
+
+    @staticmethod
+    def update_many(rows):
+        """Apply (same arguments as update) tuples in one transaction."""
+        query = """UPDATE Budgets
+                   SET project_id = ?, amount = ?, date = ?
+                   WHERE id = ?"""
+        count = execute_many(query, (tuple(row[1:]) + (row[0],) for row in rows))
+        logger.info("%s budgets updated successfully", count)
+        return count
+
+    @staticmethod
+    def delete_many(ids):
+        query = "DELETE FROM Budgets WHERE id = ?"
+        count = execute_many(query, ((row_id,) for row_id in ids))
+        logger.info("%s budgets deleted successfully", count)
+        return count
 
 class Message:
     @staticmethod
@@ -272,38 +1334,121 @@ class Message:
         query = """INSERT INTO Messages (from_user, to_user, content, date)
                    VALUES (?, ?, ?, ?)"""
         execute_query(query, (from_user, to_user, content, date))
-        logger.info(f"Message from '{from_user}' to '{to_user}' created successfully")
+        logger.info("Message from '%s' to '%s' created successfully", from_user, to_user)
 
     @staticmethod
+    @cached('Messages')
     def get_all():
         return execute_query("SELECT * FROM Messages")
 
     @staticmethod
+    @cached('Messages')
+    def page(after_id=None, limit=50, order_by='id', filters=None):
+        return paginate('Messages', after_id, limit, order_by, filters)
+
+    @staticmethod
+    @cached('Messages')
     def get_by_id(message_id):
         query = "SELECT * FROM Messages WHERE id = ?"
         result = execute_query(query, (message_id,), fetchone=True)
         if result is None:
-            logger.warning(f"No message found with ID {message_id}")
+            logger.warning("No message found with ID %s", message_id)
         return result
 
     @staticmethod
     def update(message_id, from_user, to_user, content, date):
         query = """UPDATE Messages
                    SET from_user = ?, to_user = ?, content = ?, date = ?
-                   WHERE id = ?"""
-        execute_query(query, (from_user, to_user, content, date, message_id))
-        updated_message = Message.get_by_id(message_id)
+                   WHERE id = ?
+                   RETURNING *"""
+        updated_message = execute_query(query, (from_user, to_user, content, date, message_id), fetchone=True)
         if updated_message:
-            logger.info(f"Message with ID {message_id} updated successfully")
+            logger.info("Message with ID %s updated successfully", message_id)
             return updated_message
-        logger.error(f"Update failed: Message with ID {message_id} not found after update")
+        logger.error("Update failed: Message with ID %s not found", message_id)
         return None
 
     @staticmethod
     def delete(message_id):
         query = "DELETE FROM Messages WHERE id = ?"
         execute_query(query, (message_id,))
-        logger.info(f"Message with ID {message_id} deleted successfully")
+        logger.info("Message with ID %s deleted successfully", message_id)
+
+    @staticmethod
+    def create_many(rows):
+        """Insert (same arguments as create) tuples in one transaction."""
+        query = """INSERT INTO Messages (from_user, to_user, content, date)
+                   VALUES (?, ?, ?, ?)"""
+        count = execute_many(query, rows)
+        logger.info("%s messages created successfully", count)
+        return count
+
+    @staticmethod
+    def update_many(rows):
+        """Apply (same arguments as update) tuples in one transaction."""
+        query = """UPDATE Messages
+                   SET from_user = ?, to_user = ?, content = ?, date = ?
+                   WHERE id = ?"""
+        count = execute_many(query, (tuple(row[1:]) + (row[0],) for row in rows))
+        logger.info("%s messages updated successfully", count)
+        return count
+
+    @staticmethod
+    def delete_many(ids):
+        query = "DELETE FROM Messages WHERE id = ?"
+        count = execute_many(query, ((row_id,) for row_id in ids))
+        logger.info("%s messages deleted successfully", count)
+        return count
+
+class Conversation:
+    """The messages between one pair of users.
+
+    Conversations, each message's conversation_id and the per-participant
+    unread counts in ConversationMembers are maintained by triggers on
+    Messages, so listing a user's conversations or a conversation's history
+    reads one page of an index however many messages exist.
+    """
+    @staticmethod
+    @cached('ConversationMembers')
+    def page(username, after_id=None, limit=50):
+        """The user's conversations, most recently active first. Pass the
+        last_message_id of the last conversation seen as `after_id` for the next page."""
+        query = """SELECT c.id, CASE WHEN c.user_a = cm.username THEN c.user_b ELSE c.user_a END AS other_user,
+                          cm.unread, cm.last_read_id, cm.last_message_id, m.content AS last_message, m.date
+                   FROM ConversationMembers cm
+                   JOIN Conversations c ON c.id = cm.conversation_id
+                   LEFT JOIN Messages m ON m.id = cm.last_message_id
+                   WHERE cm.username = ? AND cm.last_message_id < ?
+                   ORDER BY cm.last_message_id DESC LIMIT ?"""
+        return execute_query(query, (username, after_id if after_id is not None else 2 ** 63 - 1, limit))
+
+    @staticmethod
+    @cached('Conversations')
+    def between(user1, user2):
+        query = "SELECT * FROM Conversations WHERE user_a = ? AND user_b = ?"
+        return execute_query(query, tuple(sorted((user1, user2))), fetchone=True)
+
+    @staticmethod
+    @cached('Messages')
+    def messages(conversation_id, after_id=None, limit=50):
+        """A page of the conversation's messages, newest first, starting after message `after_id`."""
+        query = """SELECT * FROM Messages
+                   WHERE conversation_id = ? AND id < ?
+                   ORDER BY id DESC LIMIT ?"""
+        return execute_query(query, (conversation_id, after_id if after_id is not None else 2 ** 63 - 1, limit))
+
+    @staticmethod
+    @cached('ConversationMembers')
+    def unread_count(username):
+        query = "SELECT COALESCE(SUM(unread), 0) AS unread FROM ConversationMembers WHERE username = ?"
+        return execute_query(query, (username,), fetchone=True)['unread']
+
+    @staticmethod
+    def mark_read(username, conversation_id):
+        query = """UPDATE ConversationMembers
+                   SET last_read_id = last_message_id, unread = 0
+                   WHERE username = ? AND conversation_id = ? AND unread > 0"""
+        execute_query(query, (username, conversation_id))
 
 class Report:
     @staticmethod
@@ -311,38 +1456,71 @@ class Report:
         query = """INSERT INTO Reports (name, content, date)
                    VALUES (?, ?, ?)"""
         execute_query(query, (name, content, date))
-        logger.info(f"Report '{name}' created successfully")
+        logger.info("Report '%s' created successfully", name)
 
     @staticmethod
+    @cached('Reports')
     def get_all():
         return execute_query("SELECT * FROM Reports")
 
     @staticmethod
+    @cached('Reports')
+    def page(after_id=None, limit=50, order_by='id', filters=None):
+        return paginate('Reports', after_id, limit, order_by, filters)
+
+    @staticmethod
+    @cached('Reports')
     def get_by_id(report_id):
         query = "SELECT * FROM Reports WHERE id = ?"
         result = execute_query(query, (report_id,), fetchone=True)
         if result is None:
-            logger.warning(f"No report found with ID {report_id}")
+            logger.warning("No report found with ID %s", report_id)
         return result
 
     @staticmethod
     def update(report_id, name, content, date):
         query = """UPDATE Reports
                    SET name = ?, content = ?, date = ?
-                   WHERE id = ?"""
-        execute_query(query, (name, content, date, report_id))
-        updated_report = Report.get_by_id(report_id)
+                   WHERE id = ?
+                   RETURNING *"""
+        updated_report = execute_query(query, (name, content, date, report_id), fetchone=True)
         if updated_report:
-            logger.info(f"Report with ID {report_id} updated successfully")
+            logger.info("Report with ID %s updated successfully", report_id)
             return updated_report
-        logger.error(f"Update failed: Report with ID {report_id} not found after update")
+        logger.error("Update failed: Report with ID %s not found", report_id)
         return None
 
     @staticmethod
     def delete(report_id):
         query = "DELETE FROM Reports WHERE id = ?"
         execute_query(query, (report_id,))
-        logger.info(f"Report with ID {report_id} deleted successfully")
+        logger.info("Report with ID %s deleted successfully", report_id)
+
+    @staticmethod
+    def create_many(rows):
+        """Insert (same arguments as create) tuples in one transaction."""
+        query = """INSERT INTO Reports (name, content, date)
+                   VALUES (?, ?, ?)"""
+        count = execute_many(query, rows)
+        logger.info("%s reports created successfully", count)
+        return count
+
+    @staticmethod
+    def update_many(rows):
+        """Apply (same arguments as update) tuples in one transaction."""
+        query = """UPDATE Reports
+                   SET name = ?, content = ?, date = ?
+                   WHERE id = ?"""
+        count = execute_many(query, (tuple(row[1:]) + (row[0],) for row in rows))
+        logger.info("%s reports updated successfully", count)
+        return count
+
+    @staticmethod
+    def delete_many(ids):
+        query = "DELETE FROM Reports WHERE id = ?"
+        count = execute_many(query, ((row_id,) for row_id in ids))
+        logger.info("%s reports deleted successfully", count)
+        return count
 
 class User:
     @staticmethod
@@ -350,42 +1528,60 @@ class User:
         query = """INSERT INTO Users (username, password, role)
                VALUES (?, ?, ?)"""
         execute_query(query, (username, hashed_password, role))
-        logger.info(f"User '{username}' created successfully")
-
-    @staticmethod
-    def get_by_username(username):
-        query = "SELECT * FROM Users WHERE username = ?"
-        result = execute_query(query, (username,), fetchone=True)
-        if result is None:
-            logger.warning(f"No user found with username {username}")
-        return result
+        logger.info("User '%s' created successfully", username)
 
     @staticmethod
     def update(username, password, role):
         hashed_password = hash_password(password)
         query = """UPDATE Users
                    SET password = ?, role = ?
-                   WHERE username = ?"""
-        execute_query(query, (hashed_password, role, username))
-        updated_user = User.get_by_username(username)
+                   WHERE username = ?
+                   RETURNING *"""
+        updated_user = execute_query(query, (hashed_password, role, username), fetchone=True)
         if updated_user:
-            logger.info(f"User '{username}' updated successfully")
+            logger.info("User '%s' updated successfully", username)
             return updated_user
-        logger.error(f"Update failed: User '{username}' not found after update")
+        logger.error("Update failed: User '%s' not found", username)
         return None
 
     @staticmethod
     def delete(username):
         query = "DELETE FROM Users WHERE username = ?"
         execute_query(query, (username,))
-        logger.info(f"User '{username}' deleted successfully")
+        logger.info("User '%s' deleted successfully", username)
+
+    @staticmethod
+    def create_many(rows):
+        """Insert (username, hashed_password, role) tuples in one transaction."""
+        query = """INSERT INTO Users (username, password, role)
+               VALUES (?, ?, ?)"""
+        count = execute_many(query, rows)
+        logger.info("%s users created successfully", count)
+        return count
+
+    @staticmethod
+    def update_many(rows):
+        """Apply (username, password, role) tuples in one transaction."""
+        query = """UPDATE Users
+                   SET password = ?, role = ?
+                   WHERE username = ?"""
+        count = execute_many(query, ((hash_password(password), role, username) for username, password, role in rows))
+        logger.info("%s users updated successfully", count)
+        return count
+
+    @staticmethod
+    def delete_many(usernames):
+        query = "DELETE FROM Users WHERE username = ?"
+        count = execute_many(query, ((username,) for username in usernames))
+        logger.info("%s users deleted successfully", count)
+        return count
 
     @staticmethod
     def get_by_reset_token(token):
         query = "SELECT * FROM Users WHERE reset_token = ?"
         result = execute_query(query, (token,), fetchone=True)
         if result is None:
-            logger.warning(f"No user found with reset token {token}")
+            logger.warning("No user found with reset token %s", token)
         return result
 
     @staticmethod
@@ -393,27 +1589,100 @@ class User:
         hashed_password = hash_password(new_password)
         query = """UPDATE Users
                    SET password = ?
-                   WHERE username = ?"""
-        execute_query(query, (hashed_password, username))
-        updated_user = User.get_by_username(username)
+                   WHERE username = ?
+                   RETURNING *"""
+        updated_user = execute_query(query, (hashed_password, username), fetchone=True)
         if updated_user:
-            logger.info(f"Password for user '{username}' updated successfully")
+            logger.info("Password for user '%s' updated successfully", username)
             return updated_user
-        logger.error(f"Update failed: User '{username}' not found after update")
+        logger.error("Update failed: User '%s' not found", username)
         return None
     
     @staticmethod
+    def set_password_hash(username, hashed_password):
+        """Store an already hashed password, e.g. when upgrading an old hash on login."""
+        query = """UPDATE Users
+                   SET password = ?
+                   WHERE username = ?"""
+        execute_query(query, (hashed_password, username))
+        logger.info("Password hash for user '%s' replaced", username)
+
+    @staticmethod
+    @cached('Users')
     def get_by_username(username):
         query = "SELECT * FROM Users WHERE username = ?"
         return execute_query(query, (username,), fetchone=True)
 
     @staticmethod
+    @cached('Users')
     def get_all():
         query = "SELECT * FROM Users"
         return execute_query(query)  # Fetch all users
 
-# Initialize database
+    @staticmethod
+    @cached('Users')
+    def page(after_id=None, limit=50, order_by='username', filters=None):
+        return paginate('Users', after_id, limit, order_by, filters, key='username')
+
+_ROLLUP_ADD = """
+    INSERT INTO BudgetTotals (project_id, total, entries) VALUES ({row}.project_id, {row}.amount, 1)
+    ON CONFLICT (project_id) DO UPDATE SET total = total + excluded.total, entries = entries + 1;
+    INSERT INTO BudgetMonthly (project_id, month, spend, entries)
+    VALUES ({row}.project_id, COALESCE(strftime('%Y-%m', {row}.date), substr({row}.date, 1, 7)), {row}.amount, 1)
+    ON CONFLICT (project_id, month) DO UPDATE SET spend = spend + excluded.spend, entries = entries + 1;
+"""
+_ROLLUP_SUBTRACT = """
+    UPDATE BudgetTotals SET total = total - {row}.amount, entries = entries - 1
+    WHERE project_id = {row}.project_id;
+    DELETE FROM BudgetTotals WHERE project_id = {row}.project_id AND entries <= 0;
+    UPDATE BudgetMonthly SET spend = spend - {row}.amount, entries = entries - 1
+    WHERE project_id = {row}.project_id
+      AND month = COALESCE(strftime('%Y-%m', {row}.date), substr({row}.date, 1, 7));
+    DELETE FROM BudgetMonthly WHERE project_id = {row}.project_id AND entries <= 0;
+"""
+BUDGET_ROLLUP_TRIGGERS = {
+    'trg_budgets_rollup_insert': f"AFTER INSERT ON Budgets BEGIN {_ROLLUP_ADD.format(row='NEW')} END",
+    'trg_budgets_rollup_delete': f"AFTER DELETE ON Budgets BEGIN {_ROLLUP_SUBTRACT.format(row='OLD')} END",
+    'trg_budgets_rollup_update': (f"AFTER UPDATE OF project_id, amount, date ON Budgets BEGIN "
+                                  f"{_ROLLUP_SUBTRACT.format(row='OLD')} {_ROLLUP_ADD.format(row='NEW')} END"),
+}
+
+BUDGET_ROLLUP_REBUILD = (
+    "DELETE FROM BudgetTotals",
+    "DELETE FROM BudgetMonthly",
+    """INSERT INTO BudgetTotals (project_id, total, entries)
+       SELECT project_id, SUM(amount), COUNT(*) FROM Budgets GROUP BY project_id""",
+    """INSERT INTO BudgetMonthly (project_id, month, spend, entries)
+       SELECT project_id, COALESCE(strftime('%Y-%m', date), substr(date, 1, 7)) AS month, SUM(amount), COUNT(*)
+       FROM Budgets GROUP BY project_id, month""",
+)
+
+_initialized_path = None
+_initialize_lock = threading.Lock()
+
 def initialize_database():
+    """Create the schema, run pending migrations and add the default admin.
+
+    Entry points call this once at startup; importing this module doesn't.
+    Later calls for the same database return at once, and a database whose
+    PRAGMA user_version is already the latest migration skips the DDL, so
+    schema changes must come with a migration to reach existing databases.
+    """
+    global _initialized_path
+    with _initialize_lock:
+        if _initialized_path == pool.path:
+            return
+        with get_db_connection() as conn:
+            current = migration.current_version(conn) == migration.latest_version()
+        if not current:
+            _create_schema()
+        _table_columns.clear()
+        for table in TRACKED_TABLES:
+            register_table(table, table_columns(table))
+        _initialized_path = pool.path
+    logger.info("Database initialized successfully%s", " (schema current)" if current else "")
+
+def _create_schema():
     with get_db_connection() as conn:
         conn.execute('''CREATE TABLE IF NOT EXISTS Projects
                         (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -470,13 +1739,87 @@ def initialize_database():
                          role TEXT NOT NULL,
                          reset_token TEXT)''')
 
+        conn.execute('''CREATE TABLE IF NOT EXISTS TaskDependencies
+                        (task_id INTEGER NOT NULL,
+                         depends_on INTEGER NOT NULL,
+                         PRIMARY KEY (task_id, depends_on)) WITHOUT ROWID''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_task_dependencies_depends_on
+                        ON TaskDependencies (depends_on, task_id)''')
+
+        conn.execute('''CREATE TABLE IF NOT EXISTS ResourceIntervals
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         resource_id INTEGER NOT NULL,
+                         kind TEXT NOT NULL,
+                         start_date DATE NOT NULL,
+                         end_date DATE NOT NULL,
+                         project_id INTEGER,
+                         note TEXT)''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_resource_intervals_resource
+                        ON ResourceIntervals (resource_id, kind, start_date)''')
+
+        conn.execute('''CREATE TABLE IF NOT EXISTS Blobs
+                        (sha256 TEXT PRIMARY KEY,
+                         size INTEGER NOT NULL,
+                         path TEXT NOT NULL,
+                         created_at TIMESTAMP NOT NULL)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS FileVersions
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         file_id INTEGER NOT NULL,
+                         version INTEGER NOT NULL,
+                         sha256 TEXT NOT NULL,
+                         size INTEGER NOT NULL,
+                         uploaded_by TEXT,
+                         uploaded_at TIMESTAMP NOT NULL,
+                         upload_key TEXT UNIQUE,
+                         UNIQUE (file_id, version))''')
+
+        # Budget rollups, kept current by the triggers below (see rollups.py)
+        conn.execute('''CREATE TABLE IF NOT EXISTS BudgetTotals
+                        (project_id INTEGER PRIMARY KEY,
+                         total REAL NOT NULL,
+                         entries INTEGER NOT NULL)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS BudgetMonthly
+                        (project_id INTEGER NOT NULL,
+                         month TEXT NOT NULL,
+                         spend REAL NOT NULL,
+                         entries INTEGER NOT NULL,
+                         PRIMARY KEY (project_id, month)) WITHOUT ROWID''')
+        for name, sql in BUDGET_ROLLUP_TRIGGERS.items():
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {sql}")
+        if conn.execute("SELECT EXISTS (SELECT 1 FROM Budgets) AND NOT EXISTS (SELECT 1 FROM BudgetTotals)").fetchone()[0]:
+            for statement in BUDGET_ROLLUP_REBUILD:
+                conn.execute(statement)
+            conn.commit()
+            logger.info("Budget rollups built from existing entries")
+
+        conn.execute('''CREATE TABLE IF NOT EXISTS TableVersions
+                        (table_name TEXT PRIMARY KEY,
+                         version INTEGER NOT NULL,
+                         changed_at TIMESTAMP NOT NULL)''')
+
+        conn.commit()
+
+        # Everything above is the original schema; later changes are migrations
+        migration.migrate(pool.path)
+        _table_columns.clear()
+
+        # Bump the table's version on every write so caches in any process
+        # can tell which tables changed (see cache.ChangeTracker)
+        for table in TRACKED_TABLES:
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_version_{event.lower()}
+                                AFTER {event} ON {table}
+                                BEGIN
+                                    INSERT INTO TableVersions (table_name, version, changed_at)
+                                    VALUES ('{table}', 1, CURRENT_TIMESTAMP)
+                                    ON CONFLICT (table_name) DO UPDATE
+                                    SET version = version + 1, changed_at = CURRENT_TIMESTAMP;
+                                END''')
+        conn.commit()
+
         # Create default admin user
         admin_user = User.get_by_username("admin")
         if not admin_user:
             hashed_admin_password = hash_password("admin")
             User.create("admin", hashed_admin_password, "admin")
 
-    logger.info("Database initialized successfully")
-
-initialize_database()
-
@@ -0,0 +1,104 @@
+"""Content-addressed storage for uploaded files.
+
+Uploads are streamed to a temporary file in fixed-size chunks while being
+hashed, then moved to uploads/blobs/<first two hex digits>/<sha256>. A blob
+that already exists is not written again, so the same drawing uploaded to
+ten projects occupies disk once. Each upload becomes a FileVersion of the
+logical file with its name; re-uploading identical content adds no version.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+
+from database import File, FileVersion, execute_query, transaction
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = 'uploads'
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(sha256):
+    return os.path.join(UPLOAD_DIR, 'blobs', sha256[:2], sha256)
+
+
+def store_blob(stream):
+    """Copy `stream` into the blob store; return (sha256, size, path).
+
+    Memory use is bounded by CHUNK_SIZE whatever the size of the upload.
+    """
+    tmp_dir = os.path.join(UPLOAD_DIR, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        path = blob_path(sha256)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    execute_query("""INSERT INTO Blobs (sha256, size, path, created_at)
+                     VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                     ON CONFLICT (sha256) DO NOTHING""", (sha256, size, path))
+    return sha256, size, path
+
+
+def save_upload(stream, name, uploaded_by=None, upload_key=None):
+    """Store an upload as the next version of the file called `name`.
+
+    `upload_key` identifies one upload (Streamlit's UploadedFile.file_id);
+    saving the same key again returns the existing version without reading
+    the stream. Returns (version row, created) where created is False when
+    nothing new was stored.
+    """
+    if upload_key is not None:
+        existing = FileVersion.get_by_upload_key(upload_key)
+        if existing is not None:
+            return existing, False
+
+    sha256, size, path = store_blob(stream)
+    for attempt in range(2):
+        try:
+            with transaction():
+                row = execute_query("SELECT id FROM Files WHERE name = ? ORDER BY id LIMIT 1", (name,), fetchone=True)
+                if row is None:
+                    file_id = execute_query("INSERT INTO Files (name, path) VALUES (?, ?) RETURNING id",
+                                            (name, path), fetchone=True)['id']
+                else:
+                    file_id = row['id']
+                    latest = FileVersion.latest(file_id)
+                    if latest is not None and latest['sha256'] == sha256:
+                        return latest, False
+                version = FileVersion.create(file_id, sha256, size, uploaded_by, upload_key)
+                File.update(file_id, name, path)
+            logger.info("Stored version %d of '%s' (%d bytes, %s)", version['version'], name, size, sha256[:12])
+            return version, True
+        except sqlite3.IntegrityError:
+            # Another session stored the same upload or took the version number first
+            if upload_key is not None:
+                existing = FileVersion.get_by_upload_key(upload_key)
+                if existing is not None:
+                    return existing, False
+            if attempt:
+                raise
+
+
+def open_version(version):
+    return open(blob_path(version['sha256']), 'rb')
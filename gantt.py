@@ -0,0 +1,177 @@
+"""Gantt chart of tasks, rendered off the Streamlit thread and cached.
+
+Every bar goes into a single PolyCollection built from NumPy arrays, so
+drawing costs the same whether there are 10 tasks or 100,000. Bars are
+coloured by state: done, overdue (open past its end date) or open. When
+there are more tasks than the image has rows of pixels for (one bar
+needs MIN_BAR_PIXELS), consecutive tasks in start order are merged into
+lanes. Each lane spans its earliest start to its latest finish and is
+coloured by the share of its tasks that are done.
+
+Images are PNG bytes cached under a hash of the task set and the chart
+size, so an unchanged schedule is never drawn twice. A single worker
+thread does the drawing. Sessions that ask for the same chart while it
+is being drawn share one render.
+"""
+import functools
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+
+import numpy as np
+
+from database import cached, execute_query
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGES = 32
+MIN_BAR_PIXELS = 4
+MAX_LABELS = 60
+DPI = 100
+COLORS = {'done': '#4caf50', 'overdue': '#e53935', 'open': '#1e88e5'}
+
+
+@cached('Tasks')
+def timeline_rows(project_id=None):
+    """(id, name, start_date, end_date, completed_at) of the tasks, in start order."""
+    query = "SELECT id, name, start_date, end_date, completed_at FROM Tasks"
+    params = ()
+    if project_id is not None:
+        query += " WHERE project_id = ?"
+        params = (project_id,)
+    return execute_query(query + " ORDER BY start_date, id", params)
+
+
+class Timeline:
+    """Task dates as day-number arrays (days since 1970-01-01)."""
+
+    def __init__(self, rows):
+        self.names = [row['name'] for row in rows]
+        self.start = np.array([row['start_date'] for row in rows], dtype='datetime64[D]').astype(np.int64)
+        # A task occupies its end date too
+        self.end = np.array([row['end_date'] for row in rows], dtype='datetime64[D]').astype(np.int64) + 1
+        self.done = np.array([row['completed_at'] is not None for row in rows], dtype=bool)
+
+    def __len__(self):
+        return len(self.start)
+
+    @functools.cached_property
+    def digest(self):
+        digest = hashlib.sha256()
+        for array in (self.start, self.end, self.done):
+            digest.update(array.tobytes())
+        if len(self) <= MAX_LABELS:
+            digest.update("\0".join(self.names).encode())
+        return digest.hexdigest()
+
+
+def lanes(timeline, count):
+    """Merge consecutive tasks into `count` lanes: (start, end, done fraction) arrays."""
+    bounds = np.linspace(0, len(timeline), count + 1).astype(np.int64)[:-1]
+    sizes = np.diff(np.append(bounds, len(timeline)))
+    start = np.minimum.reduceat(timeline.start, bounds)
+    end = np.maximum.reduceat(timeline.end, bounds)
+    done = np.add.reduceat(timeline.done.astype(np.int64), bounds) / sizes
+    return start, end, done
+
+
+def draw(timeline, width=1000, height=500, today=None):
+    """Render the chart to PNG bytes."""
+    # Imported here so the app only pays for matplotlib on the page that draws
+    from matplotlib import colormaps, dates as mdates
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import PolyCollection
+    from matplotlib.figure import Figure
+
+    today = np.datetime64(today or date.today(), 'D').astype(np.int64)
+    figure = Figure(figsize=(width / DPI, height / DPI), dpi=DPI)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    count = len(timeline)
+    if count == 0:
+        ax.text(0.5, 0.5, "No tasks", ha='center', va='center', transform=ax.transAxes)
+        ax.set_axis_off()
+    else:
+        max_rows = max(int(height * 0.8) // MIN_BAR_PIXELS, 1)
+        if count > max_rows:
+            start, end, done = lanes(timeline, max_rows)
+            colors = colormaps['RdYlGn'](done)
+            ax.set_title(f"{count} tasks in {max_rows} lanes, coloured by share done")
+        else:
+            start, end = timeline.start, timeline.end
+            state = np.where(timeline.done, 'done', np.where(timeline.end <= today, 'overdue', 'open'))
+            colors = [COLORS[name] for name in state]
+            ax.set_title(f"{count} tasks")
+        rows = np.arange(len(start))
+        top, bottom = rows - 0.4, rows + 0.4
+        verts = np.stack([np.column_stack(corner) for corner in
+                          ((start, top), (end, top), (end, bottom), (start, bottom))], axis=1)
+        ax.add_collection(PolyCollection(verts, facecolors=colors, edgecolors='none'))
+        ax.set_xlim(start.min() - 1, end.max() + 1)
+        if start.min() <= today <= end.max():
+            ax.axvline(today, color='#616161', linewidth=1, linestyle='--')
+        ax.set_ylim(len(start) - 0.5, -0.5)
+        if count <= MAX_LABELS:
+            ax.set_yticks(rows, timeline.names, fontsize=8)
+        else:
+            ax.set_yticks([])
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+_images = OrderedDict()
+_pending = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gantt')
+# The last task list seen and its Timeline; read_cache hands back the same
+# list until Tasks is written, so reruns skip rebuilding the arrays
+_last = (None, None)
+
+
+def _timeline(rows):
+    global _last
+    last_rows, timeline = _last
+    if rows is not last_rows:
+        timeline = Timeline(rows)
+        _last = (rows, timeline)
+    return timeline
+
+
+def _render(key, timeline, width, height, today):
+    try:
+        image = draw(timeline, width, height, today)
+        with _lock:
+            _images[key] = image
+            while len(_images) > MAX_IMAGES:
+                _images.popitem(last=False)
+        logger.info("Rendered Gantt chart of %d tasks", len(timeline))
+        return image
+    finally:
+        with _lock:
+            _pending.pop(key, None)
+
+
+def chart(project_id=None, width=1000, height=500, today=None):
+    """Return a Future of the chart's PNG bytes; it is already done when the chart is cached."""
+    today = today or date.today()
+    timeline = _timeline(timeline_rows(project_id))
+    key = (timeline.digest, width, height, today)
+    with _lock:
+        if key in _images:
+            _images.move_to_end(key)
+            future = Future()
+            future.set_result(_images[key])
+            return future
+        future = _pending.get(key)
+        if future is None:
+            future = _pending[key] = _executor.submit(_render, key, timeline, width, height, today)
+        return future
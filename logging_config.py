@@ -0,0 +1,135 @@
+"""Application logging: queued, structured and configurable per module.
+
+Log calls only put the record on an in-memory queue; a background
+QueueListener thread formats it as one JSON object per line and writes it
+to the log file and stderr. Formatting happens on that thread too, so
+callers should pass arguments (logger.info("saved %s", name)) rather than
+pre-formatted f-strings. If the queue is full the record is dropped and
+counted rather than blocking the caller.
+
+Settings come from the environment:
+
+    LOG_LEVEL      root level (default INFO)
+    LOG_LEVELS     per-logger levels, e.g. "database=WARNING,auth=DEBUG"
+    LOG_SAMPLE     keep only a fraction of DEBUG/INFO records from a logger,
+                   e.g. "database=0.1"; warnings and errors are never sampled
+    LOG_FILE       path of the JSON log file (default app.log)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+QUEUE_SIZE = 10000
+
+_STANDARD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Pass a fraction of the DEBUG and INFO records of selected loggers."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        name = record.name
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                if random.random() < rate:
+                    return True
+                self.dropped += 1
+                return False
+            name = name.rpartition('.')[0]
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue records as they are, leaving all formatting to the listener thread."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_pairs(text, convert):
+    pairs = {}
+    for item in (text or '').split(','):
+        name, _, value = item.partition('=')
+        if name.strip() and value.strip():
+            pairs[name.strip()] = convert(value.strip())
+    return pairs
+
+
+def configure_logging(level=None, module_levels=None, sample_rates=None, log_file=None):
+    """Route all logging through the background listener. Safe to call repeatedly;
+    only the first call takes effect."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        level = level or os.environ.get('LOG_LEVEL', 'INFO')
+        if module_levels is None:
+            module_levels = _parse_pairs(os.environ.get('LOG_LEVELS'), str.upper)
+        if sample_rates is None:
+            sample_rates = _parse_pairs(os.environ.get('LOG_SAMPLE'), float)
+        log_file = log_file or os.environ.get('LOG_FILE', 'app.log')
+
+        formatter = JsonFormatter()
+        handlers = [logging.FileHandler(log_file), logging.StreamHandler(sys.stderr)]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        queue_handler = NonBlockingQueueHandler(queue.Queue(QUEUE_SIZE))
+        if sample_rates:
+            queue_handler.addFilter(SamplingFilter(sample_rates))
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+        for name, module_level in module_levels.items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
@@ -0,0 +1,157 @@
+"""Per-statement query metrics and the slow-query log.
+
+Every statement run through database.execute_query/execute_many is
+recorded under its normalized text (literals replaced by ?, whitespace
+collapsed) with a latency histogram, row counts, commit time and the time
+spent waiting for the write lock. Recording is a dictionary lookup and a
+few additions under a lock, cheap enough to leave on in production.
+
+Statements slower than SLOW_QUERY_MS milliseconds (default 250) are
+logged as warnings on the "database.slow" logger and kept in a short
+in-memory list for the Performance page.
+"""
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+slow_logger = logging.getLogger('database.slow')
+
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_MS', 250)) / 1000
+
+# Bucket upper bounds from 10 microseconds doubling up to about 21 seconds
+BUCKET_BOUNDS = tuple(10e-6 * 2 ** i for i in range(22))
+
+
+@lru_cache(maxsize=4096)
+def normalize(sql):
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\s+', ' ', sql).strip()
+    return re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?, ...)', sql)
+
+
+class LatencyHistogram:
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS + (self.max,), self.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.5) * 1000, 3),
+            'p95_ms': round(self.percentile(0.95) * 1000, 3),
+            'p99_ms': round(self.percentile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+class StatementStats:
+    __slots__ = ('latency', 'rows', 'errors', 'commit', 'lock_wait')
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.rows = 0
+        self.errors = 0
+        self.commit = 0.0
+        self.lock_wait = 0.0
+
+
+class QueryMetrics:
+    def __init__(self, slow_threshold=SLOW_QUERY_SECONDS, slow_log_size=100):
+        self.slow_threshold = slow_threshold
+        self.statements = {}
+        self.pool_wait = LatencyHistogram()
+        self.commits = LatencyHistogram()
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, sql, seconds, rows=0, commit_seconds=0.0, lock_wait_seconds=0.0, error=False):
+        statement = normalize(sql)
+        with self._lock:
+            stats = self.statements.get(statement)
+            if stats is None:
+                stats = self.statements[statement] = StatementStats()
+            stats.latency.add(seconds)
+            stats.rows += max(rows, 0)
+            stats.errors += error
+            stats.commit += commit_seconds
+            stats.lock_wait += lock_wait_seconds
+            if commit_seconds:
+                self.commits.add(commit_seconds)
+        if seconds >= self.slow_threshold:
+            entry = {'at': time.time(), 'statement': statement, 'duration_ms': round(seconds * 1000, 3),
+                     'rows': rows, 'lock_wait_ms': round(lock_wait_seconds * 1000, 3), 'error': error}
+            self.slow_queries.append(entry)
+            slow_logger.warning("Slow query (%.1f ms): %s", seconds * 1000, statement,
+                                extra={'duration_ms': entry['duration_ms'], 'rows': rows,
+                                       'lock_wait_ms': entry['lock_wait_ms']})
+
+    def record_pool_wait(self, seconds):
+        with self._lock:
+            self.pool_wait.add(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            statements = []
+            for statement, stats in self.statements.items():
+                entry = {'statement': statement, 'rows': stats.rows, 'errors': stats.errors,
+                         'commit_ms': round(stats.commit * 1000, 3),
+                         'lock_wait_ms': round(stats.lock_wait * 1000, 3)}
+                entry.update(stats.latency.summary())
+                statements.append(entry)
+            statements.sort(key=lambda entry: entry['total_ms'], reverse=True)
+            return {
+                'since': self.started_at,
+                'slow_query_threshold_ms': self.slow_threshold * 1000,
+                'statements': statements,
+                'commits': self.commits.summary(),
+                'pool_wait': self.pool_wait.summary(),
+                'slow_queries': list(self.slow_queries),
+            }
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self.statements.clear()
+            self.pool_wait = LatencyHistogram()
+            self.commits = LatencyHistogram()
+            self.slow_queries.clear()
+            self.started_at = time.time()
+
+
+query_metrics = QueryMetrics()
@@ -1,32 +1,488 @@
-import sqlite3
+"""Versioned schema migrations, tracked in PRAGMA user_version.
+
+    python migration.py [--db construction_projects.db] [--status] [--target N]
+
+Each migration has a version number and runs once, in order, inside a
+transaction that also records its version, so a database is always at
+exactly one version and a failed migration leaves it at the previous one.
+database.initialize_database() creates the original schema and then runs
+every pending migration, so new and existing databases end up the same.
+
+SQLite cannot add constraints or foreign keys to an existing table, so
+those migrations rebuild the table: create the new version alongside the
+old one, copy rows across in batches of `batch_size`, committing after
+each so the app can keep reading and writing, and then swap the tables in
+one short transaction. Rows written to the old table while it is being
+copied are recorded by temporary triggers and copied again at the swap.
+Indexes and triggers on the table are recreated after the swap.
+
+Only one process should run migrations at a time.
+"""
+import argparse
 import logging
+import sqlite3
+import time
+from collections import namedtuple
+
+import config
+from logging_config import configure_logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def migrate_database():
-    conn = sqlite3.connect('construction_projects.db')
-    cursor = conn.cursor()
+BATCH_SIZE = 5000
+
+Migration = namedtuple('Migration', ('version', 'description', 'apply'))
+MIGRATIONS = []
+
+
+class MigrationError(Exception):
+    pass
+
+
+def migration(version, description):
+    def decorator(func):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migration {version} must come after {MIGRATIONS[-1].version}")
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+    return decorator
+
+
+def latest_version():
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _table_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _rowid_alias(conn, table):
+    """The INTEGER PRIMARY KEY column of `table`, which is its rowid, if it has one."""
+    keys = [row for row in conn.execute(f"PRAGMA table_info({table})") if row[5]]
+    if len(keys) == 1 and keys[0][2].upper() == 'INTEGER':
+        return keys[0][1]
+    return None
+
+
+def _drop_rebuild_leftovers(conn, table):
+    dirty = f"_dirty_{table}"
+    for event in ('insert', 'update', 'delete'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {dirty}_{event}")
+    conn.execute(f"DROP TABLE IF EXISTS {dirty}")
+    conn.execute(f"DROP TABLE IF EXISTS {table}_new")
+
+
+def rebuild_table(conn, table, create_sql, batch_size=BATCH_SIZE, pause=0.0):
+    """Replace `table` with the table `create_sql` defines ({name} stands for
+    the table name), keeping its rows, indexes and triggers.
+
+    Columns the tables share are copied; new columns take their defaults.
+    Must be called inside a transaction, and returns inside the transaction
+    that swaps the tables so the caller can commit it with other changes.
+    """
+    new, dirty = f"{table}_new", f"_dirty_{table}"
+    _drop_rebuild_leftovers(conn, table)
+    conn.execute(create_sql.format(name=new))
+    new_columns = set(_columns(conn, new))
+    columns = [column for column in _columns(conn, table) if column in new_columns]
+    if _rowid_alias(conn, table) is None:
+        columns.insert(0, 'rowid')
+    column_list = ", ".join(columns)
+
+    conn.execute(f"CREATE TABLE {dirty} (key INTEGER PRIMARY KEY)")
+    for event, rows in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',))):
+        record = " ".join(f"INSERT OR IGNORE INTO {dirty} VALUES ({row}.rowid);" for row in rows)
+        conn.execute(f"CREATE TRIGGER {dirty}_{event.lower()} AFTER {event} ON {table} BEGIN {record} END")
+    conn.execute("COMMIT")
+
+    copied, last = 0, conn.execute(f"SELECT MIN(rowid) - 1 FROM {table}").fetchone()[0]
+    try:
+        while last is not None:
+            conn.execute("BEGIN IMMEDIATE")
+            upper = conn.execute(f"""SELECT MAX(rowid) FROM
+                                         (SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?)""",
+                                 (last, batch_size)).fetchone()[0]
+            if upper is None:
+                conn.execute("COMMIT")
+                break
+            cursor = conn.execute(f"""INSERT INTO {new} ({column_list})
+                                      SELECT {column_list} FROM {table} WHERE rowid > ? AND rowid <= ?""",
+                                  (last, upper))
+            conn.execute("COMMIT")
+            copied, last = copied + cursor.rowcount, upper
+            logger.debug("Copied %d rows of %s", copied, table)
+            if pause:
+                time.sleep(pause)
+
+        conn.execute("BEGIN IMMEDIATE")
+        # Rows changed since their batch was copied are copied again
+        conn.execute(f"DELETE FROM {new} WHERE rowid IN (SELECT key FROM {dirty})")
+        conn.execute(f"""INSERT INTO {new} ({column_list})
+                         SELECT {column_list} FROM {table} WHERE rowid IN (SELECT key FROM {dirty})""")
+    except sqlite3.IntegrityError as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.execute("BEGIN IMMEDIATE")
+        _drop_rebuild_leftovers(conn, table)
+        conn.execute("COMMIT")
+        raise MigrationError(f"Rows of {table} do not fit the new schema ({e}); fix them and migrate again") from e
+
+    schema = conn.execute("""SELECT sql FROM sqlite_master
+                             WHERE tbl_name = ? AND type IN ('index', 'trigger')
+                               AND sql IS NOT NULL AND name NOT LIKE ?""", (table, f"{dirty}%")).fetchall()
+    sequence = None
+    if _table_exists(conn, 'sqlite_sequence'):
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"DROP TABLE {dirty}")
+    conn.execute(f"ALTER TABLE {new} RENAME TO {table}")
+    for (sql,) in schema:
+        conn.execute(sql)
+    if sequence:
+        # Keep AUTOINCREMENT from reusing the IDs of rows deleted before the rebuild
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (sequence[0], table))
+    if _table_exists(conn, 'TableVersions'):
+        conn.execute("""UPDATE TableVersions SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+                        WHERE table_name = ?""", (table,))
+    problems = conn.execute(f"PRAGMA foreign_key_check({table})").fetchall()
+    if problems:
+        logger.warning("%d rows of %s reference missing rows", len(problems), table)
+    logger.info("Rebuilt %s (%d rows)", table, copied)
+
+
+@migration(1, "Drop the indexes duplicated by primary keys and unique indexes")
+def drop_redundant_indexes(conn, **options):
+    for name in ('idx_users_username', 'unique_users_username', 'idx_projects_name'):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+@migration(2, "Check that projects end after they start")
+def projects_date_check(conn, **options):
+    rebuild_table(conn, 'Projects', '''CREATE TABLE {name}
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         name TEXT NOT NULL,
+                         description TEXT,
+                         start_date DATE,
+                         end_date DATE,
+                         CHECK (start_date <= end_date))''', **options)
+
+
+@migration(3, "Link tasks to projects and check that they end after they start")
+def tasks_project_key(conn, **options):
+    rebuild_table(conn, 'Tasks', '''CREATE TABLE {name}
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         name TEXT NOT NULL,
+                         start_date DATE NOT NULL,
+                         end_date DATE NOT NULL,
+                         dependencies TEXT,
+                         project_id INTEGER REFERENCES Projects (id) ON DELETE SET NULL,
+                         CHECK (start_date <= end_date))''', **options)
+
+
+@migration(4, "Link files to projects")
+def files_project_key(conn, **options):
+    rebuild_table(conn, 'Files', '''CREATE TABLE {name}
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         name TEXT NOT NULL,
+                         path TEXT NOT NULL,
+                         project_id INTEGER REFERENCES Projects (id) ON DELETE SET NULL)''', **options)
+
+
+@migration(5, "Reject negative budget amounts")
+def budgets_amount_check(conn, **options):
+    rebuild_table(conn, 'Budgets', '''CREATE TABLE {name}
+                        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         project_id INTEGER NOT NULL,
+                         amount REAL NOT NULL CHECK (amount >= 0),
+                         date DATE NOT NULL)''', **options)
+
+
+@migration(6, "Restrict user roles to admin and user")
+def users_role_check(conn, **options):
+    rebuild_table(conn, 'Users', '''CREATE TABLE {name}
+                        (username TEXT PRIMARY KEY,
+                         password TEXT NOT NULL,
+                         role TEXT NOT NULL CHECK (role IN ('admin', 'user')),
+                         reset_token TEXT)''', **options)
+
+
+@migration(7, "Index the columns the pages filter and sort on")
+def hot_path_indexes(conn, **options):
+    for name, definition in (
+        ('idx_budgets_project_date', 'Budgets (project_id, date)'),
+        ('idx_budgets_date', 'Budgets (date)'),
+        ('idx_messages_to_user_date', 'Messages (to_user, date)'),
+        ('idx_messages_from_user_date', 'Messages (from_user, date)'),
+        ('idx_notifications_date', 'Notifications (date)'),
+        ('idx_reports_date', 'Reports (date)'),
+        ('idx_projects_start_date', 'Projects (start_date)'),
+        ('idx_tasks_start_date', 'Tasks (start_date)'),
+        ('idx_tasks_project', 'Tasks (project_id)'),
+        ('idx_files_project', 'Files (project_id)'),
+    ):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+
+
+# Full-text indexes (see search.py): source table -> (index table, indexed
+# columns, bm25 weight of each column)
+SEARCH_INDEXES = {
+    'Reports': ('ReportsSearch', ('name', 'content'), (5.0, 1.0)),
+    'Messages': ('MessagesSearch', ('content',), (1.0,)),
+    'Projects': ('ProjectsSearch', ('name', 'description'), (5.0, 1.0)),
+    'Notifications': ('NotificationsSearch', ('message',), (1.0,)),
+}
+
+
+@migration(8, "Add full-text search indexes over reports, messages, projects and notifications")
+def search_indexes(conn, **options):
+    for table, (index, columns, weights) in SEARCH_INDEXES.items():
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"NEW.{column}" for column in columns)
+        old_values = ", ".join(f"OLD.{column}" for column in columns)
+        # External content: the index stores only tokens and reads text back from the table
+        conn.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5
+                         ({column_list}, content='{table}', content_rowid='id',
+                          tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_search_insert AFTER INSERT ON {table}
+                         BEGIN
+                             INSERT INTO {index} (rowid, {column_list}) VALUES (NEW.id, {new_values});
+                         END""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_search_delete AFTER DELETE ON {table}
+                         BEGIN
+                             INSERT INTO {index} ({index}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+                         END""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_search_update
+                         AFTER UPDATE OF {column_list} ON {table}
+                         BEGIN
+                             INSERT INTO {index} ({index}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+                             INSERT INTO {index} (rowid, {column_list}) VALUES (NEW.id, {new_values});
+                         END""")
+        conn.execute(f"INSERT INTO {index} ({index}, rank) VALUES ('rank', 'bm25({', '.join(map(str, weights))})')")
+        conn.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+
+
+@migration(9, "Add per-user notification inboxes with read cursors")
+def notification_inbox(conn, **options):
+    conn.execute("ALTER TABLE Notifications ADD COLUMN recipient TEXT")
+    conn.execute("""CREATE TABLE IF NOT EXISTS Inbox
+                    (username TEXT NOT NULL,
+                     notification_id INTEGER NOT NULL,
+                     PRIMARY KEY (username, notification_id)) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_inbox_notification ON Inbox (notification_id)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS InboxCursors
+                    (username TEXT PRIMARY KEY,
+                     last_read_id INTEGER NOT NULL DEFAULT 0,
+                     unread INTEGER NOT NULL DEFAULT 0)""")
+    # A notification goes to its recipient, or to every user when it has none
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_notifications_inbox_insert AFTER INSERT ON Notifications
+                    BEGIN
+                        INSERT INTO Inbox (username, notification_id)
+                        SELECT username, NEW.id FROM Users
+                        WHERE NEW.recipient IS NULL OR username = NEW.recipient;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_notifications_inbox_delete AFTER DELETE ON Notifications
+                    BEGIN
+                        DELETE FROM Inbox WHERE notification_id = OLD.id;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_users_inbox_delete AFTER DELETE ON Users
+                    BEGIN
+                        DELETE FROM Inbox WHERE username = OLD.username;
+                        DELETE FROM InboxCursors WHERE username = OLD.username;
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_inbox_unread_insert AFTER INSERT ON Inbox
+                    BEGIN
+                        INSERT INTO InboxCursors (username, last_read_id, unread) VALUES (NEW.username, 0, 1)
+                        ON CONFLICT (username) DO UPDATE SET unread = unread + (NEW.notification_id > last_read_id);
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_inbox_unread_delete AFTER DELETE ON Inbox
+                    BEGIN
+                        UPDATE InboxCursors SET unread = unread - 1
+                        WHERE username = OLD.username AND OLD.notification_id > last_read_id;
+                    END""")
+    # Existing users start with the latest notifications, already read
+    conn.execute("""INSERT OR IGNORE INTO InboxCursors (username, last_read_id, unread)
+                    SELECT username, (SELECT COALESCE(MAX(id), 0) FROM Notifications), 0 FROM Users""")
+    conn.execute("""INSERT OR IGNORE INTO Inbox (username, notification_id)
+                    SELECT u.username, n.id FROM Users u, (SELECT id FROM Notifications ORDER BY id DESC LIMIT 100) n""")
+
+
+@migration(10, "Group messages into conversations with per-participant unread counts")
+def message_conversations(conn, **options):
+    conn.execute("ALTER TABLE Messages ADD COLUMN conversation_id INTEGER")
+    # One conversation per pair of users, stored with user_a < user_b
+    conn.execute("""CREATE TABLE IF NOT EXISTS Conversations
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     user_a TEXT NOT NULL,
+                     user_b TEXT NOT NULL,
+                     last_message_id INTEGER NOT NULL,
+                     last_message_at DATE,
+                     UNIQUE (user_a, user_b))""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS ConversationMembers
+                    (username TEXT NOT NULL,
+                     conversation_id INTEGER NOT NULL,
+                     last_read_id INTEGER NOT NULL DEFAULT 0,
+                     unread INTEGER NOT NULL DEFAULT 0,
+                     last_message_id INTEGER NOT NULL,
+                     PRIMARY KEY (username, conversation_id)) WITHOUT ROWID""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_conversation_members_recent
+                    ON ConversationMembers (username, last_message_id)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON Messages (conversation_id, id)")
+
+    conversation_of_new = """(SELECT id FROM Conversations
+                              WHERE user_a = min(NEW.from_user, NEW.to_user) AND user_b = max(NEW.from_user, NEW.to_user))"""
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_messages_conversation_insert AFTER INSERT ON Messages
+                     BEGIN
+                         INSERT INTO Conversations (user_a, user_b, last_message_id, last_message_at)
+                         VALUES (min(NEW.from_user, NEW.to_user), max(NEW.from_user, NEW.to_user), NEW.id, NEW.date)
+                         ON CONFLICT (user_a, user_b) DO UPDATE
+                         SET last_message_id = excluded.last_message_id, last_message_at = excluded.last_message_at;
+                         UPDATE Messages SET conversation_id = {conversation_of_new} WHERE id = NEW.id;
+                         -- Sending a message means the sender has read the conversation
+                         INSERT INTO ConversationMembers (username, conversation_id, last_read_id, unread, last_message_id)
+                         VALUES (NEW.from_user, {conversation_of_new}, NEW.id, 0, NEW.id)
+                         ON CONFLICT (username, conversation_id) DO UPDATE
+                         SET last_read_id = NEW.id, unread = 0, last_message_id = NEW.id;
+                         INSERT INTO ConversationMembers (username, conversation_id, last_read_id, unread, last_message_id)
+                         VALUES (NEW.to_user, {conversation_of_new}, 0, 1, NEW.id)
+                         ON CONFLICT (username, conversation_id) DO UPDATE
+                         SET unread = unread + (NEW.to_user != NEW.from_user), last_message_id = NEW.id;
+                     END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_messages_conversation_delete AFTER DELETE ON Messages
+                    BEGIN
+                        UPDATE ConversationMembers SET unread = unread - 1
+                        WHERE username = OLD.to_user AND conversation_id = OLD.conversation_id
+                          AND OLD.id > last_read_id AND unread > 0;
+                    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_messages_conversation_update
+                     AFTER UPDATE OF from_user, to_user ON Messages
+                     BEGIN
+                         INSERT INTO Conversations (user_a, user_b, last_message_id, last_message_at)
+                         VALUES (min(NEW.from_user, NEW.to_user), max(NEW.from_user, NEW.to_user), NEW.id, NEW.date)
+                         ON CONFLICT (user_a, user_b) DO UPDATE
+                         SET last_message_id = max(last_message_id, excluded.last_message_id);
+                         UPDATE Messages SET conversation_id = {conversation_of_new} WHERE id = NEW.id;
+                         INSERT OR IGNORE INTO ConversationMembers (username, conversation_id, last_read_id, last_message_id)
+                         VALUES (NEW.from_user, {conversation_of_new}, NEW.id, NEW.id),
+                                (NEW.to_user, {conversation_of_new}, NEW.id, NEW.id);
+                     END""")
+
+    # Existing messages: one conversation per pair, everything already read
+    conn.execute("""INSERT OR IGNORE INTO Conversations (user_a, user_b, last_message_id, last_message_at)
+                    SELECT min(from_user, to_user), max(from_user, to_user), MAX(id), MAX(date)
+                    FROM Messages GROUP BY 1, 2""")
+    conn.execute("""UPDATE Messages SET conversation_id =
+                        (SELECT id FROM Conversations
+                         WHERE user_a = min(Messages.from_user, Messages.to_user)
+                           AND user_b = max(Messages.from_user, Messages.to_user))""")
+    conn.execute("""INSERT OR IGNORE INTO ConversationMembers (username, conversation_id, last_read_id, unread, last_message_id)
+                    SELECT user_a, id, last_message_id, 0, last_message_id FROM Conversations
+                    UNION ALL
+                    SELECT user_b, id, last_message_id, 0, last_message_id FROM Conversations""")
+
+
+@migration(11, "Track bulk import jobs so failed imports can resume")
+def import_jobs(conn, **options):
+    conn.execute("""CREATE TABLE IF NOT EXISTS ImportJobs
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     entity TEXT NOT NULL,
+                     source TEXT NOT NULL,
+                     fingerprint TEXT NOT NULL,
+                     status TEXT NOT NULL CHECK (status IN ('running', 'failed', 'done')),
+                     rows_done INTEGER NOT NULL DEFAULT 0,
+                     rows_loaded INTEGER NOT NULL DEFAULT 0,
+                     rows_rejected INTEGER NOT NULL DEFAULT 0,
+                     errors TEXT,
+                     started_at TIMESTAMP NOT NULL,
+                     updated_at TIMESTAMP NOT NULL)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_import_jobs_source ON ImportJobs (entity, fingerprint, status)")
+
+
+@migration(12, "Record task completion and planned project budgets for status reports")
+def status_report_columns(conn, **options):
+    conn.execute("ALTER TABLE Tasks ADD COLUMN completed_at DATE")
+    conn.execute("ALTER TABLE Projects ADD COLUMN planned_budget REAL CHECK (planned_budget >= 0)")
+    # FileVersions is created by database.initialize_database(), which runs
+    # the migrations afterwards; a bare legacy database may not have it yet
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'FileVersions'").fetchone():
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_file_versions_uploaded_at ON FileVersions (uploaded_at)")
+
+
+@migration(13, "Version project rows for optimistic concurrency")
+def project_row_versions(conn, **options):
+    # Every UPDATE of Projects has to set row_version = row_version + 1, as
+    # Project's methods do, or the change slips past Project.apply_changes
+    conn.execute("ALTER TABLE Projects ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1")
+
+
+def connect(path):
+    # Autocommit mode, so the migrations control their own transactions.
+    # Foreign keys stay off: rebuilding a parent table would otherwise fail.
+    conn = config.connect(path, timeout=30.0, isolation_level=None)
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("PRAGMA busy_timeout = 30000")
+    return conn
+
 
-    # Add foreign key constraints
-    cursor.execute('PRAGMA foreign_keys = ON;')
+def migrate(path, target=None, batch_size=BATCH_SIZE, pause=0.0):
+    """Apply every migration after the database's version, up to `target`
+    (default: all). Returns the version the database ends up at."""
+    conn = connect(path)
+    try:
+        applied = 0
+        for step in MIGRATIONS:
+            if target is not None and step.version > target:
+                break
+            conn.execute("BEGIN IMMEDIATE")
+            if current_version(conn) >= step.version:
+                conn.execute("ROLLBACK")
+                continue
+            started = time.perf_counter()
+            try:
+                step.apply(conn, batch_size=batch_size, pause=pause)
+                conn.execute(f"PRAGMA user_version = {step.version}")
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            applied += 1
+            logger.info("Applied migration %d (%s) in %.2fs", step.version, step.description,
+                        time.perf_counter() - started)
+        if applied:
+            conn.execute("PRAGMA optimize")
+        return current_version(conn)
+    finally:
+        conn.close()
 
-    # Add indexes
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_projects_name ON Projects (name);')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_username ON Users (username);')
 
-    # Add unique constraints
-    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS unique_projects_name ON Projects (name);')
-    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS unique_users_username ON Users (username);')
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=config.DATABASE_PATH)
+    parser.add_argument('--target', type=int, help="stop after this version")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds to sleep between copied batches")
+    parser.add_argument('--status', action='store_true', help="list migrations and exit")
+    args = parser.parse_args()
 
-    # Add data validation constraints
-    cursor.execute('ALTER TABLE Budgets ADD CONSTRAINT chk_amount CHECK (amount >= 0);')
-    cursor.execute('ALTER TABLE Tasks ADD CONSTRAINT chk_dates CHECK (start_date <= end_date);')
+    if args.status:
+        conn = connect(args.db)
+        version = current_version(conn)
+        conn.close()
+        for step in MIGRATIONS:
+            print(f"{'applied' if step.version <= version else 'pending':>8}  {step.version:>3}  {step.description}")
+        return
+    version = migrate(args.db, args.target, args.batch_size, args.pause)
+    logger.info("Database is at version %d", version)
 
-    conn.commit()
-    conn.close()
-    logger.info("Database migrations applied successfully")
 
 if __name__ == "__main__":
-    migrate_database()
+    configure_logging()
+    main()
@@ -0,0 +1,138 @@
+"""Password hashing with bcrypt on a bounded worker pool.
+
+bcrypt is deliberately slow, so hashing on the Streamlit script thread
+would stall the session for the whole hash, and a burst of logins would
+stall every session. Hashes run on a small thread pool instead (bcrypt
+releases the GIL while it works). At most `max_pending` hashes may be queued
+or running; beyond that callers wait up to `timeout` seconds and then get
+HasherBusy rather than piling up unbounded work.
+
+The bcrypt cost is calibrated on first use so one hash takes about
+PASSWORD_HASH_TARGET_MS milliseconds on this machine, and never drops below
+MIN_ROUNDS. verify() reports when a stored hash is weaker than the current
+cost, or is one of the old unsalted SHA-256 hashes, so callers can upgrade
+it on a successful login.
+
+Passwords are reduced with SHA-256 before bcrypt, which only reads the
+first 72 bytes of its input.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+TARGET_SECONDS = float(os.environ.get('PASSWORD_HASH_TARGET_MS', 250)) / 1000
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+_LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _prehash(password):
+    return base64.b64encode(hashlib.sha256(password.encode()).digest())
+
+
+def calibrate(target=TARGET_SECONDS, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS):
+    """Return the highest bcrypt cost whose hash time stays within `target` seconds.
+
+    Each extra round doubles the work, so one timing at a cheap cost is
+    enough to extrapolate.
+    """
+    probe = 8
+    started = time.perf_counter()
+    bcrypt.hashpw(_prehash('calibration'), bcrypt.gensalt(rounds=probe))
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    rounds = probe
+    while rounds < max_rounds and elapsed * 2 ** (rounds + 1 - probe) <= target:
+        rounds += 1
+    rounds = max(min_rounds, rounds)
+    logger.info("Calibrated bcrypt cost %d (%.1f ms per hash at cost %d)", rounds, elapsed * 1000, probe)
+    return rounds
+
+
+def _cost(stored):
+    try:
+        return int(stored.split('$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+class PasswordHasher:
+    def __init__(self, workers=None, max_pending=None, rounds=None, timeout=10.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+        self._rounds = rounds
+        self._rounds_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
+
+    @property
+    def rounds(self):
+        if self._rounds is None:
+            with self._rounds_lock:
+                if self._rounds is None:
+                    self._rounds = calibrate()
+        return self._rounds
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HasherBusy(f"More than {self.max_pending} password hashes pending")
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def _hash(self, password):
+        return bcrypt.hashpw(_prehash(password), bcrypt.gensalt(rounds=self.rounds)).decode()
+
+    def _verify(self, password, stored):
+        if _LEGACY_SHA256.match(stored):
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(legacy, stored), True
+        try:
+            ok = bcrypt.checkpw(_prehash(password), stored.encode())
+        except ValueError:
+            return False, False
+        return ok, ok and _cost(stored) < self.rounds
+
+    def hash(self, password):
+        return self._run(self._hash, password)
+
+    def verify(self, password, stored):
+        """Return (matches, needs_rehash) for `password` against a stored hash."""
+        return self._run(self._verify, password, stored)
+
+    def burn(self):
+        """Spend the time of one verification, for lookups of unknown users."""
+        self._run(self._hash, 'unknown user')
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+hasher = PasswordHasher()
+
+
+def hash_password(password):
+    return hasher.hash(password)
+
+
+def verify_password(password, stored):
+    return hasher.verify(password, stored)
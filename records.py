@@ -0,0 +1,148 @@
+"""Compact row objects for query results, and SQLite date conversion.
+
+A query result row is a Record: a __slots__ object with one slot per
+column. That costs roughly a third of the memory of the dict it
+replaces. It behaves as a read-only mapping, so row['name'], row.get(),
+dict(row), ** unpacking and comparison with dicts all keep working.
+Columns can also be read as attributes (row.name). Each distinct column
+list gets one class. Classes for whole tables are registered under the
+table's singular name, so `SELECT * FROM Projects` rows are Project
+records.
+
+DATE and TIMESTAMP columns are converted when they are read, by the
+converters registered here: DATE to datetime.date, TIMESTAMP to
+datetime.datetime. Connections opened with
+detect_types=sqlite3.PARSE_DECLTYPES get these types. Dates and datetimes
+are stored as ISO strings, the format the schema has always used.
+Computed columns (MAX(date), strftime(...)) have no declared type and
+stay strings.
+"""
+import keyword
+import sqlite3
+from collections.abc import Mapping
+from datetime import date, datetime
+
+
+def _adapt_date(value):
+    return value.isoformat()
+
+
+def _adapt_datetime(value):
+    # CURRENT_TIMESTAMP's format, so stored values sort together
+    return value.isoformat(sep=' ')
+
+
+def _convert_date(value):
+    text = value.decode()
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        return text
+
+
+def _convert_timestamp(value):
+    text = value.decode()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+sqlite3.register_adapter(date, _adapt_date)
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter('DATE', _convert_date)
+sqlite3.register_converter('TIMESTAMP', _convert_timestamp)
+
+
+class Record(Mapping):
+    """Base of the generated row classes; `_fields` are the column names in order."""
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key not in self._index:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({values})"
+
+    def __reduce__(self):
+        return _rebuild, (self._fields, tuple(getattr(self, name) for name in self._fields))
+
+
+def _rebuild(fields, values):
+    return record_class(fields)._make(values)
+
+
+_classes = {}
+
+
+def record_class(fields, name='Record'):
+    """The Record class for rows with these column names, created on first use.
+
+    Returns None when the names can't all be slots (duplicates, keywords or
+    expressions such as COUNT(*) without an alias); callers fall back to dicts.
+    """
+    fields = tuple(fields)
+    cls = _classes.get(fields)
+    if cls is not None or fields in _classes:
+        return cls
+    if len(set(fields)) != len(fields) or not all(
+            field.isidentifier() and not keyword.iskeyword(field) and not hasattr(Record, field)
+            and not field.startswith('_') for field in fields):
+        _classes[fields] = None
+        return None
+    namespace = {'__slots__': fields, '_fields': fields, '_index': frozenset(fields)}
+    cls = type(name, (Record,), namespace)
+    # Assigning every slot from one tuple unpack is the cheapest way to build a row
+    if fields:
+        source = (f"def _make(values):\n"
+                  f"    self = new(cls)\n"
+                  f"    {', '.join('self.' + field for field in fields)}, = values\n"
+                  f"    return self\n")
+    else:
+        source = "def _make(values):\n    return new(cls)\n"
+    scope = {'new': object.__new__, 'cls': cls}
+    exec(source, scope)
+    cls._make = staticmethod(scope['_make'])
+    _classes[fields] = cls
+    return cls
+
+
+# Table names whose singular isn't the name without its final "s"
+SINGULAR_NAMES = {
+    'TaskDependencies': 'TaskDependency',
+}
+
+
+def register_table(table, fields):
+    """Name the record class of `table`'s full column list after the table (Projects -> Project)."""
+    name = SINGULAR_NAMES.get(table) or (table[:-1] if table.endswith('s') else table)
+    fields = tuple(fields)
+    existing = _classes.get(fields)
+    if existing is None or existing.__name__ == 'Record':
+        _classes.pop(fields, None)
+        return record_class(fields, name)
+    return existing
+
+
+def make_rows(names, rows):
+    """Records (or dicts, if the names can't be slots) for plain tuples from a cursor."""
+    cls = record_class(names)
+    if cls is None:
+        return [dict(zip(names, row)) for row in rows]
+    return list(map(cls._make, rows))
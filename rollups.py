@@ -0,0 +1,100 @@
+"""Per-project budget rollups.
+
+BudgetTotals (total and entry count per project) and BudgetMonthly (spend
+per project and month) are maintained by triggers on Budgets, so every
+write path, including bulk loads and other processes, keeps them current
+in the same transaction. Reads here touch O(projects) or O(months) rows
+instead of every budget entry.
+
+If the summary tables are ever suspected to have drifted, rebuild them:
+
+    python rollups.py rebuild
+"""
+import logging
+import sys
+
+from database import BUDGET_ROLLUP_REBUILD, cached, execute_query, initialize_database, transaction
+
+logger = logging.getLogger(__name__)
+
+
+# Rollups only change when Budgets does, so they share its cache entries.
+@cached('Budgets')
+def _totals():
+    return execute_query("SELECT project_id, total, entries FROM BudgetTotals ORDER BY project_id")
+
+
+@cached('Projects')
+def _project_names():
+    return {row['id']: row['name'] for row in execute_query("SELECT id, name FROM Projects")}
+
+
+def project_totals():
+    """Total amount and entry count per project, with the project name.
+
+    The names are read separately so that renaming a project, which
+    doesn't touch Budgets, shows up here too.
+    """
+    names = _project_names()
+    return [{'project_id': row['project_id'], 'name': names.get(row['project_id']),
+             'total': row['total'], 'entries': row['entries']} for row in _totals()]
+
+
+@cached('Budgets')
+def monthly_spend(project_id):
+    """Spend per month for one project with the running balance to date."""
+    return execute_query("""SELECT month, spend, entries,
+                                   SUM(spend) OVER (ORDER BY month) AS running_balance
+                            FROM BudgetMonthly WHERE project_id = ?
+                            ORDER BY month""", (project_id,))
+
+
+@cached('Budgets')
+def portfolio_monthly_spend():
+    """Spend per month summed over all projects."""
+    return execute_query("""SELECT month, SUM(spend) AS spend,
+                                   SUM(SUM(spend)) OVER (ORDER BY month) AS running_balance
+                            FROM BudgetMonthly GROUP BY month ORDER BY month""")
+
+
+def rebuild():
+    """Recompute both summary tables from Budgets in one transaction.
+
+    The rollups are cached under Budgets, so its version is bumped with them:
+    caches in every process drop the old figures, not only this one's.
+    """
+    with transaction():
+        for statement in BUDGET_ROLLUP_REBUILD:
+            execute_query(statement)
+        execute_query("""INSERT INTO TableVersions (table_name, version, changed_at)
+                         VALUES ('Budgets', 1, CURRENT_TIMESTAMP)
+                         ON CONFLICT (table_name) DO UPDATE
+                         SET version = version + 1, changed_at = CURRENT_TIMESTAMP""")
+    logger.info("Budget rollups rebuilt")
+
+
+def check():
+    """Return the project IDs whose BudgetTotals row disagrees with Budgets."""
+    rows = execute_query("""SELECT b.project_id FROM
+                                (SELECT project_id, SUM(amount) AS total, COUNT(*) AS entries
+                                 FROM Budgets GROUP BY project_id) b
+                            LEFT JOIN BudgetTotals t ON t.project_id = b.project_id
+                            WHERE t.project_id IS NULL OR t.entries != b.entries
+                               OR abs(t.total - b.total) > 1e-6
+                            UNION
+                            SELECT project_id FROM BudgetTotals
+                            WHERE project_id NOT IN (SELECT project_id FROM Budgets)""")
+    return [row['project_id'] for row in rows]
+
+
+if __name__ == "__main__":
+    initialize_database()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'check'
+    if command == 'rebuild':
+        rebuild()
+    elif command == 'check':
+        drifted = check()
+        print(f"Rollups drifted for projects: {drifted}" if drifted else "Rollups are consistent")
+        sys.exit(1 if drifted else 0)
+    else:
+        sys.exit("usage: python rollups.py [check|rebuild]")
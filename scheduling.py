@@ -0,0 +1,421 @@
+"""Critical path method (CPM) scheduling over the task dependency graph.
+
+The graph is held as NumPy arrays: tasks are numbered 0..n-1 and edges are
+stored twice in CSR form, once grouped by predecessor and once by successor.
+Tasks are bucketed into topological levels so each pass is one vectorized
+step per level rather than one Python step per task.
+
+A task may not start before its planned start date nor before every task it
+depends on has finished. Durations are whole days, counting both the start
+and end date. Offsets are in days from the earliest planned start.
+"""
+import copy
+import heapq
+import logging
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from database import Task, TaskDependency, change_tracker, fetch_columns, read_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CycleError(ValueError):
+    pass
+
+
+def _to_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _gather(ptr, targets, nodes):
+    """Return (owner, target) arrays for every CSR edge leaving `nodes`."""
+    starts = ptr[nodes]
+    counts = ptr[nodes + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    return np.repeat(nodes, counts), targets[offsets]
+
+
+class Schedule:
+    def __init__(self, task_ids, starts, durations, edges):
+        """`task_ids`, `starts` (day offsets) and `durations` are parallel sequences;
+        `edges` is a sequence of (task_id, depends_on) pairs."""
+        self.task_ids = np.asarray(task_ids, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.durations = np.asarray(durations, dtype=np.int64)
+        self._reindex()
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        self.base_date = None
+        self._build_graph(self._indices(edges[:, 1]), self._indices(edges[:, 0]))
+        self.compute()
+
+    @classmethod
+    def from_database(cls):
+        # Loaded by column: the dates arrive as datetime64 arrays, so no
+        # per-task objects are built
+        tasks = fetch_columns("SELECT id, start_date, end_date FROM Tasks")
+        if not len(tasks['id']):
+            schedule = cls([], [], [], [])
+            schedule.base_date = date.today()
+            return schedule
+        base = tasks['start_date'].min()
+        starts = (tasks['start_date'] - base).astype(np.int64)
+        durations = np.maximum((tasks['end_date'] - tasks['start_date']).astype(np.int64) + 1, 0)
+        edges = fetch_columns("SELECT task_id, depends_on FROM TaskDependencies")
+        schedule = cls(tasks['id'], starts, durations, np.column_stack((edges['task_id'], edges['depends_on'])))
+        schedule.base_date = base.astype(date)
+        return schedule
+
+    def _reindex(self):
+        self._order = np.argsort(self.task_ids, kind='stable')
+        self._sorted_ids = self.task_ids[self._order]
+
+    def _position(self, task_id):
+        """Index of `task_id` in the arrays, or None if the task is unknown."""
+        at = int(np.searchsorted(self._sorted_ids, task_id))
+        if at < len(self._sorted_ids) and self._sorted_ids[at] == task_id:
+            return int(self._order[at])
+        return None
+
+    def _indices(self, task_ids):
+        task_ids = np.asarray(task_ids, dtype=np.int64)
+        at = np.searchsorted(self._sorted_ids, task_ids)
+        found = at < len(self._sorted_ids)
+        found[found] = self._sorted_ids[at[found]] == task_ids[found]
+        if not found.all():
+            raise KeyError(f"Unknown task IDs {task_ids[~found][:20].tolist()}")
+        return self._order[at]
+
+    def _build_graph(self, edge_src, edge_dst):
+        n = len(self.task_ids)
+        by_src = np.argsort(edge_src, kind='stable')
+        self.succ_ptr = np.concatenate(([0], np.cumsum(np.bincount(edge_src, minlength=n))))
+        self.succ = edge_dst[by_src]
+        by_dst = np.argsort(edge_dst, kind='stable')
+        self.pred_ptr = np.concatenate(([0], np.cumsum(np.bincount(edge_dst, minlength=n))))
+        self.pred = edge_src[by_dst]
+
+        # Kahn's algorithm, one whole level of ready tasks at a time. A task's
+        # level is one more than the highest level among its predecessors.
+        waiting = np.bincount(edge_dst, minlength=n)
+        frontier = np.flatnonzero(waiting == 0)
+        self.level = np.full(n, -1, dtype=np.int64)
+        self.levels = []
+        while frontier.size:
+            self.level[frontier] = len(self.levels)
+            self.levels.append(frontier)
+            _, targets = _gather(self.succ_ptr, self.succ, frontier)
+            if targets.size == 0:
+                break
+            nodes, counts = np.unique(targets, return_counts=True)
+            waiting[nodes] -= counts
+            frontier = nodes[waiting[nodes] == 0]
+        if (self.level < 0).any():
+            stuck = self.task_ids[self.level < 0]
+            raise CycleError(f"Task dependencies contain a cycle through tasks {stuck[:20].tolist()}")
+
+    def compute(self):
+        """Run the full forward and backward passes."""
+        n = len(self.task_ids)
+        self.es = self.starts.copy()
+        self.ef = self.es + self.durations
+        for nodes in self.levels:
+            self._forward_level(nodes)
+        self.finish = int(self.ef.max()) if n else 0
+        self.lf = np.full(n, self.finish, dtype=np.int64)
+        self.ls = self.lf - self.durations
+        for nodes in reversed(self.levels):
+            self._backward_level(nodes)
+
+    def _forward_level(self, nodes):
+        owners, preds = _gather(self.pred_ptr, self.pred, nodes)
+        es = self.starts[nodes].copy()
+        if preds.size:
+            # Owners come out grouped in the order of `nodes`, so a running
+            # maximum per group is a single reduceat
+            counts = self.pred_ptr[nodes + 1] - self.pred_ptr[nodes]
+            has_preds = counts > 0
+            group_starts = (np.cumsum(counts) - counts)[has_preds]
+            es[has_preds] = np.maximum(es[has_preds], np.maximum.reduceat(self.ef[preds], group_starts))
+        self.es[nodes] = es
+        self.ef[nodes] = es + self.durations[nodes]
+
+    def _backward_level(self, nodes):
+        owners, succs = _gather(self.succ_ptr, self.succ, nodes)
+        lf = np.full(len(nodes), self.finish, dtype=np.int64)
+        if succs.size:
+            counts = self.succ_ptr[nodes + 1] - self.succ_ptr[nodes]
+            has_succs = counts > 0
+            group_starts = (np.cumsum(counts) - counts)[has_succs]
+            lf[has_succs] = np.minimum.reduceat(self.ls[succs], group_starts)
+        self.lf[nodes] = lf
+        self.ls[nodes] = lf - self.durations[nodes]
+
+    def _reachable(self, seeds, ptr, targets, max_level):
+        """Mark what `seeds` reach through ptr/targets, not going past `max_level`."""
+        seen = np.zeros(len(self.task_ids), dtype=bool)
+        frontier = np.unique(np.asarray(seeds, dtype=np.int64))
+        seen[frontier] = True
+        while frontier.size:
+            _, reached = _gather(ptr, targets, frontier)
+            reached = np.unique(reached)
+            frontier = reached[~seen[reached]]
+            seen[frontier] = True
+            frontier = frontier[self.level[frontier] <= max_level]
+        return seen
+
+    def _propagate(self, seeds, step, values, ptr, targets, levels, reverse=False):
+        """Run `step` over `seeds`, then over the neighbours (through ptr/targets)
+        of every node whose `values` array entry it changed, and so on until
+        nothing changes.
+
+        `levels` gives each node's level and self.levels its bucket; nodes
+        are stepped a whole level at a time, in level order or in reverse.
+        """
+        dirty = np.zeros(len(self.task_ids), dtype=bool)
+        queued = np.zeros(len(self.levels), dtype=bool)
+        heap = []
+
+        def push(nodes):
+            dirty[nodes] = True
+            for level in np.unique(levels[nodes]).tolist():
+                if not queued[level]:
+                    queued[level] = True
+                    heapq.heappush(heap, -level if reverse else level)
+
+        push(np.asarray(seeds, dtype=np.int64))
+        while heap:
+            level = abs(heapq.heappop(heap))
+            queued[level] = False
+            bucket = self.levels[level]
+            nodes = bucket[dirty[bucket]]
+            dirty[nodes] = False
+            before = getattr(self, values)[nodes].copy()
+            step(nodes)
+            changed = nodes[getattr(self, values)[nodes] != before]
+            _, reached = _gather(ptr, targets, changed)
+            if reached.size:
+                push(reached)
+
+    def copy(self):
+        """A copy that update_task can change while readers go on using this one."""
+        clone = copy.copy(self)
+        for name in ('starts', 'durations', 'es', 'ef', 'ls', 'lf', 'level', 'pred_ptr', 'succ_ptr'):
+            setattr(clone, name, getattr(self, name).copy())
+        # update_task replaces levels rather than changing them in place
+        clone.levels = list(self.levels)
+        return clone
+
+    def update_task(self, task_id, start_date=None, end_date=None, depends_on=None):
+        """Apply a change to one task and recompute only what it changes.
+
+        A new dependency list is patched into both CSR arrays. Levels, then
+        earliest dates, are recomputed from the task downstream, and latest
+        dates from the task and its old and new predecessors upstream; each
+        pass stops wherever a task's value comes out as it was. If the
+        programme finish moved, every other latest date moves with it by the
+        same number of days.
+        """
+        if self.base_date is None:
+            raise ValueError("update_task needs a schedule with a base date; use Schedule.from_database()")
+        if self._position(task_id) is None:
+            self._add_task(task_id)
+        i = self._position(task_id)
+        touched = [i]
+        if start_date is not None or end_date is not None:
+            start = _to_date(start_date) if start_date is not None else self.base_date + timedelta(days=int(self.starts[i]))
+            end = _to_date(end_date) if end_date is not None else start + timedelta(days=int(self.durations[i]) - 1)
+            self.starts[i] = (start - self.base_date).days
+            self.durations[i] = max((end - start).days + 1, 0)
+        if depends_on is not None:
+            old_preds = self.pred[self.pred_ptr[i]:self.pred_ptr[i + 1]].copy()
+            new_preds = self._indices(depends_on) if len(depends_on) else np.empty(0, dtype=np.int64)
+            self._check_acyclic(i, new_preds)
+            self._set_predecessors(i, old_preds, new_preds)
+            self._relevel(i)
+            touched.extend(old_preds.tolist())
+            touched.extend(new_preds.tolist())
+
+        self._propagate([i], self._forward_level, 'ef', self.succ_ptr, self.succ, self.level)
+        finish = int(self.ef.max())
+        if finish != self.finish:
+            # How far a task must finish before the programme end depends only
+            # on what follows it, so away from the change the shift is uniform
+            self.lf += finish - self.finish
+            self.ls += finish - self.finish
+            self.finish = finish
+        self._propagate(touched, self._backward_level, 'ls', self.pred_ptr, self.pred, self.level, reverse=True)
+
+    def _check_acyclic(self, i, new_preds):
+        """Raise CycleError if task i can reach one of its new predecessors.
+
+        Only the task's incoming edges change, so any loop runs from the task
+        to a new predecessor, and only through levels up to that
+        predecessor's.
+        """
+        candidates = new_preds[self.level[new_preds] >= self.level[i]]
+        if not candidates.size:
+            return
+        reached = self._reachable([i], self.succ_ptr, self.succ, int(self.level[candidates].max()))
+        looped = candidates[reached[candidates]]
+        if looped.size:
+            raise CycleError(f"Task dependencies contain a cycle through tasks "
+                             f"{[int(self.task_ids[i])] + self.task_ids[looped].tolist()}")
+
+    def _set_predecessors(self, i, old_preds, new_preds):
+        """Replace task i's incoming edges in both CSR arrays."""
+        n = len(self.task_ids)
+        start, end = self.pred_ptr[i], self.pred_ptr[i + 1]
+        self.pred = np.concatenate((self.pred[:start], new_preds, self.pred[end:]))
+        self.pred_ptr[i + 1:] += len(new_preds) - (end - start)
+
+        removed = np.setdiff1d(old_preds, new_preds)
+        added = np.setdiff1d(new_preds, old_preds)
+        drop = [self.succ_ptr[p] + np.flatnonzero(self.succ[self.succ_ptr[p]:self.succ_ptr[p + 1]] == i)[0]
+                for p in removed]
+        succ = np.delete(self.succ, np.asarray(drop, dtype=np.int64))
+        ptr = self.succ_ptr - np.concatenate(([0], np.cumsum(np.bincount(removed, minlength=n))))
+        # Each new edge goes at the end of its predecessor's list
+        self.succ = np.insert(succ, ptr[added + 1], i)
+        self.succ_ptr = ptr + np.concatenate(([0], np.cumsum(np.bincount(added, minlength=n))))
+
+    def _relevel(self, i):
+        """Reassign levels from task i downstream after its predecessors
+        changed, and move the tasks whose level changed between buckets."""
+        old_levels = self.level.copy()
+        # Nothing else's predecessors changed, so the old levels still put
+        # every task after all of its predecessors
+        self._propagate([i], self._level_step, 'level', self.succ_ptr, self.succ, old_levels)
+        moved = np.flatnonzero(self.level != old_levels)
+        if not moved.size:
+            return
+        moving = np.zeros(len(self.task_ids), dtype=bool)
+        moving[moved] = True
+        arriving = moved[np.argsort(self.level[moved], kind='stable')]
+        arriving_levels = self.level[arriving]
+        for level in np.union1d(old_levels[moved], self.level[moved]).tolist():
+            bucket = self.levels[level] if level < len(self.levels) else np.empty(0, dtype=np.int64)
+            lo, hi = np.searchsorted(arriving_levels, [level, level + 1])
+            bucket = np.concatenate((bucket[~moving[bucket]], arriving[lo:hi]))
+            if level < len(self.levels):
+                self.levels[level] = bucket
+            else:
+                self.levels.append(bucket)
+        # Every level up to the highest keeps at least one task, so only the
+        # top ones can have emptied
+        while self.levels and not self.levels[-1].size:
+            self.levels.pop()
+
+    def _level_step(self, nodes):
+        owners, preds = _gather(self.pred_ptr, self.pred, nodes)
+        levels = np.zeros(len(nodes), dtype=np.int64)
+        if preds.size:
+            counts = self.pred_ptr[nodes + 1] - self.pred_ptr[nodes]
+            has_preds = counts > 0
+            group_starts = (np.cumsum(counts) - counts)[has_preds]
+            levels[has_preds] = np.maximum.reduceat(self.level[preds], group_starts) + 1
+        self.level[nodes] = levels
+
+    def _add_task(self, task_id):
+        """Append a task with no dependencies; it starts out on level 0."""
+        n = len(self.task_ids)
+        at = int(np.searchsorted(self._sorted_ids, task_id))
+        self.task_ids = np.append(self.task_ids, task_id)
+        self._sorted_ids = np.insert(self._sorted_ids, at, task_id)
+        self._order = np.insert(self._order, at, n)
+        for name in ('starts', 'durations', 'es', 'ef', 'ls', 'lf', 'level'):
+            setattr(self, name, np.append(getattr(self, name), 0))
+        self.pred_ptr = np.append(self.pred_ptr, self.pred_ptr[-1])
+        self.succ_ptr = np.append(self.succ_ptr, self.succ_ptr[-1])
+        if self.levels:
+            self.levels[0] = np.append(self.levels[0], n)
+        else:
+            self.levels.append(np.array([n], dtype=np.int64))
+
+    @property
+    def total_float(self):
+        return self.ls - self.es
+
+    def critical_path(self):
+        """Task IDs with zero total float, in the order they can run."""
+        critical = np.flatnonzero(self.total_float == 0)
+        order = np.lexsort((self.level[critical], self.es[critical]))
+        return self.task_ids[critical[order]].tolist()
+
+    def rows(self):
+        """One dict per task with its CPM dates, ordered by earliest start."""
+        base = self.base_date or date.today()
+        day = timedelta(days=1)
+        total_float = self.total_float
+        rows = []
+        for i in np.lexsort((self.level, self.es)):
+            rows.append({
+                'id': int(self.task_ids[i]),
+                'earliest_start': base + int(self.es[i]) * day,
+                'earliest_finish': base + (int(self.ef[i]) - 1) * day,
+                'latest_start': base + int(self.ls[i]) * day,
+                'latest_finish': base + (int(self.lf[i]) - 1) * day,
+                'total_float': int(total_float[i]),
+                'critical': bool(total_float[i] == 0),
+            })
+        return rows
+
+
+_schedule = None
+_schedule_versions = None
+_schedule_lock = threading.Lock()
+
+
+def _graph_versions():
+    versions = change_tracker.versions()
+    return versions.get('Tasks'), versions.get('TaskDependencies')
+
+
+def get_schedule():
+    """Return the programme schedule, rebuilding it only after Tasks or their
+    dependencies were written by something other than refresh_task()."""
+    global _schedule, _schedule_versions
+    change_tracker.sync(read_cache)
+    with _schedule_lock:
+        versions = _graph_versions()
+        if _schedule is None or versions != _schedule_versions:
+            _schedule = Schedule.from_database()
+            _schedule_versions = versions
+            logger.info("Rebuilt schedule for %d tasks", len(_schedule.task_ids))
+        return _schedule
+
+
+def refresh_task(task_id):
+    """Fold a just-written task into the cached schedule incrementally.
+
+    The change is made to a copy that then replaces the cached schedule, so
+    callers still holding the old one never see it half updated.
+    """
+    global _schedule, _schedule_versions
+    with _schedule_lock:
+        schedule = _schedule
+    if schedule is None:
+        return
+    task = Task.get_by_id(task_id)
+    depends_on = TaskDependency.for_task(task_id)
+    with _schedule_lock:
+        if schedule is not _schedule:
+            return
+        if task is None or _to_date(task['start_date']) < schedule.base_date:
+            # Deleted tasks and tasks that move the programme start need a rebuild
+            _schedule_versions = None
+            return
+        updated = schedule.copy()
+        try:
+            updated.update_task(task_id, task['start_date'], task['end_date'], depends_on)
+        except (KeyError, CycleError):
+            _schedule_versions = None
+            return
+        _schedule = updated
+        _schedule_versions = _graph_versions()
@@ -0,0 +1,104 @@
+"""Full-text search over reports, messages, project descriptions and notifications.
+
+Each source table has an FTS5 index (created by migration 8) that triggers
+keep in step with every insert, update and delete. Queries are ranked by
+bm25 with names weighted above body text, and the ranking happens inside
+FTS5, so a query returns its top results in milliseconds however many
+rows are indexed.
+
+User input is turned into a safe FTS5 query: each word must appear, a word
+ending in * matches any word it starts, and so does the last word, so
+results update sensibly while the user is still typing.
+"""
+import re
+
+from database import cached, execute_query
+from migration import SEARCH_INDEXES
+
+# kind -> (source table, SQL for the result title, date column)
+SOURCES = {
+    'report': ('Reports', "t.name", "t.date"),
+    'message': ('Messages', "t.from_user || ' to ' || t.to_user", "t.date"),
+    'project': ('Projects', "t.name", "t.start_date"),
+    'notification': ('Notifications', "'Notification'", "t.date"),
+}
+
+_TERM = re.compile(r'\w+\*?')
+
+
+def match_query(text):
+    """Return the FTS5 MATCH expression for free text, or None if it has no words."""
+    terms = _TERM.findall(text or '')
+    parts = []
+    for position, term in enumerate(terms):
+        word = term.rstrip('*')
+        prefix = term.endswith('*') or position == len(terms) - 1
+        parts.append(f'"{word}"' + ('*' if prefix else ''))
+    return " ".join(parts) or None
+
+
+def _search(kind, match, limit, where='', params=()):
+    table, title, date_column = SOURCES[kind]
+    index = SEARCH_INDEXES[table][0]
+    return execute_query(f"""SELECT '{kind}' AS kind, m.rowid AS id, {title} AS title, {date_column} AS date,
+                                    m.snippet, m.rank
+                             FROM (SELECT rowid, rank, snippet({index}, -1, '**', '**', '…', 12) AS snippet
+                                   FROM {index}
+                                   WHERE {index} MATCH ? {where}
+                                   ORDER BY rank LIMIT ?) m
+                             JOIN {table} t ON t.id = m.rowid
+                             ORDER BY m.rank""", (match, *params, limit))
+
+
+@cached('Reports')
+def search_reports(match, limit=20):
+    return _search('report', match, limit)
+
+
+@cached('Messages')
+def search_messages(match, limit=20, username=None):
+    """Messages matching `match`; only those sent or received by `username` if given."""
+    if username is None:
+        return _search('message', match, limit)
+    return _search('message', match, limit,
+                   "AND rowid IN (SELECT id FROM Messages WHERE from_user = ? OR to_user = ?)",
+                   (username, username))
+
+
+@cached('Projects')
+def search_projects(match, limit=20):
+    return _search('project', match, limit)
+
+
+@cached('Notifications')
+def search_notifications(match, limit=20, username=None):
+    """Notifications matching `match`; only those in `username`'s inbox if given."""
+    if username is None:
+        return _search('notification', match, limit)
+    return _search('notification', match, limit,
+                   "AND rowid IN (SELECT notification_id FROM Inbox WHERE username = ?)", (username,))
+
+
+def search(text, limit=20, kinds=None, username=None):
+    """The best `limit` matches for `text` across all sources (or just `kinds`).
+
+    Each result is a dict with kind, id, title, date, a snippet with the
+    matched words in **bold**, and its bm25 rank (lower is better). Pass
+    `username` to restrict messages to those the user sent or received,
+    and notifications to those in the user's inbox.
+    """
+    match = match_query(text)
+    if match is None:
+        return []
+    kinds = kinds or SOURCES
+    results = []
+    if 'report' in kinds:
+        results += search_reports(match, limit)
+    if 'message' in kinds:
+        results += search_messages(match, limit, username)
+    if 'project' in kinds:
+        results += search_projects(match, limit)
+    if 'notification' in kinds:
+        results += search_notifications(match, limit, username)
+    results.sort(key=lambda row: row['rank'])
+    return results[:limit]
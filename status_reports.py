@@ -0,0 +1,154 @@
+"""Project status reports computed from the data rather than typed in.
+
+For every project: how many of its tasks are complete, how many are
+overdue (open past their end date), the budget spent against the
+planned budget, and the files added in the last seven days. One
+statement computes all projects at once. It makes a single grouped pass
+over Tasks and over the week's FileVersions, and reads spend from the
+BudgetTotals rollup.
+
+The result is cached with a stamp: the database path, the day, and the
+TableVersions of every table it reads. A background thread re-checks
+the stamp every POLL_SECONDS and recomputes when it changes. Until then
+project_status() hands back the previous result straight away, so the
+Reporting page never waits on the query unless nothing has been computed
+yet.
+
+    python status_reports.py     print the current report
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from database import change_tracker, execute_query, initialize_database, pool, read_cache
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 5.0
+SOURCE_TABLES = ('Projects', 'Tasks', 'Budgets', 'Files', 'FileVersions')
+
+StatusReport = namedtuple('StatusReport', ('stamp', 'computed_at', 'rows'))
+
+_STATUS_QUERY = """
+WITH task_stats AS (
+    SELECT project_id,
+           COUNT(*) AS tasks,
+           COUNT(completed_at) AS completed,
+           SUM(completed_at IS NULL AND end_date < :today) AS overdue
+    FROM Tasks
+    WHERE project_id IS NOT NULL
+    GROUP BY project_id
+), new_files AS (
+    SELECT f.project_id, COUNT(*) AS files_this_week
+    FROM FileVersions v JOIN Files f ON f.id = v.file_id
+    WHERE v.version = 1 AND v.uploaded_at >= :week_start AND f.project_id IS NOT NULL
+    GROUP BY f.project_id
+)
+SELECT p.id AS project_id, p.name, p.end_date,
+       COALESCE(t.tasks, 0) AS tasks,
+       COALESCE(t.completed, 0) AS completed,
+       COALESCE(t.overdue, 0) AS overdue,
+       COALESCE(b.total, 0) AS spent,
+       p.planned_budget AS planned,
+       COALESCE(n.files_this_week, 0) AS files_this_week,
+       ROUND(CAST(t.completed AS REAL) / t.tasks, 3) AS completion,
+       ROUND(COALESCE(b.total, 0) / p.planned_budget, 3) AS budget_used
+FROM Projects p
+LEFT JOIN task_stats t ON t.project_id = p.id
+LEFT JOIN BudgetTotals b ON b.project_id = p.id
+LEFT JOIN new_files n ON n.project_id = p.id
+ORDER BY p.id
+"""
+
+
+def compute(today=None):
+    """Status rows for every project as of `today`."""
+    today = today or date.today()
+    return execute_query(_STATUS_QUERY, {'today': today.isoformat(),
+                                         'week_start': (today - timedelta(days=6)).isoformat()})
+
+
+def _stamp(today):
+    change_tracker.sync(read_cache)
+    versions = change_tracker.versions()
+    return (pool.path, today, tuple(versions.get(table) for table in SOURCE_TABLES))
+
+
+_report = None
+_lock = threading.Lock()
+_refresher = None
+
+
+def refresh(today=None):
+    """Recompute the report now and cache it."""
+    global _report
+    today = today or date.today()
+    # Stamp first: a write landing during the query leaves the stamp behind
+    # the data, which only costs one extra refresh
+    stamp = _stamp(today)
+    started = time.perf_counter()
+    report = StatusReport(stamp, datetime.now(), compute(today))
+    with _lock:
+        _report = report
+    logger.info("Status report for %d projects computed in %.3fs", len(report.rows), time.perf_counter() - started)
+    return report
+
+
+def project_status(today=None, allow_stale=True):
+    """Return the current StatusReport.
+
+    When the data changed since the cached report was computed, the stale
+    report is returned with `allow_stale` and the background thread
+    brings it up to date; otherwise it is recomputed here. A report from
+    another day or another database is never returned.
+    """
+    today = today or date.today()
+    _start_refresher()
+    stamp = _stamp(today)
+    with _lock:
+        report = _report
+    if report is not None and (report.stamp == stamp or (allow_stale and report.stamp[:2] == stamp[:2])):
+        return report
+    return refresh(today)
+
+
+def is_current(report):
+    return report.stamp == _stamp(report.stamp[1])
+
+
+def _refresh_loop():
+    while True:
+        time.sleep(POLL_SECONDS)
+        try:
+            with _lock:
+                report = _report
+            if report is not None and not is_current(report):
+                refresh()
+        except Exception:
+            logger.exception("Background status report refresh failed")
+
+
+def _start_refresher():
+    global _refresher
+    with _lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=_refresh_loop, name='status-reports', daemon=True)
+            _refresher.start()
+
+
+def summary(report):
+    """The report as text, for saving as a Report row."""
+    lines = []
+    for row in report.rows:
+        completion = f"{row['completion']:.0%}" if row['completion'] is not None else "no tasks"
+        budget = f"{row['spent']:,.2f} of {row['planned']:,.2f}" if row['planned'] else f"{row['spent']:,.2f} (no plan)"
+        lines.append(f"{row['name']}: {row['completed']}/{row['tasks']} tasks done ({completion}), "
+                     f"{row['overdue']} overdue; spent {budget}; {row['files_this_week']} new files this week")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    initialize_database()
+    print(summary(refresh()))
@@ -0,0 +1,101 @@
+import gzip
+import json
+import socket
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+import api
+from database import Budget, Project
+
+
+def get(target, **headers):
+    status, response_headers, body = api.respond('GET', target, {name.replace('_', '-'): value
+                                                                 for name, value in headers.items()})
+    if response_headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return status, response_headers, json.loads(body) if body else None
+
+
+def test_pages_follow_next_links(db):
+    Project.create_many([(f"Project {i}", None, "2024-01-01", "2024-02-01") for i in range(5)])
+
+    status, _, body = get("/api/projects?limit=2")
+    names = [row['name'] for row in body['items']]
+    while body['next']:
+        _, _, body = get(body['next'])
+        names += [row['name'] for row in body['items']]
+
+    assert status == 200
+    assert names == [f"Project {i}" for i in range(5)]
+    assert get("/api/projects/3")[2]['name'] == "Project 2"
+    assert get("/api/projects/99")[0] == 404
+    assert get("/api/projects?limit=x")[0] == 400
+    assert get("/api/projects?colour=red")[0] == 400
+    assert get("/api/users")[0] == 404
+    assert get("/api/messages")[0] == 404
+
+
+def test_conditional_requests_get_304_until_the_table_changes(db):
+    Budget.create(1, 100.0, "2024-01-01")
+    status, headers, _ = get("/api/budgets")
+    etag, modified = headers['ETag'], headers['Last-Modified']
+
+    assert get("/api/budgets", if_none_match=etag)[0] == 304
+    assert get("/api/budgets/1", if_none_match=etag)[0] == 304
+    assert get("/api/budgets", if_modified_since=modified)[0] == 304
+
+    Budget.create(1, 50.0, "2024-01-02")
+    status, headers, body = get("/api/budgets", if_none_match=etag)
+    assert status == 200
+    assert headers['ETag'] != etag
+    assert len(body['items']) == 2
+
+
+def test_large_bodies_are_gzipped_when_accepted(db):
+    Project.create_many([(f"Project {i}", "x" * 100, "2024-01-01", "2024-02-01") for i in range(20)])
+    plain = api.respond('GET', "/api/projects", {})
+    zipped = api.respond('GET', "/api/projects", {'accept-encoding': 'gzip, deflate'})
+    assert 'Content-Encoding' not in plain[1]
+    assert zipped[1]['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped[2]) == plain[2]
+
+
+def test_server_answers_over_http(db, monkeypatch):
+    monkeypatch.setenv('API_TOKEN', 'secret')
+    Project.create("Harbour Bridge", "Deck repairs", "2024-01-01", "2024-12-31")
+    server = api.Server(port=0, workers=2)
+    port = server.start()
+    try:
+        url = f"http://127.0.0.1:{port}/api/projects"
+        try:
+            urllib.request.urlopen(url)
+            raise AssertionError("expected 401")
+        except urllib.error.HTTPError as e:
+            assert e.code == 401
+        request = urllib.request.Request(url, headers={'Authorization': 'Bearer secret'})
+        with urllib.request.urlopen(request) as response:
+            assert json.load(response)['items'][0]['name'] == "Harbour Bridge"
+    finally:
+        server.stop()
+
+
+def test_malformed_requests_get_400(db):
+    server = api.Server(port=0, workers=2)
+    port = server.start()
+    try:
+        for head in (b"Content-Length: ten", b"Content-Length: -1", b"X-Long: " + b"x" * 70000):
+            with socket.create_connection(('127.0.0.1', port), timeout=5) as conn:
+                conn.sendall(b"GET /api HTTP/1.1\r\n" + head + b"\r\n\r\n")
+                assert conn.recv(64).startswith(b"HTTP/1.1 400 ")
+    finally:
+        server.stop()
+
+
+def test_refuses_other_hosts_without_a_token(monkeypatch):
+    monkeypatch.delenv('API_TOKEN', raising=False)
+    monkeypatch.setattr(sys, 'argv', ['api.py', '--host', '0.0.0.0'])
+    with pytest.raises(SystemExit):
+        api.main()
@@ -0,0 +1,96 @@
+import sqlite3
+from datetime import date
+
+import archive
+import database
+import rollups
+import scheduling
+from database import Budget, Notification, Project, Task, execute_query
+
+TODAY = date(2025, 1, 1)
+
+
+def test_old_notifications_move_in_batches_and_stay_queryable(db):
+    for day in ("2024-01-01", "2024-02-01", "2024-03-01", "2024-12-01"):
+        Notification.create(f"Site notice {day}", day)
+
+    result, = archive.run(['notifications'], today=TODAY, batch_size=2)
+
+    assert (result.policy, result.rows) == ('notifications', 3)
+    assert [n['date'] for n in Notification.get_all()] == [date(2024, 12, 1)]
+    assert [n['date'] for n in archive.archived('Notifications')] == \
+        [date(2024, 3, 1), date(2024, 2, 1), date(2024, 1, 1)]
+    assert archive.query("SELECT COUNT(*) AS n FROM archive.Notifications WHERE message LIKE ?",
+                         ("%2024-02%",))[0]['n'] == 1
+    assert archive.run(['notifications'], today=TODAY)[0].rows == 0
+
+
+def test_finished_projects_leave_with_their_tasks_and_budgets(db):
+    Project.create_many([("Finished", "", "2023-01-01", "2023-06-01"),
+                         ("Loose ends", "", "2023-01-01", "2023-06-01"),
+                         ("Current", "", "2024-06-01", "2025-06-01")])
+    Task.create_many([("Pour", "2023-01-02", "2023-01-05", "", 1),
+                      ("Snag list", "2023-05-01", "2023-05-20", "", 2)])
+    Task.set_completed(1, date(2023, 1, 5))
+    Budget.create_many([(1, 100.0, "2023-02-01"), (2, 50.0, "2023-02-01"), (3, 10.0, "2024-07-01")])
+
+    result, = archive.run(['projects'], today=TODAY)
+
+    assert (result.rows, result.dependents) == (1, 2)
+    assert [p['name'] for p in Project.get_all()] == ["Loose ends", "Current"]
+    assert execute_query("SELECT COUNT(*) AS n FROM Tasks WHERE project_id = 1", fetchone=True)['n'] == 0
+    assert [row['amount'] for row in archive.archived('Budgets', "project_id = ?", (1,))] == [100.0]
+    assert rollups.check() == []
+    assert {row['project_id'] for row in rollups.project_totals()} == {2, 3}
+
+
+def test_projects_wait_for_dependents_in_other_projects(db):
+    Project.create_many([("Foundations", "", "2023-01-01", "2023-06-01"),
+                         ("Tower", "", "2023-01-01", "2023-06-01")])
+    Task.create_many([("Pour", "2023-01-02", "2023-01-05", "", 1),
+                      ("Frame", "2023-02-01", "2023-03-01", "1", 2),
+                      ("Fit out", "2023-03-02", "2023-04-01", "", 2)])
+    Task.set_completed(1, date(2023, 1, 5))
+    Task.set_completed(2, date(2023, 3, 1))
+
+    assert archive.run(['projects'], today=TODAY)[0].rows == 0
+    Task.update(2, "Frame", "2023-02-01", "2023-03-01", "")
+    result, = archive.run(['projects'], today=TODAY)
+
+    assert result.rows == 1
+    assert [p['name'] for p in Project.get_all()] == ["Tower"]
+    assert execute_query("SELECT COUNT(*) AS n FROM TaskDependencies", fetchone=True)['n'] == 0
+    assert scheduling.get_schedule().task_ids.tolist() == [2, 3]
+
+
+def test_new_databases_vacuum_incrementally(db):
+    Notification.create_many([("x" * 500, "2020-01-01")] * 200)
+    archive.run(['notifications'], today=TODAY)
+
+    report = archive.status(today=TODAY)
+    assert report['incremental_vacuum'] and report['free_pages'] > 0
+    assert archive.reclaim(pages=8) == report['free_pages']
+    assert archive.status(today=TODAY)['free_pages'] == 0
+
+
+def test_other_writers_wait_while_a_batch_moves(db, monkeypatch):
+    Project.create("Finished", "", "2023-01-01", "2023-06-01")
+    original, blocked = archive._copy, []
+
+    def copy_while_another_session_writes(conn, table, columns, where):
+        # Giving the project an open task now would make it ineligible; the
+        # write has to wait until the batch has been copied and deleted
+        other = sqlite3.connect(database.pool.path, timeout=0)
+        try:
+            other.execute("INSERT INTO Tasks (name, start_date, end_date, project_id) "
+                          "VALUES ('Late snag', '2023-05-01', '2023-05-02', 1)")
+        except sqlite3.OperationalError as e:
+            blocked.append(str(e))
+        finally:
+            other.close()
+        return original(conn, table, columns, where)
+
+    monkeypatch.setattr(archive, '_copy', copy_while_another_session_writes)
+    assert archive.run(['projects'], today=TODAY)[0].rows == 1
+    assert blocked and all("locked" in message for message in blocked)
+    assert Project.get_all() == []
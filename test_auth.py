@@ -0,0 +1,37 @@
+import hashlib
+
+import pytest
+
+import auth
+from database import User
+from passwords import HasherBusy, PasswordHasher
+
+
+def test_register_and_login(db):
+    assert auth.register("alice", "s3cret")
+    assert not auth.register("alice", "other")
+    assert User.get_by_username("alice")['password'].startswith("$2")
+    assert auth.login("alice", "s3cret")['username'] == "alice"
+    assert auth.login("alice", "wrong") is None
+    assert auth.login("nobody", "s3cret") is None
+
+
+def test_legacy_hash_is_upgraded_on_login(db):
+    User.create("bob", hashlib.sha256(b"hunter2").hexdigest())
+    assert auth.login("bob", "wrong") is None
+    assert auth.login("bob", "hunter2") is not None
+    upgraded = User.get_by_username("bob")['password']
+    assert upgraded.startswith("$2")
+    assert auth.login("bob", "hunter2") is not None
+
+
+def test_pool_applies_backpressure():
+    hasher = PasswordHasher(workers=1, max_pending=1, rounds=4, timeout=0.01)
+    hasher._slots.acquire()  # stand in for a hash that is still running
+    try:
+        with pytest.raises(HasherBusy):
+            hasher.hash("x")
+    finally:
+        hasher._slots.release()
+    assert hasher.verify("x", hasher.hash("x")) == (True, False)
+    hasher.shutdown()
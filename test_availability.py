@@ -0,0 +1,80 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+import database
+from availability import IntervalTree, index
+from database import Resource, ResourceInterval
+
+
+def test_interval_tree_overlap_and_cover():
+    tree = IntervalTree()
+    tree.insert(date(2024, 3, 1), date(2024, 3, 10), 1)
+    tree.insert(date(2024, 3, 11), date(2024, 3, 20), 2)
+    tree.insert(date(2024, 4, 1), date(2024, 4, 5), 3)
+    assert [key for _, _, key, _ in tree.overlapping(date(2024, 3, 10), date(2024, 3, 11))] == [1, 2]
+    assert tree.covers(date(2024, 3, 3), date(2024, 3, 17))
+    assert not tree.covers(date(2024, 3, 15), date(2024, 4, 2))
+    assert tree.remove(date(2024, 3, 11), date(2024, 3, 20), 2)
+    assert not tree.covers(date(2024, 3, 3), date(2024, 3, 17))
+    assert len(tree) == 2
+
+
+def test_free_resources_and_conflicts(db):
+    crane = Resource.create("Crane A", "crane", "2024-03-01 to 2024-03-31")
+    other = Resource.create("Crane B", "crane", "2024-03-01 to 2024-03-10")
+    Resource.create("Mixer", "mixer", "always")
+    assert [r['name'] for r in index.free_resources(date(2024, 3, 3), date(2024, 3, 17), type="crane")] == ["Crane A"]
+
+    ResourceInterval.create(crane, 'booking', date(2024, 3, 5), date(2024, 3, 8), project_id=1)
+    assert index.free_resources(date(2024, 3, 3), date(2024, 3, 17), type="crane") == []
+    assert index.conflicts() == []
+
+    ResourceInterval.create(crane, 'booking', date(2024, 3, 7), date(2024, 3, 9), project_id=2)
+    ResourceInterval.create(other, 'booking', date(2024, 3, 9), date(2024, 3, 12), project_id=2)
+    kinds = sorted((c['kind'], c['resource_id']) for c in index.conflicts())
+    assert kinds == [('double_booking', crane), ('unavailable', other)]
+
+    Resource.update(other, "Crane B", "crane", "2024-03-01 to 2024-03-20")
+    assert [c['resource_id'] for c in index.conflicts()] == [crane]
+
+
+def test_index_catches_writes_from_other_connections(db):
+    crane = Resource.create("Crane A", "crane", "2024-03-01 to 2024-03-31")
+    assert index.is_free(crane, date(2024, 3, 5), date(2024, 3, 6))
+    other = sqlite3.connect(database.pool.path)
+    other.execute("""INSERT INTO ResourceIntervals (resource_id, kind, start_date, end_date)
+                     VALUES (?, 'booking', '2024-03-06', '2024-03-07')""", (crane,))
+    other.commit()
+    other.close()
+    assert not index.is_free(crane, date(2024, 3, 5), date(2024, 3, 6))
+
+
+def test_bookings_check_and_insert_under_one_write_lock(db, monkeypatch):
+    crane = Resource.create("Crane A", "crane", "2024-03-01 to 2024-03-10; 2024-03-11 to 2024-03-31")
+    assert ResourceInterval.book(crane, 1, date(2024, 3, 8), date(2024, 3, 12))['kind'] == 'booking'
+    with pytest.raises(ValueError, match="already booked"):
+        ResourceInterval.book(crane, 2, date(2024, 3, 12), date(2024, 3, 14))
+    with pytest.raises(ValueError, match="not available on 2024-04-01"):
+        ResourceInterval.book(crane, 2, date(2024, 3, 30), date(2024, 4, 2))
+
+    # Another connection trying to book between the check and the insert has to wait
+    execute_query, blocked = database.execute_query, []
+
+    def interfere(query, params=(), fetchone=False):
+        if "kind = 'available'" in query:
+            other = sqlite3.connect(database.pool.path, timeout=0)
+            try:
+                other.execute("""INSERT INTO ResourceIntervals (resource_id, kind, start_date, end_date)
+                                 VALUES (?, 'booking', '2024-03-20', '2024-03-22')""", (crane,))
+            except sqlite3.OperationalError as e:
+                blocked.append(str(e))
+            finally:
+                other.close()
+        return execute_query(query, params, fetchone)
+
+    monkeypatch.setattr(database, 'execute_query', interfere)
+    ResourceInterval.book(crane, 3, date(2024, 3, 20), date(2024, 3, 22))
+    assert blocked and "locked" in blocked[0]
+    assert index.conflicts() == []
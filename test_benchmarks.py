@@ -0,0 +1,38 @@
+import sqlite3
+
+import rollups
+from benchmarks import datagen
+from benchmarks.run import compare
+from benchmarks.timing import measure
+
+
+def _table_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {table: conn.execute(f"SELECT * FROM {table} ORDER BY id").fetchall()
+                for table in ('Projects', 'Tasks', 'Budgets', 'Messages', 'ResourceIntervals')}
+    finally:
+        conn.close()
+
+
+def test_datagen_is_deterministic_and_keeps_rollups_consistent(db, tmp_path):
+    first, second = str(tmp_path / 'a.db'), str(tmp_path / 'b.db')
+    counts = datagen.generate(first, scale=300, seed=7)
+    datagen.generate(second, scale=300, seed=7)
+
+    assert _table_rows(first) == _table_rows(second)
+    assert len(_table_rows(first)['Tasks']) == counts['Tasks'] == 300
+
+    assert rollups.check() == []
+
+
+def test_measure_and_compare():
+    result = measure(lambda: None, iterations=20, warmup=0)
+    assert result['count'] == 20
+    assert result['p50_ms'] <= result['p99_ms'] <= result['max_ms']
+
+    previous = {'results': {'a': {'p50_ms': 1.0}, 'b': {'p50_ms': 1.0}}}
+    current = {'results': {'a': {'p50_ms': 1.1}, 'b': {'p50_ms': 2.0}, 'new': {'p50_ms': 5.0}}}
+    rows, regressions = compare(previous, current, threshold=0.2)
+    assert [row[0] for row in rows] == ['a', 'b']
+    assert [row[0] for row in regressions] == ['b']
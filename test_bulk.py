@@ -0,0 +1,111 @@
+import io
+import json
+from datetime import date
+
+import pytest
+
+import bulk
+from database import Budget, Project, Task
+
+
+def write_csv(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def test_csv_import_maps_columns_and_rejects_bad_rows(db, tmp_path):
+    Project.create("Harbour Bridge", "Deck repairs", "2024-01-01", "2024-12-31")
+    source = write_csv(tmp_path / "budgets.csv", [
+        "Project ID,Cost,Date",
+        "1,1200.50,2024-02-01",
+        "1,-5,2024-02-02",
+        ",10,2024-02-03",
+        "1,abc,2024-02-04",
+        "1,300,2024-02-05T09:30:00",
+    ])
+
+    job = bulk.import_rows("budgets", source, mapping={"Cost": "amount"}, chunk_size=2)
+
+    assert (job['status'], job['rows_done'], job['rows_loaded'], job['rows_rejected']) == ("done", 5, 2, 3)
+    assert [error['line'] for error in json.loads(job['errors'])] == [2, 3, 4]
+    assert [(row['amount'], row['date']) for row in Budget.get_all()] == [(1200.5, date(2024, 2, 1)),
+                                                                           (300.0, date(2024, 2, 5))]
+
+
+def test_rows_the_database_rejects_are_skipped_without_losing_the_chunk(db, tmp_path):
+    Project.create("Harbour Bridge", "Deck repairs", "2024-01-01", "2024-12-31")
+    source = write_csv(tmp_path / "tasks.csv", [
+        "name,start_date,end_date,project_id",
+        "Survey,2024-01-01,2024-01-05,1",
+        "Pour,2024-01-06,2024-01-09,99",
+        "Cure,2024-01-10,2024-01-20,1",
+    ])
+
+    job = bulk.import_rows("tasks", source)
+
+    assert (job['rows_loaded'], job['rows_rejected']) == (2, 1)
+    assert json.loads(job['errors'])[0]['line'] == 2
+    assert [task['name'] for task in Task.get_all()] == ["Survey", "Cure"]
+
+
+def test_missing_required_column_is_reported(db, tmp_path):
+    source = write_csv(tmp_path / "tasks.csv", ["name,start_date", "Pour,2024-01-01"])
+    with pytest.raises(ValueError, match="end_date"):
+        bulk.import_rows("tasks", source)
+
+
+def test_failed_import_resumes_after_last_committed_chunk(db, tmp_path, monkeypatch):
+    source = write_csv(tmp_path / "tasks.csv", ["Name,Start Date,End Date"] +
+                       [f"Task {i},2024-01-01,2024-01-02" for i in range(10)])
+    create_many = Task.create_many
+    calls = []
+
+    def flaky(rows):
+        calls.append(rows)
+        if len(calls) == 3:
+            raise OSError("disk full")
+        return create_many(rows)
+
+    monkeypatch.setattr(Task, 'create_many', staticmethod(flaky))
+    with pytest.raises(OSError):
+        bulk.import_rows("tasks", source, chunk_size=3)
+    assert bulk.jobs()[0]['status'] == "failed"
+    assert bulk.pending_job("tasks", source)['rows_done'] == 6
+
+    monkeypatch.setattr(Task, 'create_many', staticmethod(create_many))
+    job = bulk.import_rows("tasks", source, chunk_size=3)
+    assert (job['status'], job['rows_loaded']) == ("done", 10)
+    assert [task['name'] for task in Task.get_all()] == [f"Task {i}" for i in range(10)]
+    assert bulk.pending_job("tasks", source) is None
+
+
+def test_uploads_are_fingerprinted_by_content():
+    first, second = io.BytesIO(b"Name\nPour\n"), io.BytesIO(b"Name\nTile\n")
+    first.name = second.name = "tasks.csv"
+    first.read(4)
+
+    assert bulk.source_fingerprint(first) != bulk.source_fingerprint(second)
+    # Hashing leaves the upload where the import will start reading it
+    assert first.tell() == 4
+
+
+def test_parquet_round_trip(db, tmp_path):
+    pytest.importorskip("pyarrow")
+    Project.create_many([(f"Project {i}", None, "2024-01-01", "2024-06-30") for i in range(7)])
+    path = tmp_path / "projects.parquet"
+
+    assert bulk.export_rows("projects", path, chunk_size=3) == 7
+    exported = [row for chunk in bulk.export_chunks("projects") for row in chunk]
+
+    job = bulk.import_rows("projects", path, chunk_size=3)
+    assert job['rows_loaded'] == 7
+    assert [row['name'] for row in Project.get_all()][7:] == [row[1] for row in exported]
+
+
+def test_csv_export_streams_every_row(db, tmp_path):
+    Budget.create_many([(1, float(i), "2024-03-01") for i in range(12)])
+    path = tmp_path / "budgets.csv"
+    assert bulk.export_rows("budgets", path, chunk_size=5) == 12
+    lines = path.read_text().splitlines()
+    assert lines[0] == "id,project_id,amount,date"
+    assert lines[-1] == "12,1,11.0,2024-03-01"
@@ -0,0 +1,31 @@
+from database import Conversation, Message
+
+
+def test_messages_are_threaded_by_participant_pair(db):
+    Message.create("ann", "bob", "Rebar arrives Tuesday", "2024-03-01")
+    Message.create("bob", "ann", "Thanks, crane booked", "2024-03-01")
+    Message.create("ann", "bob", "Pour moved to Wednesday", "2024-03-02")
+    Message.create("carl", "ann", "Invoice attached", "2024-03-03")
+
+    threads = Conversation.page("ann")
+    assert [thread['other_user'] for thread in threads] == ["carl", "bob"]
+    assert Conversation.unread_count("ann") == 1
+    assert Conversation.unread_count("bob") == 1
+
+    bob_thread = Conversation.between("bob", "ann")['id']
+    history = Conversation.messages(bob_thread, limit=2)
+    assert [message['content'] for message in history] == ["Pour moved to Wednesday", "Thanks, crane booked"]
+    older = Conversation.messages(bob_thread, after_id=history[-1]['id'], limit=2)
+    assert [message['content'] for message in older] == ["Rebar arrives Tuesday"]
+
+    Conversation.mark_read("bob", bob_thread)
+    assert Conversation.unread_count("bob") == 0
+
+    # Replying marks the conversation read for the sender
+    assert Conversation.unread_count("ann") == 1
+    Message.create("ann", "carl", "Received", "2024-03-04")
+    assert Conversation.unread_count("ann") == 0
+    assert Conversation.page("ann", after_id=Conversation.page("ann", limit=1)[0]['last_message_id'])[0]['other_user'] == "bob"
+
+    Message.delete(Conversation.messages(Conversation.between("ann", "carl")['id'])[0]['id'])
+    assert Conversation.unread_count("carl") == 0
@@ -0,0 +1,34 @@
+from datetime import date
+
+import numpy as np
+
+import gantt
+from database import Task
+
+
+def test_lanes_merge_consecutive_tasks():
+    rows = [{'name': f"Task {i}", 'start_date': f"2024-01-{i + 1:02d}", 'end_date': f"2024-01-{i + 3:02d}",
+             'completed_at': "2024-02-01" if i < 2 else None} for i in range(6)]
+    timeline = gantt.Timeline(rows)
+    start, end, done = gantt.lanes(timeline, 3)
+
+    assert list(end - start) == [4, 4, 4]
+    assert start[0] == np.datetime64("2024-01-01").astype(np.int64)
+    assert list(done) == [1.0, 0.0, 0.0]
+
+
+def test_charts_are_cached_until_the_tasks_change(db):
+    Task.create_many([(f"Task {i}", "2024-01-01", "2024-01-10", "", None) for i in range(3)])
+    today = date(2024, 1, 5)
+
+    first = gantt.chart(width=400, height=200, today=today).result()
+    assert first.startswith(b"\x89PNG")
+    again = gantt.chart(width=400, height=200, today=today)
+    assert again.done() and again.result() is first
+
+    Task.set_completed(1, "2024-01-04")
+    assert gantt.chart(width=400, height=200, today=today).result() != first
+
+    # Far more tasks than pixel rows still draw, as lanes
+    Task.create_many([(f"Bulk {i}", "2024-02-01", "2024-02-03", "", None) for i in range(500)])
+    assert gantt.chart(width=400, height=100, today=today).result().startswith(b"\x89PNG")
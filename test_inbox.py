@@ -0,0 +1,39 @@
+from database import Inbox, Notification, User
+
+
+def test_notifications_fan_out_to_inboxes_with_unread_counts(db):
+    User.create("ann", "x")
+    User.create("bob", "x")
+    Notification.create("Site closed Friday", "2024-03-01")
+    Notification.create("Your permit was approved", "2024-03-02", "ann")
+
+    assert [row['message'] for row in Inbox.since("ann")] == ["Site closed Friday", "Your permit was approved"]
+    assert [row['message'] for row in Inbox.since("bob")] == ["Site closed Friday"]
+    assert Inbox.status("ann")['unread'] == 2
+
+    newest = Inbox.since("ann")[-1]['id']
+    Inbox.mark_read("ann", newest)
+    assert Inbox.status("ann") == {'last_read_id': newest, 'unread': 0}
+    assert Inbox.since("ann", newest) == []
+
+    Notification.create("Crane inspection at 9", "2024-03-03")
+    assert [row['message'] for row in Inbox.since("ann", newest)] == ["Crane inspection at 9"]
+    assert Inbox.status("ann")['unread'] == 1
+    assert Inbox.status("bob")['unread'] == 2
+
+    # The cursor never moves backwards
+    Inbox.mark_read("ann", 0)
+    assert Inbox.status("ann")['last_read_id'] == newest
+
+    Notification.delete(Inbox.since("bob")[0]['id'])
+    assert Inbox.status("bob")['unread'] == 1
+    assert [row['message'] for row in Inbox.before("bob")] == ["Crane inspection at 9"]
+
+
+def test_bulk_notifications_take_an_optional_recipient(db):
+    User.create("ann", "x")
+    User.create("bob", "x")
+    assert Notification.create_many([("All hands at 8", "2024-03-01"), ("Your permit was approved", "2024-03-02", "ann")]) == 2
+
+    assert [row['message'] for row in Inbox.since("ann")] == ["All hands at 8", "Your permit was approved"]
+    assert [row['message'] for row in Inbox.since("bob")] == ["All hands at 8"]
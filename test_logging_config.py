@@ -0,0 +1,39 @@
+import json
+import logging
+
+from logging_config import JsonFormatter, NonBlockingQueueHandler, SamplingFilter
+
+
+def make_record(name="database", level=logging.INFO, msg="Project '%s' created", args=("Tower",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extras():
+    entry = json.loads(JsonFormatter().format(make_record(duration_ms=3.5)))
+    assert entry['msg'] == "Project 'Tower' created"
+    assert entry['logger'] == "database"
+    assert entry['level'] == "INFO"
+    assert entry['duration_ms'] == 3.5
+
+
+def test_sampling_never_drops_warnings():
+    sampler = SamplingFilter({'database': 0.0})
+    assert not sampler.filter(make_record(name="database.slow"))
+    assert sampler.filter(make_record(level=logging.WARNING))
+    assert sampler.filter(make_record(name="auth"))
+    assert sampler.dropped == 1
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    import queue
+
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    record = make_record()
+    handler.handle(record)
+    handler.handle(make_record())
+    assert handler.dropped == 1
+    # Records are queued unformatted; the listener thread formats them
+    assert handler.queue.get_nowait() is record
+    assert record.args == ("Tower",)
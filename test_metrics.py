@@ -0,0 +1,41 @@
+from metrics import LatencyHistogram, QueryMetrics, normalize
+
+
+def test_normalize_strips_literals():
+    assert normalize("SELECT *  FROM Projects\n WHERE id = 42 AND name = 'it''s'") == \
+        "SELECT * FROM Projects WHERE id = ? AND name = ?"
+    assert normalize("DELETE FROM Tasks WHERE id IN (1, 2, 3)") == "DELETE FROM Tasks WHERE id IN (?, ...)"
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for _ in range(99):
+        histogram.add(0.001)
+    histogram.add(0.5)
+    assert histogram.percentile(0.5) <= 0.00128
+    assert histogram.percentile(0.99) <= 0.00128
+    assert histogram.percentile(1.0) == 0.5
+
+
+def test_slow_queries_are_kept():
+    metrics = QueryMetrics(slow_threshold=0.1)
+    metrics.record("SELECT * FROM Tasks WHERE id = 1", 0.01, rows=1)
+    metrics.record("SELECT * FROM Tasks WHERE id = 2", 0.2, rows=1, lock_wait_seconds=0.15)
+    snapshot = metrics.snapshot()
+    assert snapshot['statements'][0]['count'] == 2
+    assert snapshot['statements'][0]['rows'] == 2
+    assert [entry['duration_ms'] for entry in snapshot['slow_queries']] == [200.0]
+
+
+def test_model_calls_are_recorded(db):
+    import database
+    from database import Project
+
+    database.query_metrics.reset()
+    Project.create("Tower", "", "2024-01-01", "2024-02-01")
+    Project.get_all()
+    statements = {entry['statement']: entry for entry in database.performance_snapshot()['statements']}
+    assert statements["SELECT * FROM Projects"]['rows'] == 1
+    insert = next(entry for name, entry in statements.items() if name.startswith("INSERT INTO Projects"))
+    # The writer thread commits separately from the statements it batches
+    assert insert['count'] == 1 and statements["COMMIT"]['commit_ms'] > 0
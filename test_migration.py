@@ -0,0 +1,133 @@
+import sqlite3
+
+import pytest
+
+import database
+import migration
+from database import Budget, Project, Task
+
+LEGACY_SCHEMA = """
+CREATE TABLE Projects (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, description TEXT,
+                       start_date DATE, end_date DATE);
+CREATE TABLE Files (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, path TEXT NOT NULL);
+CREATE TABLE Notifications (id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT NOT NULL, date DATE NOT NULL);
+CREATE TABLE Tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, start_date DATE NOT NULL,
+                    end_date DATE NOT NULL, dependencies TEXT);
+CREATE TABLE Budgets (id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, amount REAL NOT NULL,
+                      date DATE NOT NULL);
+CREATE TABLE Messages (id INTEGER PRIMARY KEY AUTOINCREMENT, from_user TEXT NOT NULL, to_user TEXT NOT NULL,
+                       content TEXT NOT NULL, date DATE NOT NULL);
+CREATE TABLE Reports (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, content TEXT NOT NULL,
+                      date DATE NOT NULL);
+CREATE TABLE Users (username TEXT PRIMARY KEY, password TEXT NOT NULL, role TEXT NOT NULL, reset_token TEXT);
+CREATE TABLE Audit (entry TEXT);
+CREATE INDEX idx_users_username ON Users (username);
+CREATE TRIGGER trg_budgets_audit AFTER INSERT ON Budgets BEGIN INSERT INTO Audit VALUES (NEW.id); END;
+"""
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO Projects (name, start_date, end_date) VALUES ('Depot', '2024-01-01', '2024-06-01')")
+    conn.executemany("INSERT INTO Budgets (project_id, amount, date) VALUES (1, ?, '2024-02-01')",
+                     [(float(i),) for i in range(1, 26)])
+    conn.execute("DELETE FROM Budgets WHERE id = 25")
+    conn.execute("INSERT INTO Users VALUES ('ann', 'x', 'admin', NULL)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_migrates_legacy_database_in_batches(legacy):
+    assert migration.migrate(legacy, batch_size=4) == migration.latest_version()
+
+    conn = sqlite3.connect(legacy)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == migration.latest_version()
+    assert conn.execute("SELECT COUNT(*), SUM(amount) FROM Budgets").fetchone() == (24, 300.0)
+    assert 'project_id' in [row[1] for row in conn.execute("PRAGMA table_info(Tasks)")]
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_budgets_project_date', 'idx_messages_to_user_date', 'idx_messages_from_user_date'} <= indexes
+    assert 'idx_users_username' not in indexes
+    # Triggers survive the rebuild, and deleted IDs are not handed out again
+    conn.execute("INSERT INTO Budgets (project_id, amount, date) VALUES (1, 5, '2024-03-01')")
+    assert conn.execute("SELECT MAX(id) FROM Budgets").fetchone()[0] == 26
+    assert conn.execute("SELECT COUNT(*) FROM Audit").fetchone()[0] == 26
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO Budgets (project_id, amount, date) VALUES (1, -5, '2024-03-01')")
+    conn.close()
+
+    # Running again is a no-op
+    assert migration.migrate(legacy) == migration.latest_version()
+
+
+def test_rows_written_during_copy_are_replayed(legacy, monkeypatch):
+    writer = sqlite3.connect(legacy, isolation_level=None)
+    writes = iter([
+        "UPDATE Budgets SET amount = 100 WHERE id = 1",
+        "DELETE FROM Budgets WHERE id = 10",
+        "INSERT INTO Budgets (project_id, amount, date) VALUES (1, 7, '2024-04-01')",
+    ])
+    monkeypatch.setattr(migration.time, 'sleep', lambda _: writer.execute(next(writes, "SELECT 1")))
+
+    migration.migrate(legacy, batch_size=5, pause=0.01)
+
+    conn = sqlite3.connect(legacy)
+    assert conn.execute("SELECT amount FROM Budgets WHERE id = 1").fetchone() == (100.0,)
+    assert conn.execute("SELECT COUNT(*) FROM Budgets WHERE id = 10").fetchone() == (0,)
+    assert conn.execute("SELECT amount FROM Budgets WHERE id = 26").fetchone() == (7.0,)
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '%dirty%' OR name LIKE '%_new'").fetchone() == (0,)
+    conn.close()
+    writer.close()
+
+
+def test_rows_that_break_new_constraints_stop_the_migration(legacy):
+    conn = sqlite3.connect(legacy)
+    conn.execute("INSERT INTO Budgets (project_id, amount, date) VALUES (1, -1, '2024-02-01')")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(migration.MigrationError, match="Budgets"):
+        migration.migrate(legacy)
+
+    conn = sqlite3.connect(legacy)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 4
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '%Budgets_new%'").fetchone() == (0,)
+    conn.close()
+
+
+def test_new_database_has_project_keys(db):
+    Project.create("Depot", "", "2024-01-01", "2024-06-01")
+    project_id = Project.get_all()[0]['id']
+    task_id = Task.create("Pour slab", "2024-01-02", "2024-01-05", "", project_id)
+    assert Task.page(filters={'project_id': project_id})[0]['id'] == task_id
+
+    Project.delete(project_id)
+    assert Task.get_by_id(task_id)['project_id'] is None
+    with pytest.raises(sqlite3.IntegrityError):
+        Budget.create(1, -10, "2024-01-01")
+    with pytest.raises(sqlite3.IntegrityError):
+        Task.create("Backwards", "2024-02-01", "2024-01-01", "")
+
+
+def test_current_schema_skips_ddl(db, monkeypatch):
+    database.initialize_database()  # already done for this database: returns at once
+    monkeypatch.setattr(database, '_initialized_path', None)
+    monkeypatch.setattr(database, '_create_schema', lambda: pytest.fail("schema is current"))
+    database.initialize_database()
+    assert type(database.User.get_by_username("admin")).__name__ == "User"
+
+
+def test_in_memory_database_is_shared_by_every_connection():
+    database.pool.reopen(':memory:')
+    try:
+        database.initialize_database()
+        Project.create("Depot", "", "2024-01-01", "2024-06-01")  # committed by the writer thread
+        assert [project['name'] for project in Project.get_all()] == ["Depot"]
+        conn = database.pool.connect()
+        assert migration.current_version(conn) == migration.latest_version()
+        conn.close()
+    finally:
+        database.pool.reopen(database.DATABASE_PATH)
@@ -0,0 +1,126 @@
+from datetime import date
+
+from database import ConflictError, File, Project, Task, User, transaction
+
+
+def test_update_returns_new_row(db):
+    Project.create("Bridge", "Steel bridge", "2024-01-01", "2024-06-30")
+    project = Project.page(limit=1)[0]
+    updated = Project.update(project['id'], "Bridge", "Concrete bridge", "2024-01-01", "2024-07-31")
+    assert updated['description'] == "Concrete bridge"
+    assert updated['end_date'] == date(2024, 7, 31)
+
+
+def test_update_missing_row_returns_none(db):
+    assert Project.update(12345, "x", "", None, None) is None
+
+
+def test_bulk_task_round_trip(db):
+    rows = [(f"Task {i}", "2024-01-01", "2024-01-05", "") for i in range(500)]
+    assert Task.create_many(rows) == 500
+    ids = [task['id'] for task in Task.get_all()]
+    assert Task.update_many([(ids[0], "First", "2024-01-02", "2024-01-03", "")]) == 1
+    assert Task.get_by_id(ids[0])['name'] == "First"
+    assert Task.delete_many(ids[1:]) == 499
+    assert len(Task.get_all()) == 1
+
+
+def test_bulk_files_take_an_optional_project(db):
+    Project.create("Depot", "", "2024-01-01", "2024-06-01")
+    assert File.create_many([("plan.pdf", "uploads/plan.pdf", 1), ("notes.txt", "uploads/notes.txt")]) == 2
+    assert [file['project_id'] for file in File.get_all()] == [1, None]
+
+
+def test_transaction_rolls_back(db):
+    try:
+        with transaction():
+            Project.create("Rolled back", "", "2024-01-01", "2024-01-01")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert Project.get_all() == []
+
+
+def test_batch_edits_check_row_versions(db):
+    Project.create_many([(f"Project {i}", None, "2024-01-01", "2024-02-01") for i in range(3)])
+    first, second, third = Project.get_all()
+    Project.update(second['id'], "Renamed elsewhere", None, "2024-01-01", "2024-02-01")
+
+    edits = {**first, 'name': "Edited"}
+    try:
+        Project.apply_changes([edits], [{'name': "New"}], [(second['id'], second['row_version'])])
+        raise AssertionError("expected ConflictError")
+    except ConflictError as e:
+        assert e.ids == [second['id']]
+    assert [p['name'] for p in Project.get_all()] == ["Project 0", "Renamed elsewhere", "Project 2"]
+
+    counts = Project.apply_changes([edits], [{'name': "New"}], [(third['id'], third['row_version'])])
+    assert counts == {'updated': 1, 'inserted': 1, 'deleted': 1}
+    rows = {p['name']: p['row_version'] for p in Project.get_all()}
+    assert rows == {"Edited": 2, "Renamed elsewhere": 2, "New": 1}
+
+
+def test_updates_return_the_new_row_version(db):
+    Project.create("Depot", "", "2024-01-01", "2024-06-01")
+    project = Project.get_all()[0]
+    assert Project.update(project['id'], "Depot", "Phase 2", "2024-01-01", "2024-06-01")['row_version'] == 2
+    assert Project.set_planned_budget(project['id'], 5000)['row_version'] == 3
+    assert Project.get_by_id(project['id'])['row_version'] == 3
+
+
+def test_keyset_pages_cover_every_row_once(db):
+    Project.create_many([(f"P{i}", "", f"2024-01-{i % 28 + 1:02d}", "2024-12-31") for i in range(60)])
+    seen, after = [], None
+    while True:
+        rows = Project.page(after_id=after, limit=25, order_by='-start_date')
+        if not rows:
+            break
+        seen.extend(row['id'] for row in rows)
+        after = rows[-1]['id']
+    assert sorted(seen) == list(range(1, 61))
+    assert [u['username'] for u in User.page()] == ['admin']
+
+
+def test_reads_are_cached_until_the_table_is_written(db):
+    import sqlite3
+    import database
+
+    Project.create("Cached", "", "2024-01-01", "2024-01-02")
+    first = Project.get_all()
+    hits = database.cache_stats()['hits']
+    assert Project.get_all() is first
+    assert database.cache_stats()['hits'] == hits + 1
+
+    Task.create("Unrelated", "2024-01-01", "2024-01-02", "")
+    assert Project.get_all() is first
+
+    # A write from a connection outside the pool, as another process would make
+    other = sqlite3.connect(database.pool.path)
+    other.execute("UPDATE Projects SET name = 'Renamed'")
+    other.commit()
+    other.close()
+    assert Project.get_all()[0]['name'] == "Renamed"
+
+
+def test_uploads_are_deduplicated_and_versioned(db, tmp_path, monkeypatch):
+    import io
+    import os
+
+    import file_store
+    from database import FileVersion
+
+    monkeypatch.setattr(file_store, 'UPLOAD_DIR', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(file_store, 'CHUNK_SIZE', 7)
+    first, created = file_store.save_upload(io.BytesIO(b"drawing rev A"), "plan.pdf", "admin", upload_key="u1")
+    assert created and first['version'] == 1
+    assert file_store.save_upload(io.BytesIO(b"ignored"), "plan.pdf", "admin", upload_key="u1") == (first, False)
+    assert file_store.save_upload(io.BytesIO(b"drawing rev A"), "plan.pdf", "admin", upload_key="u2")[1] is False
+
+    second, created = file_store.save_upload(io.BytesIO(b"drawing rev B"), "plan.pdf", "bob", upload_key="u3")
+    assert created and second['version'] == 2
+    file_store.save_upload(io.BytesIO(b"drawing rev A"), "copy.pdf", "bob")
+    assert len(os.listdir(tmp_path / 'uploads' / 'tmp')) == 0
+    blobs = [name for _, _, names in os.walk(tmp_path / 'uploads' / 'blobs') for name in names]
+    assert len(blobs) == 2
+    assert [v['version'] for v in FileVersion.for_file(first['file_id'])] == [2, 1]
+    assert [f['name'] for f in File.get_all()] == ["plan.pdf", "copy.pdf"]
@@ -0,0 +1,66 @@
+import pickle
+import sys
+from datetime import date, datetime
+
+import numpy as np
+
+from database import Project, Task, execute_query, fetch_columns
+from records import make_rows, record_class
+
+
+def test_rows_are_compact_mappings_with_parsed_dates(db):
+    Project.create("Bridge", "Steel bridge", date(2024, 1, 1), "2024-06-30")
+    project = Project.get_by_id(1)
+
+    assert type(project).__name__ == "Project"
+    Task.create("Survey", "2024-01-01", "2024-01-05", "")
+    Task.create("Pour", "2024-01-06", "2024-01-09", "Survey")
+    dependency = execute_query("SELECT * FROM TaskDependencies", fetchone=True)
+    assert repr(dependency) == "TaskDependency(task_id=2, depends_on=1)"
+    assert project['name'] == project.name == "Bridge"
+    assert (project['start_date'], project['end_date']) == (date(2024, 1, 1), date(2024, 6, 30))
+    assert project == {**project} == dict(project)
+    assert list(project) == ['id', 'name', 'description', 'start_date', 'end_date', 'planned_budget',
+                             'row_version']
+    assert project.get('missing') is None and 'name' in project
+    assert pickle.loads(pickle.dumps(project)) == project
+    assert sys.getsizeof(project) < sys.getsizeof(dict(project))
+
+    # Expressions without a usable name fall back to dicts
+    assert execute_query("SELECT COUNT(*) FROM Projects", fetchone=True) == {'COUNT(*)': 1}
+    assert isinstance(execute_query("SELECT MAX(start_date) AS latest FROM Projects", fetchone=True)['latest'], str)
+
+
+def test_record_classes_are_shared_per_column_list():
+    assert record_class(('a', 'b')) is record_class(['a', 'b'])
+    assert record_class(('a', 'a')) is None
+    assert record_class(('keys',)) is None
+    assert make_rows(['a', 'b'], [(1, 2)]) == [{'a': 1, 'b': 2}]
+
+
+def test_fetch_columns_returns_typed_arrays(db):
+    Project.create("Bridge", "Steel bridge", "2024-01-01", "2024-06-30")
+    Task.create_many([("Survey", "2024-01-01", "2024-01-05", "", 1),
+                      ("Pour", "2024-01-06", "2024-01-09", "", None)])
+    Task.set_completed(1, date(2024, 1, 4))
+
+    columns = fetch_columns("SELECT id, name, end_date, completed_at, project_id FROM Tasks ORDER BY id")
+    assert columns['id'].dtype == np.int64
+    assert columns['name'].dtype == object
+    assert (columns['end_date'] - columns['end_date'][0]).astype(int).tolist() == [0, 4]
+    assert np.isnat(columns['completed_at']).tolist() == [False, True]
+    assert columns['completed_at'][0] == np.datetime64('2024-01-04')
+    assert columns['project_id'][0] == 1 and np.isnan(columns['project_id'][1])
+
+    frame = fetch_columns("SELECT id, start_date, completed_at FROM Tasks", frame=True)
+    assert list(frame.columns) == ['id', 'start_date', 'completed_at']
+    assert len(fetch_columns("SELECT id FROM Tasks WHERE id > 10")['id']) == 0
+
+
+def test_timestamps_round_trip(db):
+    stamp = datetime(2024, 3, 1, 9, 30)
+    execute_query("""INSERT INTO ImportJobs (entity, source, fingerprint, status, started_at, updated_at)
+                     VALUES ('tasks', 'a.csv', 'x', 'done', ?, CURRENT_TIMESTAMP)""", (stamp,))
+    job = execute_query("SELECT started_at, updated_at FROM ImportJobs", fetchone=True)
+    assert job['started_at'] == stamp
+    assert isinstance(job['updated_at'], datetime)
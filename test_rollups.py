@@ -0,0 +1,38 @@
+import rollups
+from database import Budget, Project, execute_query
+
+
+def test_rollups_follow_budget_writes(db):
+    Budget.create_many([(1, 100.0, "2024-01-05"), (1, 50.0, "2024-01-20"), (1, 25.0, "2024-02-01"), (2, 10.0, "2024-01-01")])
+    assert [(r['project_id'], r['total'], r['entries']) for r in rollups.project_totals()] == [(1, 175.0, 3), (2, 10.0, 1)]
+    assert [(r['month'], r['spend'], r['running_balance']) for r in rollups.monthly_spend(1)] == [
+        ("2024-01", 150.0, 150.0), ("2024-02", 25.0, 175.0)]
+
+    budget_id = Budget.page(limit=1)[0]['id']
+    Budget.update(budget_id, 2, 100.0, "2024-03-01")
+    Budget.delete(Budget.page(limit=1, order_by='-id')[0]['id'])
+    assert [(r['project_id'], r['total']) for r in rollups.project_totals()] == [(1, 75.0), (2, 100.0)]
+    assert [r['month'] for r in rollups.monthly_spend(2)] == ["2024-03"]
+    assert rollups.check() == []
+
+
+def test_rebuild_repairs_drift(db):
+    Budget.create(1, 100.0, "2024-01-05")
+    execute_query("UPDATE BudgetTotals SET total = 0")
+    assert rollups.check() == [1]
+    assert rollups.project_totals()[0]['total'] == 0
+    version = "SELECT version FROM TableVersions WHERE table_name = 'Budgets'"
+    before = execute_query(version, fetchone=True)['version']
+    rollups.rebuild()
+    # Other processes' caches see the rebuild through the Budgets version
+    assert execute_query(version, fetchone=True)['version'] == before + 1
+    assert rollups.check() == []
+    assert rollups.project_totals()[0]['total'] == 100.0
+
+
+def test_totals_follow_project_renames(db):
+    Project.create("Depot", "", "2024-01-01", "2024-06-01")
+    Budget.create(1, 100.0, "2024-01-05")
+    assert rollups.project_totals()[0]['name'] == "Depot"
+    Project.update(1, "Depot West", "", "2024-01-01", "2024-06-01")
+    assert rollups.project_totals()[0]['name'] == "Depot West"
@@ -0,0 +1,81 @@
+from datetime import date
+
+import pytest
+
+from database import Task, TaskDependency
+from scheduling import CycleError, Schedule, get_schedule, refresh_task
+
+
+def test_critical_path_and_float():
+    # 1 -> 2 -> 4 and 1 -> 3 -> 4, with 3 shorter than 2
+    schedule = Schedule([1, 2, 3, 4], [0, 0, 0, 0], [2, 5, 1, 3], [(2, 1), (3, 1), (4, 2), (4, 3)])
+    assert schedule.finish == 10
+    assert schedule.critical_path() == [1, 2, 4]
+    assert schedule.total_float.tolist() == [0, 0, 4, 0]
+
+
+def test_planned_start_delays_task():
+    schedule = Schedule([1, 2], [0, 6], [2, 2], [(2, 1)])
+    assert schedule.es.tolist() == [0, 6]
+    assert schedule.total_float.tolist() == [4, 0]
+
+
+def test_update_task_matches_full_recompute():
+    schedule = Schedule([1, 2, 3, 4], [0, 0, 0, 0], [2, 5, 1, 3], [(2, 1), (3, 1), (4, 2), (4, 3)])
+    schedule.base_date = date(2024, 1, 1)
+    schedule.update_task(3, date(2024, 1, 3), date(2024, 1, 10))
+    fresh = Schedule([1, 2, 3, 4], [0, 0, 2, 0], [2, 5, 8, 3], [(2, 1), (3, 1), (4, 2), (4, 3)])
+    assert schedule.es.tolist() == fresh.es.tolist()
+    assert schedule.ls.tolist() == fresh.ls.tolist()
+    assert schedule.critical_path() == [1, 3, 4]
+
+
+def test_dependency_changes_match_full_recompute():
+    schedule = Schedule([1, 2, 3, 4], [0, 0, 0, 0], [2, 5, 1, 3], [(2, 1), (3, 1), (4, 2), (4, 3)])
+    schedule.base_date = date(2024, 1, 1)
+    schedule.update_task(4, depends_on=[3])
+    schedule.update_task(5, date(2024, 1, 2), date(2024, 1, 9), [2, 4])
+    fresh = Schedule([1, 2, 3, 4, 5], [0, 0, 0, 0, 1], [2, 5, 1, 3, 8], [(2, 1), (3, 1), (4, 3), (5, 2), (5, 4)])
+    for name in ('es', 'ls', 'level'):
+        assert getattr(schedule, name).tolist() == getattr(fresh, name).tolist()
+    assert schedule.critical_path() == fresh.critical_path() == [1, 2, 5]
+    with pytest.raises(CycleError):
+        schedule.update_task(1, depends_on=[5])
+
+
+def test_dependencies_are_parsed_and_cycles_rejected(db):
+    first = Task.create("Excavate", "2024-01-01", "2024-01-03", "")
+    second = Task.create("Pour footings", "2024-01-04", "2024-01-05", "Excavate")
+    third = Task.create("Frame", "2024-01-06", "2024-01-10", f"{second}")
+    assert TaskDependency.for_task(third) == [second]
+    with pytest.raises(ValueError):
+        Task.update(first, "Excavate", "2024-01-01", "2024-01-03", f"{third}")
+    assert TaskDependency.for_task(first) == []
+    with pytest.raises(ValueError):
+        Task.create("Roof", "2024-01-11", "2024-01-12", "No such task")
+
+
+def test_bulk_writes_check_only_their_new_edges_for_cycles(db):
+    Task.create_many([("Excavate", "2024-01-01", "2024-01-03", ""),
+                      ("Pour footings", "2024-01-04", "2024-01-05", "1"),
+                      ("Frame", "2024-01-06", "2024-01-10", "2")])
+    assert TaskDependency.find_cycle([(3, 1)]) == []
+    assert TaskDependency.find_cycle([(1, 3)]) == [1]
+    with pytest.raises(ValueError, match=r"tasks \[1\]"):
+        Task.update_many([(1, "Excavate", "2024-01-01", "2024-01-03", "3")])
+    assert TaskDependency.for_task(1) == []
+    Task.update_many([(3, "Frame", "2024-01-06", "2024-01-10", "1, 2")])
+    assert sorted(TaskDependency.for_task(3)) == [1, 2]
+
+
+def test_cached_schedule_follows_writes(db):
+    first = Task.create("Excavate", "2024-01-01", "2024-01-03", "")
+    before = get_schedule()
+    assert before.critical_path() == [first]
+    second = Task.create("Pour footings", "2024-01-02", "2024-01-05", f"{first}")
+    refresh_task(second)
+    schedule = get_schedule()
+    # Readers holding the old schedule never see the update land
+    assert schedule is not before and before.critical_path() == [first]
+    assert schedule.critical_path() == [first, second]
+    assert schedule.rows()[-1]['earliest_start'] == date(2024, 1, 4)
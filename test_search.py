@@ -0,0 +1,48 @@
+from database import Message, Notification, Project, Report, User
+from search import match_query, search
+
+
+def test_match_query_quotes_terms_and_prefixes_the_last():
+    assert match_query("crane delay") == '"crane" "delay"*'
+    assert match_query('con* "slab" OR -NEAR(') == '"con"* "slab" "OR" "NEAR"*'
+    assert match_query("  ?! ") is None
+
+
+def test_search_ranks_and_tracks_writes(db):
+    Report.create("Crane inspection", "Tower crane passed inspection", "2024-03-01")
+    Report.create("Weekly summary", "Minor delay on the crane delivery", "2024-03-08")
+    Project.create("Depot", "New maintenance depot with a crane gantry", "2024-01-01", "2024-12-01")
+    Notification.create("Site closed for concrete pour", "2024-03-02")
+
+    results = search("crane")
+    assert [row['kind'] for row in results][:1] == ['report']
+    assert results[0]['title'] == "Crane inspection"
+    assert {row['kind'] for row in results} == {'report', 'project'}
+    assert '**crane**' in results[0]['snippet'].lower()
+
+    assert [row['kind'] for row in search("concr")] == ['notification']
+
+    report_id = search("weekly")[0]['id']
+    Report.update(report_id, "Weekly summary", "All deliveries on time", "2024-03-08")
+    assert search("delay") == []
+    Report.delete(report_id)
+    assert search("weekly") == []
+
+
+def test_message_search_is_limited_to_participants(db):
+    Message.create("ann", "bob", "Rebar arrives Tuesday", "2024-03-01")
+    Message.create("carl", "dee", "Rebar order cancelled", "2024-03-02")
+
+    assert len(search("rebar")) == 2
+    assert [row['title'] for row in search("rebar", username="bob")] == ["ann to bob"]
+
+
+def test_notification_search_is_limited_to_recipients(db):
+    User.create("ann", "x")
+    User.create("bob", "x")
+    Notification.create("Crane inspection Friday", "2024-03-01")
+    Notification.create("Crane permit approved", "2024-03-02", "ann")
+
+    assert len(search("crane")) == 2
+    assert [row['snippet'] for row in search("crane", username="bob")] == ["**Crane** inspection Friday"]
+    assert len(search("crane", username="ann")) == 2
@@ -0,0 +1,44 @@
+from datetime import date
+
+import status_reports
+from database import Budget, File, FileVersion, Project, Task, execute_query
+
+
+def test_status_covers_every_project_in_one_pass(db):
+    Project.create("Harbour Bridge", "Deck repairs", "2024-01-01", "2024-12-31")
+    Project.create("Depot", "New roof", "2024-02-01", "2024-06-30")
+    Project.set_planned_budget(1, 1000.0)
+    Task.create_many([
+        ("Survey", "2024-01-01", "2024-01-10", "", 1),
+        ("Scaffold", "2024-01-11", "2024-02-01", "", 1),
+        ("Pour", "2024-03-01", "2024-04-01", "", 1),
+        ("Loose task", "2024-01-01", "2024-01-02", "", None),
+    ])
+    Task.set_completed(1, "2024-01-09")
+    Budget.create(1, 250.0, "2024-01-15")
+    Budget.create(1, 150.0, "2024-02-15")
+    File.create("plan.pdf", "uploads/plan.pdf", 2)
+    FileVersion.create(1, "0" * 64, 100)
+    execute_query("UPDATE FileVersions SET uploaded_at = '2024-03-08 10:00:00'")
+
+    rows = status_reports.compute(date(2024, 3, 10))
+
+    bridge, depot = rows
+    assert (bridge['tasks'], bridge['completed'], bridge['overdue']) == (3, 1, 1)
+    assert (bridge['completion'], bridge['spent'], bridge['budget_used']) == (0.333, 400.0, 0.4)
+    assert (depot['tasks'], depot['completion'], depot['budget_used'], depot['files_this_week']) == (0, None, None, 1)
+    assert status_reports.compute(date(2024, 3, 20))[1]['files_this_week'] == 0
+
+
+def test_cached_report_is_recomputed_when_its_tables_change(db):
+    Project.create("Harbour Bridge", "Deck repairs", "2024-01-01", "2024-12-31")
+    first = status_reports.refresh()
+    assert status_reports.project_status() is first
+    assert status_reports.is_current(first)
+
+    Task.create("Survey", "2024-01-01", "2024-01-10", "", 1)
+    assert not status_reports.is_current(first)
+    assert status_reports.project_status() is first
+    current = status_reports.project_status(allow_stale=False)
+    assert current.rows[0]['tasks'] == 1
+    assert status_reports.is_current(current)
@@ -0,0 +1,51 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database
+from database import Project, execute_query, transaction
+from writer import WriteCoordinator
+
+
+def test_concurrent_writes_share_commits(db):
+    coordinator = WriteCoordinator(database.pool, window=0.05, max_batch=8)
+    futures = [coordinator.submit("INSERT INTO Projects (name) VALUES (?)", (f"Project {i}",)) for i in range(20)]
+    futures.append(coordinator.submit("INSERT INTO Projects (name) VALUES (?)", (None,)))
+    results = [future.result() for future in futures[:-1]]
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[-1].result()
+    coordinator.close()
+
+    assert [result.lastrowid for result in results] == list(range(1, 21))
+    assert len(Project.get_all()) == 20
+    stats = coordinator.stats()
+    assert stats['writes'] == 21 and stats['errors'] == 1
+    assert stats['batches'] < 21 and max(map(int, stats['batch_sizes'])) <= 8
+
+
+def test_session_threads_write_through_the_writer(db):
+    database.writer.reset_stats()
+    errors = []
+
+    def session(n):
+        try:
+            for i in range(10):
+                Project.create(f"Session {n} project {i}", "", "2024-01-01", "2024-02-01")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert execute_query("SELECT COUNT(*) AS n FROM Projects", fetchone=True)['n'] == 80
+    assert database.performance_snapshot()['writer']['writes'] == 80
+
+    # Writes inside a transaction stay on the caller's connection
+    with transaction():
+        Project.create("In a transaction", "", "2024-01-01", "2024-02-01")
+    assert database.writer.stats()['writes'] == 80
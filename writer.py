@@ -0,0 +1,231 @@
+"""A single writer thread that group-commits writes from every session.
+
+Streamlit runs each session on its own thread. When each thread commits
+its own writes on its own connection, they queue on SQLite's write lock,
+and under load some give up with "database is locked". They also pay
+for one commit each. Instead, database.execute_query and execute_many
+hand writes made outside a transaction() block to the WriteCoordinator.
+One thread with its own connection runs them in batches. A batch is
+whatever arrives within WINDOW_SECONDS of its first write, up to
+MAX_BATCH writes, and it is committed once. While writes arrive one at
+a time, the writer doesn't wait out the window, so a single session's
+writes are not slowed down.
+
+Each write runs under its own SAVEPOINT. A write that fails is rolled
+back alone, and only its caller sees the error. The rest of the batch
+still commits. submit() returns a Future of a WriteResult. The Future
+resolves once the write is committed, so callers get RETURNING rows,
+rowcount and lastrowid as if they had run the statement themselves.
+
+transaction() blocks still write on the caller's connection, since
+their reads and writes have to share one transaction.
+
+    GROUP_COMMIT_MS     batch window in milliseconds (default 1)
+    GROUP_COMMIT_MAX    most writes per commit (default 64)
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import Future
+
+from metrics import LatencyHistogram, query_metrics
+from records import make_rows
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = float(os.environ.get('GROUP_COMMIT_MS', 1)) / 1000
+MAX_BATCH = int(os.environ.get('GROUP_COMMIT_MAX', 64))
+
+WriteResult = namedtuple('WriteResult', ('rows', 'rowcount', 'lastrowid'))
+
+_Write = namedtuple('_Write', ('query', 'params', 'many', 'future', 'queued_at'))
+
+
+class WriteCoordinator:
+    """Runs submitted writes on one thread, committing them in batches."""
+
+    def __init__(self, pool, window=WINDOW_SECONDS, max_batch=MAX_BATCH):
+        self.pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._conn = None
+        self._path = None
+        self._thread = None
+        self._last_batch_size = 1
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        with self._stats_lock:
+            self.writes = 0
+            self.errors = 0
+            self.batches = 0
+            self.max_queue_depth = 0
+            self.batch_sizes = Counter()
+            self.queue_wait = LatencyHistogram()
+            self.commits = LatencyHistogram()
+
+    def submit(self, query, params=(), many=False):
+        """Queue a write; returns a Future of its WriteResult, or of the error it raised."""
+        future = Future()
+        self._start()
+        self._queue.put(_Write(query, params, many, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            with self._stats_lock:
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+        return future
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+
+    def _connection(self):
+        if self._conn is None or self._path != self.pool.path:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = self.pool.connect()
+            self._path = self.pool.path
+        return self._conn
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.perf_counter()
+            # A lone writer doesn't wait out the window for company that isn't coming
+            if remaining <= 0 or (len(batch) == 1 and self._last_batch_size == 1):
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        self._last_batch_size = len(batch)
+        return [write for write in batch if write is None or write.future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            # close() queues None to stop the thread once the writes before it are in
+            stopping = None in batch
+            batch = [write for write in batch if write is not None]
+            try:
+                self._commit_batch(batch)
+            except Exception as e:
+                logger.exception("Write batch of %d failed", len(batch))
+                self._close()
+                for write in batch:
+                    if not write.future.done():
+                        write.future.set_exception(e)
+            if stopping:
+                self._close()
+                return
+
+    def _commit_batch(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            for write in batch:
+                write.future.set_exception(e)
+            self._record(batch, started, 0, len(batch))
+            return
+        lock_wait = time.perf_counter() - started
+        done, errors = [], 0
+        for write in batch:
+            statement_started = time.perf_counter()
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            conn.execute("SAVEPOINT write")
+            try:
+                if write.many:
+                    cursor.executemany(write.query, write.params)
+                else:
+                    cursor.execute(write.query, write.params)
+                rows = cursor.fetchall()
+                conn.execute("RELEASE write")
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK TO write")
+                conn.execute("RELEASE write")
+                query_metrics.record(write.query, time.perf_counter() - statement_started, error=True)
+                write.future.set_exception(e)
+                errors += 1
+                continue
+            query_metrics.record(write.query, time.perf_counter() - statement_started, len(rows) or cursor.rowcount)
+            names = [column[0] for column in cursor.description or ()]
+            done.append((write, WriteResult(make_rows(names, rows), cursor.rowcount, cursor.lastrowid)))
+        commit_started = time.perf_counter()
+        try:
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            for write, _ in done:
+                write.future.set_exception(e)
+            self._record(batch, started, 0, len(batch))
+            return
+        commit_time = time.perf_counter() - commit_started
+        query_metrics.record("COMMIT", commit_time, commit_seconds=commit_time, lock_wait_seconds=lock_wait)
+        for write, result in done:
+            write.future.set_result(result)
+        self._record(batch, started, commit_time, errors)
+
+    def _record(self, batch, started, commit_time, errors):
+        with self._stats_lock:
+            self.batches += 1
+            self.writes += len(batch)
+            self.errors += errors
+            self.batch_sizes[len(batch)] += 1
+            for write in batch:
+                self.queue_wait.add(started - write.queued_at)
+            if commit_time:
+                self.commits.add(commit_time)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'writes': self.writes,
+                'errors': self.errors,
+                'batches': self.batches,
+                'mean_batch_size': round(self.writes / self.batches, 2) if self.batches else 0.0,
+                'batch_sizes': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                'queue_wait': self.queue_wait.summary(),
+                'commits': self.commits.summary(),
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+            }
+
+    def reset_stats(self):
+        self._reset_stats()
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def close(self):
+        """Commit whatever is queued, then stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()